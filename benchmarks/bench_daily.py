@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+Compares preparing satellite daily data, i.e. month ingress/egress totals and
+last day bandwidth/storage, with utils.sum_list_of_dicts and safe_list_get as
+done before and with a DailySeries built once per satellite response, on
+synthetic payloads of 20 satellites with 31 days each.
+Usage: python benchmarks/bench_daily.py [satellites] [days]
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from storj_exporter.series import DailySeries  # noqa: E402
+from storj_exporter.utils import sum_list_of_dicts, safe_list_get  # noqa: E402
+from payloads import load_payloads, mock_versions, scale_payloads  # noqa: E402
+
+
+def prepare_sum_list_of_dicts(sat_data):
+    bandwidth_daily = sat_data.get('bandwidthDaily', {})
+    return {'month_ingress': sum_list_of_dicts(bandwidth_daily, 'ingress'),
+            'month_egress': sum_list_of_dicts(bandwidth_daily, 'egress'),
+            'day_bandwidth': safe_list_get(sat_data.get('bandwidthDaily', [{}]), -1),
+            'day_storage': safe_list_get(sat_data.get('storageDaily', None), -1)}
+
+
+def prepare_daily_series(sat_data):
+    bandwidth = DailySeries(sat_data.get('bandwidthDaily', None))
+    storage = DailySeries(sat_data.get('storageDaily', None))
+    return {'month_ingress': bandwidth.total('ingress'),
+            'month_egress': bandwidth.total('egress'),
+            'day_bandwidth': bandwidth.last(),
+            'day_storage': storage.last()}
+
+
+def main():
+    satellites = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 31
+    payloads = scale_payloads(load_payloads(mock_versions()[-1]), satellites, days)
+    responses = [dict(payloads['satellite'], id=s['id'])
+                 for s in payloads['sno']['satellites']]
+    print(f'{satellites} satellites, {days} days')
+    print(f'{"implementation":20} {"us per scrape":>14}')
+    results = {}
+    for prepare in (prepare_sum_list_of_dicts, prepare_daily_series):
+        timer = timeit.Timer(lambda: [prepare(r) for r in responses])
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=5, number=number)) / number
+        results[prepare.__name__] = [prepare(r) for r in responses]
+        print(f'{prepare.__name__[8:]:20} {best * 1e6:14.1f}')
+    assert results['prepare_sum_list_of_dicts'] == results['prepare_daily_series']
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+Compares per-scrape cpu time of building metrics for SatCollector with
+per-scrape MetricTemplate construction (as done before extraction plans) and
+with extraction plans compiled once on init, using recorded 6 satellites
+api responses. Usage: python benchmarks/bench_extraction.py [storj_version]
+"""
+
+import logging
+import os
+import sys
+import timeit
+from dataclasses import dataclass, field
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from prometheus_client.core import (  # noqa: E402
+    GaugeMetricFamily,
+    UnknownMetricFamily
+)
+from storj_exporter.collectors import SatCollector  # noqa: E402
+from storj_exporter.utils import nested_get, to_float  # noqa: E402
+from payloads import MockClient, load_payloads  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+# Metric templates as they were before extraction plans, kept verbatim as the
+# baseline: a dataclass per metric, creating its metric family on init and
+# adding samples of its data_dict with a debug message per lookup.
+@dataclass
+class BaselineMetricTemplate(object):
+    metric_name: str
+    documentation: str
+    data_keys: list
+    data_dict: dict = field(default_factory=lambda: {})
+    nested_path: list = field(default_factory=lambda: [])
+    metric_object: object = field(init=False)
+    labels: list = field(default_factory=lambda: ['type'])
+    extra_labels_values: list = field(default_factory=lambda: [])
+    _metric_class = UnknownMetricFamily
+
+    def __post_init__(self):
+        self.metric_object = self._metric_class(
+            name=self.metric_name, documentation=self.documentation, labels=self.labels)
+        logger.debug(f'... {self.metric_name} metric object created')
+
+    def _get_value(self, key):
+        return self.data_dict.get(key, None)
+
+    def add_metric_samples(self):
+        logger.debug(f'... adding samples to {self.metric_name}')
+        if self.nested_path:
+            self.data_dict = nested_get(self.data_dict, self.nested_path)
+        if self.data_dict and isinstance(self.data_dict, dict):
+            for key in self.data_keys:
+                value = self._get_value(key)
+                labels_list = [key] + self.extra_labels_values
+                if labels_list and value is not None:
+                    self.metric_object.add_metric(labels_list, value)
+                else:
+                    logger.debug(f'{self.metric_name} sample not added for {key}, '
+                                 f'labels: {labels_list}, value: {value}')
+        else:
+            logger.debug(f'{self.metric_name} data is empty or invalid, '
+                         'not adding samples')
+        self.data_dict = {}
+
+
+@dataclass
+class BaselineGaugeMetricTemplate(BaselineMetricTemplate):
+    _metric_class = GaugeMetricFamily
+
+    def _get_value(self, key):
+        value = self.data_dict.get(key, None)
+        if value is not None:
+            value = to_float(value)
+        else:
+            logger.debug(f'{self.metric_name} value for key {key} is None or not found')
+        return value
+
+
+def collect_with_templates(collector):
+    """
+    Per-scrape metric construction as SatCollector.collect() did before extraction
+    plans: the template map is built on every scrape, with the same templates as
+    the collector, and each template adds the samples of every satellite.
+    """
+    templates = [BaselineGaugeMetricTemplate(
+        metric_name=t.metric_name, documentation=t.documentation, data_dict={},
+        nested_path=t.nested_path, data_keys=t.data_keys, labels=t.labels,
+        extra_labels_values=['id', 'url'])
+        for t in collector._get_metric_template_map()]
+    for _sat_data, _sat_id, _sat_url in collector._satellites:
+        for template in templates:
+            template.data_dict = _sat_data
+            template.extra_labels_values = [_sat_id, _sat_url]
+            template.add_metric_samples()
+    return [template.metric_object for template in templates]
+
+
+def collect_with_plans(collector):
+    return list(collector._get_metrics())
+
+
+def bench(funcs, collector, number, repeat=15):
+    """
+    Best time per call of each of `funcs`, timed in alternating rounds so that
+    load changes of the machine during the run affect them alike.
+    """
+    timers = [timeit.Timer(lambda func=func: func(collector)) for func in funcs]
+    best = [float('inf')] * len(timers)
+    for _ in range(repeat):
+        best = [min(b, timer.timeit(number)) for b, timer in zip(best, timers)]
+    return [b / number for b in best]
+
+
+def main():
+    version = sys.argv[1] if len(sys.argv) > 1 else 'v1.71.2'
+    client = MockClient(load_payloads(version))
+    collector = SatCollector(client, refresh_on_collect=False)
+    collector.refresh()
+    templates, plans = bench([collect_with_templates, collect_with_plans],
+                             collector, 1000)
+    print(f'{len(collector._satellites)} satellites, storj {version}')
+    print(f'templates per scrape: {templates * 1e6:8.1f} us')
+    print(f'compiled plans:       {plans * 1e6:8.1f} us')
+    print(f'reduction:            {(1 - plans / templates) * 100:8.1f} %')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Measures the cpu overhead of the exporter self-instrumentation against the
+node collectors it instruments: rendering exporter metrics against rendering
+node, payout and satellite metrics of the same node, both from memory, and
+recording stats of an api request. Exporter metrics are rendered from the
+stats and cache state left by one refresh of every endpoint.
+Usage: python benchmarks/bench_instrumentation.py [satellites]
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from prometheus_client.core import CollectorRegistry  # noqa: E402
+from prometheus_client.exposition import generate_latest  # noqa: E402
+from storj_exporter.api_wrapper import ApiClient, ApiStats  # noqa: E402
+from storj_exporter.collectors import (  # noqa: E402
+    ExporterCollector,
+    NodeCollector,
+    PayoutCollector,
+    SatCollector
+)
+from payloads import (  # noqa: E402
+    MockClient,
+    load_payloads,
+    mock_versions,
+    scale_payloads
+)
+
+
+def bench(func, number):
+    return min(timeit.repeat(func, number=number, repeat=15)) / number
+
+
+def registry_of(*collectors):
+    registry = CollectorRegistry(auto_describe=False)
+    for collector in collectors:
+        registry.register(collector)
+    return registry
+
+
+def instrumented_client(payloads):
+    """Api client with the state of one successful call of every endpoint."""
+    client = ApiClient('http://127.0.0.1:1', cache_ttl=60)
+    responses = {'sno/': payloads['sno'], 'sno/estimated-payout': payloads['payout']}
+    for satellite in payloads['sno']['satellites']:
+        responses['sno/satellite/' + satellite['id']] = payloads['satellite']
+    for endpoint, response in responses.items():
+        client.stats.observe(endpoint, 0.05, 100000)
+        client._record(endpoint, response)
+    return client
+
+
+def main():
+    satellites = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    payloads = scale_payloads(load_payloads(mock_versions()[-1]), satellites)
+    mock_client = MockClient(payloads)
+    collectors = [collector_class(mock_client, refresh_on_collect=False)
+                  for collector_class in (NodeCollector, PayoutCollector, SatCollector)]
+    for collector in collectors:
+        collector.refresh()
+    node_registry = registry_of(*collectors)
+    exporter_registry = registry_of(
+        ExporterCollector(instrumented_client(payloads), collectors))
+
+    stats = ApiStats()
+    observe = bench(lambda: stats.observe('sno/satellite/id', 0.01, 10000), 100000)
+    print(f'stats of a request:      {observe * 1e6:9.1f} us')
+
+    render_node = bench(lambda: generate_latest(node_registry), 50)
+    render_exporter = bench(lambda: generate_latest(exporter_registry), 50)
+    node_size = len(generate_latest(node_registry))
+    exporter_size = len(generate_latest(exporter_registry))
+    print(f'render node metrics:     {render_node * 1e6:9.1f} us '
+          f'{node_size:7d} bytes ({satellites} satellites)')
+    print(f'render exporter metrics: {render_exporter * 1e6:9.1f} us '
+          f'{exporter_size:7d} bytes '
+          f'({render_exporter / render_node * 100:.0f}% cpu, '
+          f'{exporter_size / node_size * 100:.0f}% bytes of node metrics)')
+
+
+if __name__ == '__main__':
+    main()
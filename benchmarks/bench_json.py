@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+Compares parse time and memory retained per satellite api response for each
+available json backend, parsing the full response or only the keys used by
+SatCollector. Usage: python benchmarks/bench_json.py [storj_version]
+"""
+
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from storj_exporter.api_wrapper import parse_response  # noqa: E402
+from storj_exporter.collectors import SatCollector  # noqa: E402
+from payloads import MOCK_PATH  # noqa: E402
+
+
+def get_backends():
+    backends = {'json': json.loads}
+    try:
+        import orjson
+        backends['orjson'] = orjson.loads
+    except ImportError:
+        pass
+    return backends
+
+
+def retained_bytes(func):
+    tracemalloc.start()
+    result = func()  # noqa: F841
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return retained, peak
+
+
+def main():
+    version = sys.argv[1] if len(sys.argv) > 1 else 'v1.71.2'
+    with open(os.path.join(MOCK_PATH, version, 'satellite.json'), 'rb') as f:
+        body = f.read()
+    keys = SatCollector.api_keys['sno/satellite/']
+    print(f'satellite response of {len(body)} bytes, storj {version}')
+    print(f'{"backend":8} {"keys":9} {"parse us":>9} {"retained":>9} {"peak":>9}')
+    for backend, loads in get_backends().items():
+        sys.modules['storj_exporter.api_wrapper'].json_loads = loads
+        for mode, _keys in (('all', None), ('selective', keys)):
+            number = 2000
+            seconds = min(timeit.repeat(lambda: parse_response(body, _keys),
+                                        number=number, repeat=5)) / number
+            retained, peak = retained_bytes(lambda: parse_response(body, _keys))
+            print(f'{backend:8} {mode:9} {seconds * 1e6:9.1f} {retained:9} {peak:9}')
+
+
+if __name__ == '__main__':
+    main()
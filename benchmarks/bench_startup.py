@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Measures exporter startup, i.e. creating and registering targets with all
+collectors as done by __main__ before serving, with the storagenode up (a local
+fake storagenode), down (connection refused) or unresponsive (connections
+accepted but never answered). Startup should take the same short time whatever
+the state of the node, as no api call is made before the first scrape or poll.
+Usage: python benchmarks/bench_startup.py [nodes]
+"""
+
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from prometheus_client.core import CollectorRegistry  # noqa: E402
+from storj_exporter.api_wrapper import ApiClient  # noqa: E402
+from storj_exporter.target import Target  # noqa: E402
+from fake_node import start_fake_nodes  # noqa: E402
+
+
+def start_unresponsive_node():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen()
+    return sock, 'http://%s:%s' % sock.getsockname()
+
+
+def startup(base_url, nodes, poll_interval):
+    """Returns seconds to start `nodes` targets and api requests made meanwhile."""
+    clients = [ApiClient(base_url, timeout=10) for _ in range(nodes)]
+    started = time.monotonic()
+    for i, client in enumerate(clients):
+        registry = CollectorRegistry(auto_describe=True) if i == 0 else None
+        Target(f'node{i}', client, ['payout', 'sat'], registry,
+               poll_interval=poll_interval)
+    duration = time.monotonic() - started
+    requests = sum(buckets[-1][1] for client in clients
+                   for buckets, _ in client.stats.snapshot()['durations'].values())
+    return duration, requests
+
+
+def main():
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    httpd = start_fake_nodes(port=0)[0]
+    sock, unresponsive_url = start_unresponsive_node()
+    node_states = [('up', 'http://%s:%s' % httpd.server_address[:2]),
+                   ('down', 'http://127.0.0.1:1'),
+                   ('unresponsive', unresponsive_url)]
+    print(f'{nodes} nodes')
+    print(f'{"node":14} {"mode":8} {"startup ms":>12} {"api requests":>14}')
+    for state, base_url in node_states:
+        for mode, poll_interval in (('scrape', 0), ('poll', 60)):
+            duration, requests = startup(base_url, nodes, poll_interval)
+            print(f'{state:14} {mode:8} {duration * 1e3:12.2f} {requests:14}')
+    httpd.shutdown()
+    sock.close()
+
+
+if __name__ == '__main__':
+    main()
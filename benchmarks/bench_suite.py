@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""
+Microbenchmarks of collectors, metric templates, utils and exposition rendering
+against recorded api payloads of every mocked storagenode version and synthetic
+scaled-up payloads. Api data is served from memory, so timings only cover the
+exporter's own cpu time.
+
+Usage:
+    python benchmarks/bench_suite.py [--filter NAME] [--output results.json]
+                                     [--compare baseline.json]
+
+Results saved with --output can be compared against a later run with --compare,
+e.g. to check a change for regressions:
+    git stash && python benchmarks/bench_suite.py -o /tmp/before.json
+    git stash pop && python benchmarks/bench_suite.py --compare /tmp/before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from prometheus_client.core import CollectorRegistry  # noqa: E402
+from prometheus_client.exposition import generate_latest  # noqa: E402
+from storj_exporter.collectors import (  # noqa: E402
+    NodeCollector,
+    PayoutCollector,
+    SatCollector
+)
+from storj_exporter.exposition import ExpositionCache  # noqa: E402
+from storj_exporter.metric_templates import GaugeMetricTemplate  # noqa: E402
+from storj_exporter.series import DailySeries  # noqa: E402
+from storj_exporter.utils import sum_list_of_dicts  # noqa: E402
+from payloads import MockClient, payload_sets  # noqa: E402
+
+
+def node_collect(payloads):
+    collector = NodeCollector(MockClient(payloads))
+    return lambda: list(collector.collect())
+
+
+def sat_collect(payloads):
+    collector = SatCollector(MockClient(payloads), max_workers=1)
+    return lambda: list(collector.collect())
+
+
+def payout_collect(payloads):
+    collector = PayoutCollector(MockClient(payloads))
+    return lambda: list(collector.collect())
+
+
+def gauge_plan_add_samples(payloads):
+    collector = SatCollector(MockClient(payloads), refresh_on_collect=False)
+    collector.refresh()
+    sat_data = collector._satellites[0][0]
+    plan = GaugeMetricTemplate(
+        metric_name='storj_sat_summary',
+        documentation='Storj satellite summary metrics',
+        data_keys=['storageSummary', 'bandwidthSummary', 'egressSummary',
+                   'ingressSummary', 'currentStorageUsed', 'disqualified',
+                   'suspended'],
+        labels=['type', 'satellite', 'url']).compile()
+
+    def run():
+        metric = plan.new_metric()
+        plan.add_samples(metric, sat_data, ('id', 'url'))
+        return metric
+    return run
+
+
+def sum_list_of_dicts_egress(payloads):
+    bandwidth_daily = payloads['satellite']['bandwidthDaily']
+    return lambda: sum_list_of_dicts(bandwidth_daily, 'egress')
+
+
+def daily_series_egress(payloads):
+    bandwidth_daily = payloads['satellite']['bandwidthDaily']
+    return lambda: DailySeries(bandwidth_daily).total('egress')
+
+
+def _registry(payloads):
+    client = MockClient(payloads)
+    registry = CollectorRegistry(auto_describe=False)
+    for collector in (NodeCollector(client, False), PayoutCollector(client, False),
+                      SatCollector(client, False)):
+        collector.refresh()
+        registry.register(collector)
+    return registry
+
+
+def render_generate_latest(payloads):
+    registry = _registry(payloads)
+    return lambda: generate_latest(registry)
+
+
+def render_exposition(payloads):
+    """Rendering with plain and gzip-compressed output, as served to scrapes."""
+    exposition_cache = ExpositionCache(_registry(payloads), render_on_scrape=False)
+    return exposition_cache.render
+
+
+BENCHMARKS = [
+    node_collect,
+    sat_collect,
+    payout_collect,
+    gauge_plan_add_samples,
+    sum_list_of_dicts_egress,
+    daily_series_egress,
+    render_generate_latest,
+    render_exposition,
+]
+
+
+def run_benchmark(func, repeat, min_time):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {'number': number, 'repeat': repeat, 'best_us': min(times) * 1e6,
+            'mean_us': sum(times) / len(times) * 1e6}
+
+
+def get_metadata():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.realpath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'commit': commit, 'python': platform.python_version(),
+            'platform': platform.platform(), 'machine': platform.machine(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+
+
+def load_baseline(path):
+    with open(path, 'r') as f:
+        return {(r['benchmark'], r['payload']): r for r in json.load(f)['results']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-f', '--filter', default='',
+                        help='only run benchmarks or payloads containing this text')
+    parser.add_argument('-o', '--output', help='save results as json to this file')
+    parser.add_argument('-c', '--compare', help='compare with results of a json file')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-t', '--min-time', type=float, default=0.2,
+                        help='minimum seconds per repeat')
+    args = parser.parse_args()
+    baseline = load_baseline(args.compare) if args.compare else {}
+
+    results = []
+    print(f'{"benchmark":36} {"payload":24} {"best us":>10} {"change":>8}')
+    for payload_name, payloads in payload_sets():
+        for benchmark in BENCHMARKS:
+            name = benchmark.__name__
+            if args.filter not in name and args.filter not in payload_name:
+                continue
+            result = run_benchmark(benchmark(payloads), args.repeat, args.min_time)
+            result.update(benchmark=name, payload=payload_name)
+            results.append(result)
+            change = ''
+            if (name, payload_name) in baseline:
+                before = baseline[(name, payload_name)]['best_us']
+                change = f'{(result["best_us"] / before - 1) * 100:+.1f}%'
+            print(f'{name:36} {payload_name:24} {result["best_us"]:10.1f} {change:>8}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'metadata': get_metadata(), 'results': results}, f, indent=2)
+        print(f'Results saved to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
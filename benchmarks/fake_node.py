@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+"""
+Stand-in storagenode api server for load testing the exporter without a live
+node. Serves recorded responses of a tests/api_mock version, scaled to the
+given number of satellites and daily entries, with configurable latency and
+error rate per endpoint.
+
+Usage:
+    python benchmarks/fake_node.py --nodes 3 --satellites 10 \\
+        --latency sno=0.05,satellite=0.2 --error-rate 0.01
+
+then point the exporter at it, e.g.
+    STORJ_HOST_ADDRESS="127.0.0.1:14002 127.0.0.1:14003 127.0.0.1:14004" \\
+        python storj_exporter
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from payloads import load_payloads, mock_versions, scale_payloads
+
+ENDPOINTS = ('sno', 'payout', 'satellite')
+
+
+def parse_endpoint_values(value):
+    """Parses `0.1` or `sno=0.1,satellite=0.5` into seconds by endpoint."""
+    if '=' not in value:
+        return dict.fromkeys(ENDPOINTS, float(value))
+    values = dict.fromkeys(ENDPOINTS, 0.0)
+    for item in value.split(','):
+        endpoint, _, seconds = item.partition('=')
+        if endpoint not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f'Unknown endpoint {endpoint}')
+        values[endpoint] = float(seconds)
+    return values
+
+
+class FakeNodeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    bodies = {}
+    latency = dict.fromkeys(ENDPOINTS, 0.0)
+    error_rate = dict.fromkeys(ENDPOINTS, 0.0)
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path in ('/api/sno', '/api/sno/'):
+            endpoint, body = 'sno', self.bodies['sno']
+        elif path == '/api/sno/estimated-payout':
+            endpoint, body = 'payout', self.bodies['payout']
+        elif path.startswith('/api/sno/satellite/'):
+            endpoint = 'satellite'
+            body = self.bodies['satellites'].get(path.rsplit('/', 1)[-1], None)
+        else:
+            endpoint, body = None, None
+        if endpoint:
+            time.sleep(self.latency[endpoint])
+        if body is None:
+            self._send(404, b'Not found')
+        elif random.random() < self.error_rate.get(endpoint, 0):
+            self._send(500, b'Internal server error')
+        else:
+            self._send(200, body)
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_bodies(version, satellites, days, padding=0):
+    """Returns serialized api responses, with `padding` bytes added to each."""
+    payloads = scale_payloads(load_payloads(version), satellites, days)
+    if padding:
+        for payload in payloads.values():
+            payload['padding'] = 'x' * padding
+
+    def dumps(payload):
+        return json.dumps(payload).encode('utf-8')
+
+    return {
+        'sno': dumps(payloads['sno']),
+        'payout': dumps(payloads['payout']),
+        'satellites': {s['id']: dumps(dict(payloads['satellite'], id=s['id']))
+                       for s in payloads['sno']['satellites']},
+    }
+
+
+def start_fake_nodes(nodes=1, port=14002, host='127.0.0.1', version=None,
+                     satellites=6, days=31, padding=0, latency='0', error_rate='0'):
+    """
+    Starts `nodes` fake storagenode api servers on consecutive ports from `port`
+    (a random free port each if 0) in daemon threads. Returns the servers.
+    """
+    handler = type('FakeNodeHandler', (FakeNodeHandler,), {
+        'bodies': make_bodies(version or mock_versions()[-1], satellites, days,
+                              padding),
+        'latency': parse_endpoint_values(latency),
+        'error_rate': parse_endpoint_values(error_rate),
+    })
+    servers = []
+    for i in range(nodes):
+        httpd = ThreadingHTTPServer((host, port + i if port else 0), handler)
+        httpd.daemon_threads = True
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        servers.append(httpd)
+    return servers
+
+
+def add_arguments(parser):
+    parser.add_argument('--nodes', type=int, default=1,
+                        help='number of fake nodes, on consecutive ports')
+    parser.add_argument('--port', type=int, default=14002)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--version', choices=mock_versions(),
+                        help='recorded api version, defaults to the latest')
+    parser.add_argument('--satellites', type=int, default=6)
+    parser.add_argument('--days', type=int, default=31,
+                        help='entries in satellite daily arrays')
+    parser.add_argument('--padding', type=int, default=0,
+                        help='bytes of padding added to every response')
+    parser.add_argument('--latency', default='0',
+                        help='response delay in seconds, e.g. 0.1 or sno=0.1,'
+                             'payout=0.2,satellite=0.5')
+    parser.add_argument('--error-rate', default='0',
+                        help='fraction of http 500 responses, e.g. 0.01 or '
+                             'satellite=0.1')
+
+
+def fake_node_options(args):
+    return dict(nodes=args.nodes, port=args.port, host=args.host,
+                version=args.version, satellites=args.satellites, days=args.days,
+                padding=args.padding, latency=args.latency,
+                error_rate=args.error_rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    add_arguments(parser)
+    args = parser.parse_args()
+    servers = start_fake_nodes(**fake_node_options(args))
+    for httpd in servers:
+        host, port = httpd.server_address[:2]
+        print(f'Serving fake storagenode api on http://{host}:{port}/api/')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+"""
+Load driver running concurrent scrapers against an exporter and reporting scrape
+latency percentiles with exporter cpu usage and memory (RSS).
+
+Either point it at a running exporter:
+    python benchmarks/load_test.py --url http://127.0.0.1:9651/ --concurrency 10
+
+or let it start fake storagenodes (see fake_node.py for their options) and an
+exporter connected to them, passing exporter settings with --env:
+    python benchmarks/load_test.py --spawn --nodes 5 --satellites 10 \\
+        --latency satellite=0.2 --env STORJ_POLL_INTERVAL=30 --duration 60
+
+Exporter cpu and memory are read from /proc for a spawned exporter and from its
+process_cpu_seconds_total and process_resident_memory_bytes metrics otherwise.
+"""
+
+import argparse
+import http.client
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+from fake_node import add_arguments, fake_node_options, start_fake_nodes
+
+EXPORTER_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..',
+                             'storj_exporter')
+PROCESS_METRICS = re.compile(
+    rb'^(process_cpu_seconds_total|process_resident_memory_bytes) (\S+)$', re.M)
+
+
+class Scraper(threading.Thread):
+    """
+    Scrapes `paths` in turn until `deadline`, recording latencies in seconds.
+    Like prometheus, the connection is kept alive between scrapes if keep_alive.
+    """
+    def __init__(self, url, paths, deadline, interval=0, keep_alive=True):
+        super().__init__(daemon=True)
+        self.url = urlsplit(url)
+        self.paths = paths
+        self.deadline = deadline
+        self.interval = interval
+        self.keep_alive = keep_alive
+        self.latencies = []
+        self.errors = 0
+        self._conn = None
+
+    def run(self):
+        i = 0
+        while time.monotonic() < self.deadline:
+            started = time.monotonic()
+            try:
+                self.scrape(self.paths[i % len(self.paths)])
+                self.latencies.append(time.monotonic() - started)
+            except (OSError, http.client.HTTPException, ValueError):
+                self.errors += 1
+            i += 1
+            time.sleep(max(0, self.interval - (time.monotonic() - started)))
+
+    def scrape(self, path):
+        if not self._conn:
+            self._conn = http.client.HTTPConnection(self.url.hostname, self.url.port,
+                                                    timeout=60)
+        try:
+            self._conn.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+            response = self._conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self._close()
+            raise
+        if not self.keep_alive or response.will_close:
+            self._close()
+        if response.status != 200:
+            raise ValueError(f'Unexpected status {response.status}')
+
+    def _close(self):
+        self._conn.close()
+        self._conn = None
+
+
+class ResourceMonitor(threading.Thread):
+    """Samples exporter cpu seconds and RSS bytes every second."""
+    def __init__(self, url, pid=None):
+        super().__init__(daemon=True)
+        self.url = urlsplit(url)
+        self.pid = pid
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.samples.append(self.sample())
+            except (OSError, http.client.HTTPException, ValueError):
+                pass
+            self.stopped.wait(1)
+
+    def sample(self):
+        if self.pid:
+            return self._sample_proc()
+        return self._sample_metrics()
+
+    def _sample_proc(self):
+        with open(f'/proc/{self.pid}/stat', 'r') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        rss = int(fields[21]) * os.sysconf('SC_PAGE_SIZE')
+        return time.monotonic(), cpu, rss
+
+    def _sample_metrics(self):
+        conn = http.client.HTTPConnection(self.url.hostname, self.url.port, timeout=30)
+        try:
+            conn.request('GET', '/')
+            metrics = dict(PROCESS_METRICS.findall(conn.getresponse().read()))
+        finally:
+            conn.close()
+        return (time.monotonic(), float(metrics[b'process_cpu_seconds_total']),
+                float(metrics[b'process_resident_memory_bytes']))
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0
+
+
+def spawn_exporter(args, addresses):
+    env = dict(os.environ, STORJ_HOST_ADDRESS=' '.join(addresses),
+               STORJ_EXPORTER_PORT=str(urlsplit(args.url).port),
+               STORJ_EXPORTER_LOG_LEVEL='WARNING')
+    env.update(item.split('=', 1) for item in args.env)
+    process = subprocess.Popen([sys.executable, EXPORTER_PATH], env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            Scraper(args.url, [], 0, keep_alive=False).scrape('/status')
+            return process
+        except (OSError, http.client.HTTPException, ValueError):
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit('Exporter did not start')
+
+
+def print_report(args, scrapers, samples, duration):
+    latencies = [t for s in scrapers for t in s.latencies]
+    errors = sum(s.errors for s in scrapers)
+    print(f'scrapers: {args.concurrency}, duration: {duration:.1f}s, '
+          f'scrapes: {len(latencies)} ({len(latencies) / duration:.1f}/s), '
+          f'errors: {errors}')
+    percentiles = ', '.join(
+        f'p{p} {percentile(latencies, p) * 1000:.1f}' for p in (50, 90, 99))
+    print(f'latency ms: {percentiles}, max {max(latencies, default=0) * 1000:.1f}')
+    if len(samples) > 1:
+        (t0, cpu0, _), (t1, cpu1, _) = samples[0], samples[-1]
+        rss = [s[2] for s in samples]
+        print(f'exporter cpu: {(cpu1 - cpu0) / (t1 - t0) * 100:.1f}%, '
+              f'rss MiB: avg {sum(rss) / len(rss) / 2 ** 20:.1f}, '
+              f'max {max(rss) / 2 ** 20:.1f}')
+    else:
+        print('exporter cpu and rss: not available')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[1],
+        formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument('--url', default='http://127.0.0.1:9651/',
+                        help='exporter url')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='number of concurrent scrapers')
+    parser.add_argument('--duration', type=float, default=30,
+                        help='seconds to run scrapers for')
+    parser.add_argument('--interval', type=float, default=0,
+                        help='seconds between scrapes of a scraper, 0 for no pause')
+    parser.add_argument('--no-keep-alive', action='store_true',
+                        help='open a new connection for every scrape')
+    parser.add_argument('--targets', default='',
+                        help='comma separated targets to scrape with ?target=')
+    parser.add_argument('--spawn', action='store_true',
+                        help='start fake storagenodes and an exporter')
+    parser.add_argument('--env', action='append', default=[],
+                        help='KEY=VALUE environment variable of a spawned exporter')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    process = None
+    if args.spawn:
+        servers = start_fake_nodes(**fake_node_options(args))
+        addresses = ['%s:%s' % httpd.server_address[:2] for httpd in servers]
+        process = spawn_exporter(args, addresses)
+    paths = [f'/?target={t}' for t in args.targets.split(',') if t] or ['/']
+    try:
+        monitor = ResourceMonitor(args.url, process.pid if process else None)
+        monitor.start()
+        started = time.monotonic()
+        scrapers = [Scraper(args.url, paths, started + args.duration, args.interval,
+                            keep_alive=not args.no_keep_alive)
+                    for _ in range(args.concurrency)]
+        for scraper in scrapers:
+            scraper.start()
+        for scraper in scrapers:
+            scraper.join()
+        duration = time.monotonic() - started
+        monitor.stop()
+        print_report(args, scrapers, monitor.samples, duration)
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
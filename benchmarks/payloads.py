@@ -0,0 +1,80 @@
+"""
+Api payloads for benchmarks: recorded responses of every mocked storagenode
+version in tests/api_mock and synthetic payloads scaled up from them.
+"""
+
+import copy
+import datetime
+import json
+import os
+
+MOCK_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'tests',
+                         'api_mock')
+
+
+def mock_versions():
+    return sorted(os.listdir(MOCK_PATH))
+
+
+def load_payloads(version):
+    payloads = {}
+    for name in ('sno', 'payout', 'satellite'):
+        with open(os.path.join(MOCK_PATH, version, f'{name}.json'), 'r') as f:
+            payloads[name] = json.loads(f.read())
+    return payloads
+
+
+def scale_payloads(payloads, satellites=6, days=31):
+    """
+    Returns a copy of `payloads` with `satellites` satellites on the node and
+    `days` entries in satellite daily arrays, repeating the recorded entries.
+    """
+    payloads = copy.deepcopy(payloads)
+    node_satellites = payloads['sno']['satellites']
+    payloads['sno']['satellites'] = [
+        dict(node_satellites[i % len(node_satellites)],
+             id=f'{i:050d}', url=f'satellite{i}.storj.io:7777')
+        for i in range(satellites)]
+    sat = payloads['satellite']
+    start = datetime.datetime(2023, 1, 1)
+    for daily in ('bandwidthDaily', 'storageDaily'):
+        entries = sat.get(daily) or [{}]
+        sat[daily] = [
+            dict(entries[i % len(entries)], intervalStart=(
+                start + datetime.timedelta(days=i)).strftime('%Y-%m-%dT%H:%M:%SZ'))
+            for i in range(days)]
+    return payloads
+
+
+def payload_sets(scaled=((6, 31), (30, 31), (100, 31))):
+    """Yields (name, payloads) for every mocked version and scaled payloads."""
+    for version in mock_versions():
+        yield version, load_payloads(version)
+    base = load_payloads(mock_versions()[-1])
+    for satellites, days in scaled:
+        yield f'synthetic-{satellites}sat-{days}d', scale_payloads(
+            base, satellites, days)
+
+
+class MockClient(object):
+    """Api client returning payloads from memory, with no cache or network."""
+    def __init__(self, payloads):
+        self._payloads = payloads
+
+    def node(self):
+        return self._payloads['sno']
+
+    def payout(self):
+        return self._payloads['payout']
+
+    def satellite(self, sat_id):
+        return dict(self._payloads['satellite'], id=sat_id)
+
+    def is_failing(self, endpoint):
+        return False
+
+    def cache_stats(self):
+        return {'hit': 0, 'miss': 0}
+
+    def cache_ages(self):
+        return {}
@@ -3,15 +3,13 @@
 import os
 import signal
 import threading
-import time
-import json
 import logging
-from wsgiref.simple_server import make_server
-from prometheus_client import MetricsHandler, make_wsgi_app
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from prometheus_client.core import REGISTRY
-from prometheus_client.exposition import ThreadingWSGIServer
-from api_wrapper import ApiClient
-from collectors import NodeCollector, SatCollector, PayoutCollector
+from api_wrapper import ApiClient, AsyncApiClient, make_session, JSON_BACKEND
+from poller import AsyncPoller
+from server import AsyncHTTPServer, ExporterApp
+from target import Target, parse_addresses
 
 logger = logging.getLogger(__name__)
 
@@ -24,49 +22,103 @@ class GracefulKiller:
     }
 
     def __init__(self):
+        self.killed = threading.Event()
         signal.signal(signal.SIGINT, self.exit_gracefully)
         signal.signal(signal.SIGTERM, self.exit_gracefully)
 
     def exit_gracefully(self, signum, frame):
         print("\nReceived {} signal, exiting ...".format(self.signals[signum]))
         self.kill_now = True
+        self.killed.set()
 
 
-class HTTPRequestHandler(MetricsHandler):
+class HTTPRequestHandler(BaseHTTPRequestHandler):
+    app = ExporterApp({})
+
     def do_GET(self):
-        if self.path == "/status":
-            message = dict(status="alive")
-            self.send_response(200)
-            self.end_headers()
-            self.wfile.write(bytes(json.dumps(message), "utf-8"))
-        else:
-            return MetricsHandler.do_GET(self)
+        status, headers, body = self.app.handle(
+            self.path, self.headers.get('Accept-Encoding'),
+            self.headers.get('X-Prometheus-Scrape-Timeout-Seconds'))
+        self.send_response(status)
+        for key, value in headers:
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
 
     def log_message(self, format, *args):
         logger.debug("Client request: %s %s" % (self.address_string(), format % args))
 
-
-def start_wsgi_server(port, addr='', registry=REGISTRY):
-    """Starts a WSGI server for prometheus metrics as a daemon thread."""
-    logger.info(f'Starting WSGI server on port {port}')
-    app = make_wsgi_app(registry)
-    httpd = make_server(addr, port, app, ThreadingWSGIServer,
-                        handler_class=HTTPRequestHandler)
+    @classmethod
+    def factory(cls, targets, profiling=False, timeout_offset=0.5):
+        """Returns a handler class serving an ExporterApp of `targets`."""
+        app = ExporterApp(targets, profiling, timeout_offset)
+        return type(cls.__name__, (cls,), {'app': app})
+
+
+def start_http_server(port, addr, targets, profiling=False, server='async',
+                      workers=4, timeout_offset=0.5):
+    """
+    Serves prometheus metrics until SIGINT or SIGTERM, either with the event
+    driven AsyncHTTPServer or with a thread per connection ThreadingHTTPServer.
+    """
+    if server == 'async':
+        AsyncHTTPServer(ExporterApp(targets, profiling, timeout_offset), addr, port,
+                        max_workers=workers).serve_forever()
+        return
+    logger.info(f'Starting HTTP server on port {port}')
+    httpd = ThreadingHTTPServer(
+        (addr, port), HTTPRequestHandler.factory(targets, profiling, timeout_offset))
+    httpd.daemon_threads = False
     t = threading.Thread(target=httpd.serve_forever)
     t.daemon = True
     t.start()
     killer = GracefulKiller()
-    while not killer.kill_now:
-        time.sleep(1)
-    logger.info("Shutting down WSGI server")
+    killer.killed.wait()
+    logger.info("Shutting down HTTP server")
+    httpd.shutdown()
+    httpd.server_close()
 
 
 def main():
     """Read in environment variables"""
     storj_host_address = os.environ.get('STORJ_HOST_ADDRESS', '127.0.0.1')
     storj_api_port = os.environ.get('STORJ_API_PORT', '14002')
+    storj_api_timeout = float(os.environ.get('STORJ_API_TIMEOUT', '10'))
     storj_exporter_port = int(os.environ.get('STORJ_EXPORTER_PORT', '9651'))
     storj_collectors = os.environ.get('STORJ_COLLECTORS', 'payout sat').split()
+    storj_poll_interval = float(os.environ.get('STORJ_POLL_INTERVAL', '0'))
+    storj_async = os.environ.get('STORJ_ASYNC', 'false').lower() in ('true', '1')
+    storj_sat_concurrency = int(os.environ.get('STORJ_SAT_CONCURRENCY', '4'))
+    storj_sat_batch_size = int(os.environ.get('STORJ_SAT_BATCH_SIZE', '0'))
+    storj_paystub_interval = float(os.environ.get('STORJ_PAYSTUB_INTERVAL', '3600'))
+    storj_data_dir = os.environ.get('STORJ_DATA_DIR', '') or None
+    storj_snapshot_interval = float(os.environ.get('STORJ_SNAPSHOT_INTERVAL', '60'))
+    storj_snapshot_max_age = float(os.environ.get('STORJ_SNAPSHOT_MAX_AGE', '3600'))
+    storj_api_cache_ttl = os.environ.get('STORJ_API_CACHE_TTL', '5')
+    storj_api_cache_ttls = {
+        'sno/': float(storj_api_cache_ttl),
+        'sno/estimated-payout': float(
+            os.environ.get('STORJ_PAYOUT_CACHE_TTL', storj_api_cache_ttl)),
+        'sno/satellite/': float(
+            os.environ.get('STORJ_SAT_CACHE_TTL', storj_api_cache_ttl)),
+    }
+    storj_api_cache_size = int(os.environ.get('STORJ_API_CACHE_SIZE', '256'))
+    storj_api_stale_ttl = float(os.environ.get('STORJ_API_STALE_TTL', '0'))
+    storj_api_breaker_failures = int(
+        os.environ.get('STORJ_API_BREAKER_FAILURES', '3'))
+    storj_api_breaker_cooldown = float(
+        os.environ.get('STORJ_API_BREAKER_COOLDOWN', '30'))
+    storj_api_selective_json = os.environ.get(
+        'STORJ_API_SELECTIVE_JSON', 'false').lower() in ('true', '1')
+    storj_min_collect_interval = float(
+        os.environ.get('STORJ_MIN_COLLECT_INTERVAL', '0'))
+    storj_profiling = os.environ.get(
+        'STORJ_PROFILING', 'false').lower() in ('true', '1')
+    storj_http_server = os.environ.get('STORJ_HTTP_SERVER', 'async').lower()
+    storj_http_workers = int(os.environ.get('STORJ_HTTP_WORKERS', '4'))
+    storj_scrape_timeout_offset = float(
+        os.environ.get('STORJ_SCRAPE_TIMEOUT_OFFSET', '0.5'))
     log_level = os.environ.get('STORJ_EXPORTER_LOG_LEVEL', 'INFO').upper()
 
     """Setup logging."""
@@ -76,26 +128,51 @@ def main():
         datefmt="%Y-%m-%d %H:%M:%S"
     )
 
-    """Instantiate api client and node collector"""
-    baseurl = 'http://' + storj_host_address + ':' + storj_api_port
+    """Instantiate a shared api session and a target per storagenode address"""
+    addresses = parse_addresses(storj_host_address, storj_api_port)
     logger.info(f'Starting storj exporter on port {storj_exporter_port}, '
-                f'connecting to {baseurl} with collectors {storj_collectors} enabled')
-    client = ApiClient(baseurl)
-    node_collector = NodeCollector(client)
-    logger.info('Registering node collector')
-    REGISTRY.register(node_collector)
-
-    """Instantiate and register optional collectors"""
-    if 'payout' in storj_collectors:
-        payout_collector = PayoutCollector(client)
-        logger.info('Registering payout collector')
-        REGISTRY.register(payout_collector)
-    if 'sat' in storj_collectors:
-        sat_collector = SatCollector(client)
-        logger.info('Registering sat collector')
-        REGISTRY.register(sat_collector)
-
-    start_wsgi_server(storj_exporter_port, '')
+                f'connecting to {addresses} with collectors {storj_collectors} enabled')
+    logger.info(f'Parsing api responses with {JSON_BACKEND}, selective json '
+                f'parsing {"enabled" if storj_api_selective_json else "disabled"}')
+    session = make_session(pool_connections=len(addresses),
+                           pool_maxsize=max(storj_sat_concurrency, 1))
+    """Process metrics are exposed once, by the first target using default registry"""
+    use_async = storj_async and storj_poll_interval > 0
+    targets = {}
+    client_options = dict(timeout=storj_api_timeout, cache_ttl=storj_api_cache_ttls,
+                          cache_size=storj_api_cache_size,
+                          stale_ttl=storj_api_stale_ttl,
+                          breaker_failures=storj_api_breaker_failures,
+                          breaker_cooldown=storj_api_breaker_cooldown)
+    for address in addresses:
+        client = ApiClient('http://' + address, session=session, **client_options)
+        async_client = None
+        if use_async:
+            async_client = AsyncApiClient('http://' + address, **client_options)
+        registry = None if targets else REGISTRY
+        targets[address] = Target(address, client, storj_collectors, registry,
+                                  poll_interval=storj_poll_interval,
+                                  min_collect_interval=storj_min_collect_interval,
+                                  sat_concurrency=storj_sat_concurrency,
+                                  sat_batch_size=storj_sat_batch_size,
+                                  data_dir=storj_data_dir,
+                                  paystub_interval=storj_paystub_interval,
+                                  snapshot_interval=storj_snapshot_interval,
+                                  snapshot_max_age=storj_snapshot_max_age,
+                                  async_client=async_client,
+                                  selective_json=storj_api_selective_json)
+
+    """Refresh data in background instead of on every scrape if poll interval is set"""
+    if use_async:
+        AsyncPoller(list(targets.values()), storj_poll_interval).start()
+    for target in targets.values():
+        target.start()
+
+    if storj_profiling:
+        logger.warning('Profiling of collection cycles enabled on /debug/profile')
+    start_http_server(storj_exporter_port, '', targets, storj_profiling,
+                      storj_http_server, storj_http_workers,
+                      storj_scrape_timeout_offset)
 
 
 if __name__ == '__main__':
@@ -1,46 +1,557 @@
+import asyncio
+import bisect
+import contextvars
+import json
 import requests
 import logging
-from requests.adapters import HTTPAdapter, Retry
+import threading
+import time
+from collections import OrderedDict
 from json.decoder import JSONDecodeError
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from deadline import DeadlineExceeded, current as current_deadline, remaining
+
+try:
+    import orjson
+    json_loads = orjson.loads
+    JSON_BACKEND = 'orjson'
+except ImportError:  # pragma: no cover
+    json_loads = json.loads
+    JSON_BACKEND = 'json'
 
 logger = logging.getLogger(__name__)
 
 
-class ApiClient(object):
+class ApiStatusError(Exception):
+    """Api responded with a non successful http status."""
+
+
+def make_session(pool_connections=10, pool_maxsize=10):
+    """
+    Returns a requests session with connection pools for `pool_connections` hosts,
+    that can be shared by api clients of multiple storagenodes. Requests are not
+    retried by the session, api clients retry them within the scrape deadline.
+    """
+    session = requests.Session()
+    http_adapter = HTTPAdapter(pool_connections=pool_connections,
+                               pool_maxsize=pool_maxsize)
+    session.mount('http://', http_adapter)
+    session.mount('https://', http_adapter)
+    return session
+
+
+def match_prefix(mapping, endpoint, default=None):
+    """Returns the value of the longest key of `mapping` that endpoint starts with."""
+    prefixes = [p for p in mapping if endpoint.startswith(p)]
+    return mapping[max(prefixes, key=len)] if prefixes else default
+
+
+def parse_response(body, keys=None):
+    """
+    Parses a json response body with the fastest available backend (orjson if
+    installed). If `keys` is set, only these top level keys are kept so that the
+    rest of the parsed response can be freed right away instead of being cached.
+    """
+    response_json = json_loads(body)
+    if keys is not None and isinstance(response_json, dict):
+        response_json = {k: response_json[k] for k in keys if k in response_json}
+    return response_json
+
+
+class ResponseCache(object):
+    """
+    Bounded LRU cache of api responses. `ttl` is either seconds for all endpoints
+    or a dict of seconds by endpoint prefix (e.g. 'sno/satellite/'), the longest
+    matching prefix applying. Least recently used responses are evicted above
+    max_size entries. With stale_ttl, responses are also kept to be served by
+    get_stale() for up to stale_ttl seconds when the api fails. Responses older
+    than both are expired on put() and ages(), so that endpoints no longer called
+    (e.g. of satellites that left the node) don't linger.
+    Not thread safe, callers synchronize access.
+    """
+    def __init__(self, ttl=0, max_size=256, stale_ttl=0):
+        self._ttl = ttl if isinstance(ttl, dict) else {'': ttl}
+        self._max_size = max_size
+        self._stale_ttl = stale_ttl
+        self._entries = OrderedDict()
+
+    def ttl(self, endpoint):
+        return match_prefix(self._ttl, endpoint, 0)
+
+    def get(self, endpoint):
+        entry = self._entries.get(endpoint, None)
+        if entry and time.monotonic() - entry[0] < self.ttl(endpoint):
+            self._entries.move_to_end(endpoint)
+            return entry[1]
+        return None
+
+    def get_stale(self, endpoint):
+        entry = self._entries.get(endpoint, None)
+        if entry and time.monotonic() - entry[0] < self._stale_ttl:
+            return entry[1]
+        return None
+
+    def _max_age(self, endpoint):
+        return max(self.ttl(endpoint), self._stale_ttl)
+
+    def put(self, endpoint, response):
+        if response is None or self._max_age(endpoint) <= 0:
+            return
+        now = time.monotonic()
+        self._expire(now)
+        self._entries[endpoint] = (now, response)
+        self._entries.move_to_end(endpoint)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def ages(self):
+        now = time.monotonic()
+        self._expire(now)
+        return {endpoint: now - entry[0]
+                for endpoint, entry in list(self._entries.items())}
+
+    def forget(self, endpoint):
+        self._entries.pop(endpoint, None)
+
+    def _expire(self, now):
+        for endpoint, entry in list(self._entries.items()):
+            if now - entry[0] >= self._max_age(endpoint):
+                del self._entries[endpoint]
+
+
+class CircuitBreaker(object):
+    """
+    Per-endpoint circuit breaker. After `failure_threshold` consecutive failures
+    of an endpoint its circuit opens and calls to it are rejected right away for
+    `cooldown` seconds. Then a call is let through to probe the api (half open):
+    success closes the circuit, failure opens it again. A failure_threshold of 0
+    disables the breaker. Not thread safe, callers synchronize access.
     """
-    Storagenode (Storj) api client.
+    CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+
+    def __init__(self, failure_threshold=3, cooldown=30):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = {}
+        self._opened_at = {}
+
+    def allow(self, endpoint):
+        return self.state(endpoint) != self.OPEN
+
+    def state(self, endpoint):
+        opened_at = self._opened_at.get(endpoint, None)
+        if opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - opened_at < self.cooldown:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def record(self, endpoint, success):
+        if success:
+            self._failures[endpoint] = 0
+            if self._opened_at.pop(endpoint, None) is not None:
+                logger.info(f'Circuit of {endpoint} closed, api is responding again')
+            return
+        failures = self._failures.get(endpoint, 0) + 1
+        self._failures[endpoint] = failures
+        if self.failure_threshold and failures >= self.failure_threshold:
+            if endpoint not in self._opened_at:
+                logger.warning(f'Circuit of {endpoint} opened after {failures} '
+                               f'failures, retrying in {self.cooldown}s')
+            self._opened_at[endpoint] = time.monotonic()
+
+    def states(self):
+        return {endpoint: self.state(endpoint) for endpoint in list(self._failures)}
+
+    def forget(self, endpoint):
+        self._failures.pop(endpoint, None)
+        self._opened_at.pop(endpoint, None)
+
+
+class Histogram(object):
+    """Histogram of observed values with a counter per bucket."""
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def cumulative(self):
+        """Returns (le, cumulative count) pairs ending with +Inf."""
+        result, total = [], 0
+        for le, count in zip(list(self.buckets) + [float('inf')], self.counts):
+            total += count
+            result.append((le, total))
+        return result
+
+
+class ApiStats(object):
+    """
+    Durations, response sizes, retries and errors of api requests by endpoint,
+    only counting requests actually sent to the api (not cached responses).
+    Sizes of endpoints under a size_groups prefix (e.g. of every satellite) are
+    counted together by prefix, as they hardly differ.
+    """
+    duration_buckets = (.05, .1, .25, .5, 1, 2.5)
+    size_buckets = (16384, 65536, 262144, 1048576)
+    size_groups = ('sno/satellite/', 'heldamount/paystubs/')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = {}
+        self.sizes = {}
+        self.retries = {}
+        self.errors = {}
+
+    def observe(self, endpoint, duration, size=None, retries=0, error=None):
+        with self._lock:
+            if endpoint not in self.durations:
+                self.durations[endpoint] = Histogram(self.duration_buckets)
+                self.retries[endpoint] = 0
+            self.durations[endpoint].observe(duration)
+            if size is not None:
+                size_endpoint = self._size_endpoint(endpoint)
+                if size_endpoint not in self.sizes:
+                    self.sizes[size_endpoint] = Histogram(self.size_buckets)
+                self.sizes[size_endpoint].observe(size)
+            self.retries[endpoint] += retries
+            if error:
+                self._add_error(endpoint, error)
+
+    def reject(self, endpoint, error='circuit_open'):
+        """
+        Counts a call rejected without sending a request, by an open circuit or
+        because the scrape deadline is reached.
+        """
+        with self._lock:
+            self._add_error(endpoint, error)
+
+    def _size_endpoint(self, endpoint):
+        for prefix in self.size_groups:
+            if endpoint.startswith(prefix):
+                return prefix
+        return endpoint
+
+    def _add_error(self, endpoint, error):
+        key = (endpoint, error)
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+    def forget(self, endpoint):
+        with self._lock:
+            for stats in (self.durations, self.sizes, self.retries):
+                stats.pop(endpoint, None)
+            for key in [k for k in self.errors if k[0] == endpoint]:
+                del self.errors[key]
+
+    def snapshot(self):
+        """Returns a consistent copy of all stats for exposing as metrics."""
+        with self._lock:
+            return {
+                'durations': {e: (h.cumulative(), h.sum)
+                              for e, h in self.durations.items()},
+                'sizes': {e: (h.cumulative(), h.sum) for e, h in self.sizes.items()},
+                'retries': dict(self.retries),
+                'errors': dict(self.errors),
+            }
+
+
+class _Call(object):
+    """An api request in flight that concurrent callers can wait for."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class BaseApiClient(object):
+    """
+    Storagenode (Storj) api client core, shared by ApiClient and AsyncApiClient
+    which only differ in the way http requests are made.
     (https://github.com/storj/storj/blob/main/storagenode/console/consoleserver/server.go)
+
+    Concurrent requests for the same endpoint are coalesced into a single api call
+    and successful responses are reused for cache_ttl seconds, see ResponseCache.
+    Endpoints failing repeatedly are not called until their circuit breaker
+    cooldown is over, see CircuitBreaker. Responses are parsed in full unless keys
+    to keep are selected by endpoint prefix with select_keys().
+
+    Each request attempt is bounded by `timeout` seconds and retried on connection
+    errors and timeouts. Within a scrape deadline (see deadline.scrape_deadline),
+    request timeouts and retries are capped to the time left and calls are skipped
+    once it is reached, marking the scrape as partial. Such calls do not count as
+    api failures.
+
+    When the api fails or the circuit of an endpoint is open, the last good
+    response is served if younger than stale_ttl seconds, `default` otherwise.
+    Stats of api calls are kept for ExporterCollector. `_lock` guards the state.
     """
-    def __init__(self, base_url, path="/api/", timeout=10, retries=2, backoff_factor=1):
-        self._api_url = base_url + path
+    def __init__(self, timeout=10, retries=2, backoff_factor=1, cache_ttl=0,
+                 cache_size=256, stale_ttl=0, breaker_failures=3, breaker_cooldown=30):
+        self._cache = ResponseCache(cache_ttl, cache_size, stale_ttl)
+        self._breaker = CircuitBreaker(breaker_failures, breaker_cooldown)
+        self._keys = {}
+        self._inflight = {}
+        self._last_success = {}
+        self._failing = set()
+        self.stats = ApiStats()
+        self.cache_hits = 0
+        self.cache_misses = 0
         self._timeout = timeout
-        self._retries = Retry(total=retries, backoff_factor=backoff_factor)
-        self._session = self._make_session()
+        self._retries = retries
+        self._backoff_factor = backoff_factor
+        self._lock = threading.Lock()
+
+    def _get_cached(self, endpoint):
+        cached = self._cache.get(endpoint)
+        if cached is not None:
+            self.cache_hits += 1
+            logger.debug(f"Using cached response for {endpoint}")
+        return cached
+
+    def _reject(self, endpoint):
+        """Returns True, counting the call, if the circuit of endpoint is open."""
+        if self._breaker.allow(endpoint):
+            return False
+        logger.debug(f"Circuit of {endpoint} is open, not calling the api")
+        self._failing.add(endpoint)
+        self.stats.reject(endpoint)
+        return True
+
+    def _record(self, endpoint, result):
+        success = result is not None
+        self._breaker.record(endpoint, success)
+        if success:
+            self._cache.put(endpoint, result)
+            self._last_success[endpoint] = time.monotonic()
+            self._failing.discard(endpoint)
+        else:
+            self._failing.add(endpoint)
+
+    def _result(self, endpoint, result, default):
+        if result is None:
+            with self._lock:
+                result = self._cache.get_stale(endpoint)
+            if result is not None:
+                logger.debug(f"Serving stale response for {endpoint}")
+        return result if result is not None else default
+
+    def is_failing(self, endpoint):
+        """Whether the latest call of endpoint failed, even if served stale data."""
+        return endpoint in self._failing
+
+    def select_keys(self, prefix, keys):
+        """Adds `keys` to the top level keys kept in responses of `prefix` endpoints."""
+        self._keys[prefix] = sorted(set(self._keys.get(prefix, [])) | set(keys))
+
+    def cache_stats(self):
+        return {'hit': self.cache_hits, 'miss': self.cache_misses}
+
+    def cache_ages(self):
+        with self._lock:
+            return self._cache.ages()
+
+    def breaker_states(self):
+        with self._lock:
+            return self._breaker.states()
+
+    def staleness(self):
+        """Seconds since the latest successful api response by endpoint."""
+        now = time.monotonic()
+        with self._lock:
+            return {endpoint: now - last_success
+                    for endpoint, last_success in self._last_success.items()}
+
+    def forget(self, endpoint):
+        """
+        Drops all state kept for endpoint, e.g. of a satellite that left the node,
+        so that its cache entry, staleness, breaker state and stats don't linger.
+        """
+        with self._lock:
+            self._cache.forget(endpoint)
+            self._breaker.forget(endpoint)
+            self._last_success.pop(endpoint, None)
+            self._failing.discard(endpoint)
+        self.stats.forget(endpoint)
+
+    def _lookup(self, endpoint, new_call):
+        """
+        Returns (cached, call, leader): the cached response if any, else the call
+        in flight to wait for or, if leader, the new call to make, created with
+        `new_call()`. call is None if the circuit of endpoint is open.
+        """
+        with self._lock:
+            cached = self._get_cached(endpoint)
+            if cached is not None:
+                return cached, None, False
+            call = self._inflight.get(endpoint, None)
+            if call:
+                self.cache_hits += 1
+                logger.debug(f"Waiting for request to {endpoint} already in flight")
+                return None, call, False
+            if self._reject(endpoint):
+                return None, None, False
+            call = self._inflight[endpoint] = new_call()
+            self.cache_misses += 1
+            return None, call, True
+
+    def _finish(self, endpoint, result, cut_short):
+        """Ends the call in flight for endpoint, recording its result if complete."""
+        if cut_short:
+            self._mark_partial()
+        with self._lock:
+            del self._inflight[endpoint]
+            if not cut_short:
+                self._record(endpoint, result)
+
+    def _observe(self, endpoint, started, size, attempts, error):
+        if attempts:
+            self.stats.observe(endpoint, time.monotonic() - started, size,
+                               len(attempts) - 1, error)
+        else:
+            self.stats.reject(endpoint, error)
+
+    @staticmethod
+    def _mark_partial():
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.partial = True
+
+    @staticmethod
+    def _deadline_reached():
+        deadline = current_deadline()
+        return deadline is not None and deadline.remaining() <= 0
+
+    def _first_timeout(self, url):
+        """Timeout of the first attempt, capped to the deadline."""
+        timeout = remaining(self._timeout)
+        if timeout <= 0:
+            raise DeadlineExceeded(f'No time left to request {url}')
+        return timeout
+
+    def _retry(self, url, attempt, error):
+        """
+        Returns (backoff, timeout) of the retry of a failed attempt as long as it
+        would start before the scrape deadline, raises `error` otherwise or
+        DeadlineExceeded if the attempt was cut short by the deadline.
+        """
+        if self._deadline_reached():
+            raise DeadlineExceeded(f'Request to {url} cut short') from error
+        backoff = self._backoff(attempt)
+        timeout = self._retry_timeout(backoff)
+        if attempt == self._retries or timeout <= 0:
+            raise error
+        logger.debug(f"Retrying request to {url}", exc_info=error)
+        return backoff, timeout
+
+    def _backoff(self, attempt):
+        """Seconds to wait before retrying, with the backoff schedule of urllib3."""
+        return self._backoff_factor * (2 ** attempt) if attempt else 0
+
+    def _retry_timeout(self, backoff):
+        """Timeout of a retry starting after backoff, capped to the deadline."""
+        deadline = current_deadline()
+        if deadline is None:
+            return self._timeout
+        return min(self._timeout, deadline.remaining() - backoff)
+
+
+class ApiClient(BaseApiClient):
+    """
+    Api client making requests with a requests session, shared by threads.
+    """
+    def __init__(self, base_url, path="/api/", timeout=10, retries=2, backoff_factor=1,
+                 pool_maxsize=10, cache_ttl=0, cache_size=256, session=None,
+                 stale_ttl=0, breaker_failures=3, breaker_cooldown=30):
+        super().__init__(timeout, retries, backoff_factor, cache_ttl, cache_size,
+                         stale_ttl, breaker_failures, breaker_cooldown)
+        self._api_url = base_url + path
+        self._pool_maxsize = pool_maxsize
+        self._session = session or self._make_session()
 
     def _make_session(self):
-        session = requests.Session()
-        http_adapter = HTTPAdapter(max_retries=self._retries)
-        session.mount('http://', http_adapter)
-        session.mount('https://', http_adapter)
-        return session
+        return make_session(pool_maxsize=self._pool_maxsize)
 
     def _get(self, endpoint, default=None):
-        response_json = default
+        cached, call, leader = self._lookup(endpoint, _Call)
+        if cached is not None:
+            return cached
+        if leader:
+            self._call(endpoint, call)
+        elif call:
+            self._wait(endpoint, call)
+        return self._result(endpoint, call.result if call else None, default)
+
+    def _call(self, endpoint, call):
+        cut_short = False
         try:
-            url = self._api_url + endpoint
-            response = self._session.get(url=url, timeout=self._timeout)
+            call.result = self._request(endpoint)
+        except DeadlineExceeded:
+            cut_short = True
+        finally:
+            self._finish(endpoint, call.result, cut_short)
+            call.done.set()
+
+    def _wait(self, endpoint, call):
+        deadline = current_deadline()
+        if not call.done.wait(deadline.remaining() if deadline else None):
+            logger.debug(f"Scrape deadline reached waiting for {endpoint}")
+            deadline.partial = True
+
+    def _request(self, endpoint):
+        """Returns parsed response or None, raises DeadlineExceeded if cut short."""
+        response_json = None
+        response = None
+        error = None
+        attempts = []
+        url = self._api_url + endpoint
+        started = time.monotonic()
+        try:
+            response = self._get_with_retries(url, attempts)
             response.raise_for_status()
-            response_json = response.json()
-        except requests.exceptions.RequestException:
+            response_json = parse_response(response.content,
+                                           match_prefix(self._keys, endpoint))
+        except DeadlineExceeded:
+            error = 'deadline'
+            logger.debug(f"Scrape deadline reached, giving up on {url}")
+        except requests.exceptions.RequestException as e:
+            error = self._error_type(e)
             logger.debug(f"Error while getting data from {url}", exc_info=True)
-            pass
-        except JSONDecodeError:
+        except ValueError:
+            error = 'json_decode'
             logger.error(f"Failed to parse json response from {url}", exc_info=True)
-            pass
         else:
             logger.debug(f"Got response from {url}")
+        self._observe(endpoint, started,
+                      len(response.content) if response is not None else None,
+                      attempts, error)
+        if error == 'deadline':
+            raise DeadlineExceeded(f'Scrape deadline reached requesting {url}')
         return response_json
 
+    def _get_with_retries(self, url, attempts):
+        timeout = self._first_timeout(url)
+        for attempt in range(self._retries + 1):
+            attempts.append(attempt)
+            try:
+                return self._session.get(url=url, timeout=timeout)
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout) as e:
+                backoff, timeout = self._retry(url, attempt, e)
+                time.sleep(backoff)
+
+    @staticmethod
+    def _error_type(exception):
+        if isinstance(exception, requests.exceptions.Timeout):
+            return 'timeout'
+        if isinstance(exception, requests.exceptions.HTTPError):
+            return 'http_status'
+        if isinstance(exception, requests.exceptions.ConnectionError):
+            return 'connection'
+        return 'request'
+
     def node(self):
         return self._get('sno/', {})
 
@@ -49,3 +560,203 @@ class ApiClient(object):
 
     def satellite(self, sat_id):
         return self._get('sno/satellite/' + sat_id, {})
+
+    def periods(self):
+        return self._get('heldamount/periods', [])
+
+    def paystubs(self, period):
+        return self._get('heldamount/paystubs/' + period, [])
+
+    def held_history(self):
+        return self._get('heldamount/held-history', [])
+
+
+class AsyncApiClient(BaseApiClient):
+    """
+    Api client with the same api as ApiClient, awaitable, making requests on
+    asyncio streams so that a single event loop can run many concurrent api calls
+    without threads. Calls run in tasks of the event loop they are first awaited
+    from, which should be the only one using the client.
+    """
+    def __init__(self, base_url, path="/api/", timeout=10, retries=2, backoff_factor=1,
+                 cache_ttl=0, cache_size=256, stale_ttl=0, breaker_failures=3,
+                 breaker_cooldown=30):
+        super().__init__(timeout, retries, backoff_factor, cache_ttl, cache_size,
+                         stale_ttl, breaker_failures, breaker_cooldown)
+        url = urlsplit(base_url)
+        self._host = url.hostname
+        self._port = url.port or 80
+        self._api_path = url.path.rstrip('/') + path
+
+    async def _get(self, endpoint, default=None):
+        cached, task, _ = self._lookup(
+            endpoint, lambda: asyncio.ensure_future(self._call(endpoint)))
+        if cached is not None:
+            return cached
+        result = await self._wait(endpoint, task) if task else None
+        return self._result(endpoint, result, default)
+
+    async def _call(self, endpoint):
+        result = None
+        cut_short = False
+        try:
+            result = await self._request(endpoint)
+        except DeadlineExceeded:
+            cut_short = True
+        finally:
+            self._finish(endpoint, result, cut_short)
+        return result
+
+    async def _wait(self, endpoint, task):
+        """Waits for the call task, shielded so that callers can't cancel it."""
+        deadline = current_deadline()
+        try:
+            return await asyncio.wait_for(asyncio.shield(task),
+                                          deadline.remaining() if deadline else None)
+        except asyncio.TimeoutError:
+            logger.debug(f"Scrape deadline reached waiting for {endpoint}")
+            self._mark_partial()
+            return None
+
+    async def _request(self, endpoint):
+        """Returns parsed response or None, raises DeadlineExceeded if cut short."""
+        response_json = None
+        body = None
+        error = None
+        attempts = []
+        url = self._api_path + endpoint
+        started = time.monotonic()
+        try:
+            body = await self._get_with_retries(url, attempts)
+            response_json = parse_response(body, match_prefix(self._keys, endpoint))
+        except DeadlineExceeded:
+            error = 'deadline'
+            logger.debug(f"Scrape deadline reached, giving up on {url}")
+        except JSONDecodeError:
+            error = 'json_decode'
+            logger.error(f"Failed to parse json response from {url}", exc_info=True)
+        except (ApiStatusError, OSError, EOFError, ValueError,
+                asyncio.TimeoutError) as e:
+            error = self._error_type(e)
+            logger.debug(f"Error while getting data from {url}", exc_info=True)
+        else:
+            logger.debug(f"Got response from {url}")
+        self._observe(endpoint, started, len(body) if body is not None else None,
+                      attempts, error)
+        if error == 'deadline':
+            raise DeadlineExceeded(f'Scrape deadline reached requesting {url}')
+        return response_json
+
+    async def _get_with_retries(self, url, attempts):
+        timeout = self._first_timeout(url)
+        for attempt in range(self._retries + 1):
+            attempts.append(attempt)
+            try:
+                return await asyncio.wait_for(self._http_get(url), timeout)
+            except (OSError, EOFError, asyncio.TimeoutError) as e:
+                backoff, timeout = self._retry(url, attempt, e)
+                await asyncio.sleep(backoff)
+
+    async def _http_get(self, url):
+        reader, writer = await asyncio.open_connection(self._host, self._port)
+        try:
+            writer.write(f'GET {url} HTTP/1.1\r\nHost: {self._host}:{self._port}\r\n'
+                         'Accept: application/json\r\nConnection: close\r\n\r\n'
+                         .encode('latin-1'))
+            await writer.drain()
+            status = (await reader.readline()).split(maxsplit=2)
+            if len(status) < 2 or not status[1].startswith(b'2'):
+                raise ApiStatusError(f'Unexpected response status {status}')
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                key, _, value = line.decode('latin-1').partition(':')
+                headers[key.strip().lower()] = value.strip()
+            if 'chunked' in headers.get('transfer-encoding', ''):
+                return await self._read_chunked(reader)
+            if 'content-length' in headers:
+                return await reader.readexactly(int(headers['content-length']))
+            return await reader.read()
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_chunked(reader):
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                break
+            body += await reader.readexactly(size)
+            await reader.readline()
+        return bytes(body)
+
+    @staticmethod
+    def _error_type(exception):
+        if isinstance(exception, asyncio.TimeoutError):
+            return 'timeout'
+        if isinstance(exception, ApiStatusError):
+            return 'http_status'
+        if isinstance(exception, (OSError, EOFError)):
+            return 'connection'
+        return 'request'
+
+    async def node(self):
+        return await self._get('sno/', {})
+
+    async def payout(self):
+        return await self._get('sno/estimated-payout', {})
+
+    async def satellite(self, sat_id):
+        return await self._get('sno/satellite/' + sat_id, {})
+
+    async def periods(self):
+        return await self._get('heldamount/periods', [])
+
+    async def paystubs(self, period):
+        return await self._get('heldamount/paystubs/' + period, [])
+
+    async def held_history(self):
+        return await self._get('heldamount/held-history', [])
+
+
+class AwaitableClient(object):
+    """
+    Awaitable api of a sync api client, so that collectors refresh with the same
+    code from either client. Calls run one at a time in the event loop thread
+    unless `threaded`, in which case they run in the default executor of the loop,
+    in a copy of the caller context to share its scrape deadline. Other attributes
+    are the ones of `client`.
+    """
+    def __init__(self, client, threaded=False):
+        self.client = client
+        self.threaded = threaded
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    async def _call(self, method, *args):
+        if not self.threaded:
+            return method(*args)
+        return await asyncio.get_event_loop().run_in_executor(
+            None, contextvars.copy_context().run, method, *args)
+
+    async def node(self):
+        return await self._call(self.client.node)
+
+    async def payout(self):
+        return await self._call(self.client.payout)
+
+    async def satellite(self, sat_id):
+        return await self._call(self.client.satellite, sat_id)
+
+    async def periods(self):
+        return await self._call(self.client.periods)
+
+    async def paystubs(self, period):
+        return await self._call(self.client.paystubs, period)
+
+    async def held_history(self):
+        return await self._call(self.client.held_history)
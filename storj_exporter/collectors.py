@@ -1,59 +1,155 @@
+import asyncio
+import contextvars
 import logging
-from metric_templates import GaugeMetricTemplate, InfoMetricTemplate
-from utils import sum_list_of_dicts, safe_list_get
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from prometheus_client.core import (
+    CounterMetricFamily,
+    GaugeMetricFamily,
+    HistogramMetricFamily
+)
+from prometheus_client.utils import floatToGoString
+from api_wrapper import AwaitableClient
+from metric_templates import (
+    CounterMetricTemplate,
+    GaugeMetricTemplate,
+    InfoMetricTemplate
+)
+from series import DailySeries
+from store import PermanentStore
+from utils import to_float, to_timestamp
+from deadline import current as current_deadline
 
 logger = logging.getLogger(__name__)
 
 
 class StorjCollector(object):
-    def __init__(self, client):
+    """
+    Base collector. Data is refreshed from the api on every collect() unless
+    refresh_on_collect is disabled, in which case collect() only reads the data
+    of the latest refresh() or refresh_async() (e.g. done by a background poller).
+    Data is only ever fetched by the async _refresh_data(): refresh_async() runs it
+    with an AsyncApiClient and refresh() with the sync client of the collector,
+    wrapped in an AwaitableClient, making up to max_workers api calls at a time.
+    api_keys are the top level keys of api responses, by endpoint, that collector
+    uses and that the client needs to keep when parsing responses selectively.
+    Durations in seconds of the latest refresh and collect are kept for
+    ExporterCollector, collect including refresh if done on collect.
+    No data is fetched on init: describe() gives metrics without samples for
+    registration and collect() before the first refresh yields no samples.
+    """
+    api_keys = {}
+    max_workers = 1
+
+    def __init__(self, client, refresh_on_collect=True):
         self.client = client
-        self._refresh_data()
+        self.refresh_on_collect = refresh_on_collect
+        self.refresh_duration = None
+        self.collect_duration = None
+        self._plans = [t.compile() for t in self._get_metric_template_map()]
+
+    def refresh(self):
+        asyncio.run(self.refresh_async(
+            AwaitableClient(self.client, threaded=self.max_workers > 1)))
 
-    def _refresh_data(self):
+    async def refresh_async(self, client):
+        logger.debug(f'Refreshing data for {self.__class__.__name__}')
+        started = time.monotonic()
+        await self._refresh_data(client)
+        self.refresh_duration = time.monotonic() - started
+
+    async def _refresh_data(self, client):
         pass
 
     def collect(self):
-        pass
+        logger.debug(f'{self.__class__.__name__}.collect() called')
+        started = time.monotonic()
+        if self.refresh_on_collect:
+            self.refresh()
+        yield from self.collect_latest(started)
+
+    def collect_latest(self, started):
+        """Yields metrics of the latest refreshed data, collect started at `started`."""
+        logger.debug(f'Creating metrics objects for {self.__class__.__name__}')
+        metrics = list(self._get_metrics())
+        self.collect_duration = time.monotonic() - started
+        yield from metrics
+
+    def describe(self):
+        """Metrics without samples, so that registering makes no api calls."""
+        return [plan.new_metric() for plan in self._plans]
+
+    def _get_metrics(self):
+        _data = self._get_metric_data()
+        for plan in self._plans:
+            metric = plan.new_metric()
+            plan.add_samples(metric, _data)
+            yield metric
+
+    def _get_metric_data(self):
+        return {}
 
     def _get_metric_template_map(self):
-        pass
+        """Metric templates, compiled into extraction plans once on init."""
+        return []
 
 
 class NodeCollector(StorjCollector):
-    def _refresh_data(self):
-        self._node = self.client.node()
+    """
+    storj_up is 0 when the node api call failed, even if stale node data is
+    served by the client in the meantime.
+    """
+    api_keys = {
+        'sno/': ['nodeID', 'wallet', 'upToDate', 'version', 'allowedVersion',
+                 'quicStatus', 'diskSpace', 'bandwidth'],
+    }
+    _node = {}
+    _up = False
 
-    def collect(self):
-        logger.debug(f'{self.__class__.__name__}.collect() called, refreshing data ...')
-        self._refresh_data()
-        logger.debug(f'Creating metrics objects for {self.__class__.__name__}')
-        _metric_template_map = self._get_metric_template_map()
-        for template in _metric_template_map:
-            template.add_metric_samples()
-            yield template.metric_object
+    async def _refresh_data(self, client):
+        self._node = await client.node()
+        self._up = bool(self._node) and not client.is_failing('sno/')
+
+    @property
+    def up(self):
+        return self._up
+
+    def _get_metric_data(self):
+        return self._node
+
+    def describe(self):
+        return super().describe() + [self._new_up_metric()]
+
+    def _get_metrics(self):
+        yield from super()._get_metrics()
+        up = self._new_up_metric()
+        up.add_metric([], 1 if self._up else 0)
+        yield up
+
+    @staticmethod
+    def _new_up_metric():
+        return GaugeMetricFamily('storj_up', 'Storj node api is reachable and '
+                                             'returned node data')
 
     def _get_metric_template_map(self):
-        _diskSpace = self._node.get('diskSpace', None)
-        _bandwidth = self._node.get('bandwidth', None)
         _metric_template_map = [
             InfoMetricTemplate(
                 metric_name='storj_node',
                 documentation='Storj node info',
-                data_dict=self._node,
                 data_keys=['nodeID', 'wallet', 'upToDate', 'version',
                            'allowedVersion', 'quicStatus']
             ),
             GaugeMetricTemplate(
                 metric_name='storj_total_diskspace',
                 documentation='Storj total diskspace metrics',
-                data_dict=_diskSpace,
+                nested_path=['diskSpace'],
                 data_keys=['used', 'available', 'trash']
             ),
             GaugeMetricTemplate(
                 metric_name='storj_total_bandwidth',
                 documentation='Storj total bandwidth metrics',
-                data_dict=_bandwidth,
+                nested_path=['bandwidth'],
                 data_keys=['used', 'available']
             ),
         ]
@@ -61,141 +157,450 @@ class NodeCollector(StorjCollector):
 
 
 class SatCollector(StorjCollector):
-    def _refresh_data(self):
-        self._node = self.client.node()
+    """
+    Satellite details are fetched concurrently, up to max_workers at a time,
+    sharing the scrape deadline of the refresh: once reached, satellites not
+    fetched yet are left without data.
 
-    def collect(self):
-        logger.debug(f'{self.__class__.__name__}.collect() called, refreshing data ...')
-        self._refresh_data()
-        logger.debug(f'Creating metrics objects for {self.__class__.__name__}')
-        _metric_template_map = self._get_metric_template_map({}, 'id', 'url')
-        for satellite in self._node.get('satellites', []):
+    With batch_size, each refresh only fetches the next batch_size satellites in
+    round-robin order, plus satellites without data yet. The others keep the data
+    of their latest fetch, updated with suspended and disqualified flags of node
+    data, so each satellite is at most ceil(satellites / batch_size) refreshes old.
+    A satellite whose fetch fails or is skipped keeps its latest data too, and if
+    the scrape deadline cut the batch short, the next refresh starts with the
+    first satellite of it left without data.
+    """
+    api_keys = {
+        'sno/': ['satellites'],
+        'sno/satellite/': ['storageSummary', 'bandwidthSummary', 'egressSummary',
+                           'ingressSummary', 'currentStorageUsed', 'audits',
+                           'bandwidthDaily', 'storageDaily'],
+    }
+    _node = {}
+    _satellites = []
+
+    def __init__(self, client, refresh_on_collect=True, max_workers=4, batch_size=0):
+        self.max_workers = max(1, max_workers)
+        self.batch_size = max(0, batch_size)
+        self._cursor = 0
+        super().__init__(client, refresh_on_collect)
+
+    async def _refresh_data(self, client):
+        _node = await client.node()
+        _valid_satellites = self._get_valid_satellites(_node)
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def _get_sat_data(satellite):
+            async with semaphore:
+                return await self._get_sat_data(client, satellite)
+
+        _fetched = await asyncio.gather(
+            *[_get_sat_data(s) for s in self._next_batch(_valid_satellites)])
+        if not client.is_failing('sno/'):
+            self._forget_departed(client, _valid_satellites)
+        _deadline = current_deadline()
+        if _deadline and _deadline.partial:
+            self._rewind_cursor(_valid_satellites, _fetched)
+        self._node = _node
+        self._satellites = self._merge_satellites(_valid_satellites, list(_fetched))
+
+    def _forget_departed(self, client, _valid_satellites):
+        """Drops api client state of satellites no longer listed by the node."""
+        _sat_ids = {s.get('id', None) for s in _valid_satellites}
+        for _, _sat_id, _ in self._satellites:
+            if _sat_id and _sat_id not in _sat_ids:
+                logger.info(f'Satellite {_sat_id} left the node, forgetting it')
+                client.forget('sno/satellite/' + _sat_id)
+
+    def _batched(self, _valid_satellites):
+        return 0 < self.batch_size < len(_valid_satellites)
+
+    def _next_batch(self, _valid_satellites):
+        """Satellites to fetch in this refresh, all of them without batch_size."""
+        if not self._batched(_valid_satellites):
+            return _valid_satellites
+        _count = len(_valid_satellites)
+        _start = self._cursor % _count
+        _batch_ids = {_valid_satellites[(_start + i) % _count].get('id', None)
+                      for i in range(self.batch_size)}
+        self._cursor = _start + self.batch_size
+        _known_ids = {_sat_id for _sat_data, _sat_id, _ in self._satellites
+                      if self._has_data(_sat_data)}
+        _fetch_ids = _batch_ids | {s.get('id', None) for s in _valid_satellites
+                                   if s.get('id', None) not in _known_ids}
+        return [s for s in _valid_satellites if s.get('id', None) in _fetch_ids]
+
+    def _rewind_cursor(self, _valid_satellites, _fetched):
+        """Moves the cursor back to the first satellite of the batch left empty."""
+        if not self._batched(_valid_satellites):
+            return
+        _count = len(_valid_satellites)
+        _start = self._cursor - self.batch_size
+        _empty_ids = {_sat_id for _sat_data, _sat_id, _ in _fetched
+                      if not self._has_data(_sat_data)}
+        for i in range(self.batch_size):
+            if _valid_satellites[(_start + i) % _count].get('id', None) in _empty_ids:
+                self._cursor = _start + i
+                return
+
+    @staticmethod
+    def _has_data(_sat_data):
+        return bool(_sat_data) and isinstance(_sat_data, dict)
+
+    def _merge_satellites(self, _valid_satellites, _fetched):
+        """
+        Satellites in node order, the ones not fetched, or fetched without data in
+        batch mode, with their latest data.
+        """
+        if not self._batched(_valid_satellites):
+            return _fetched
+        _fetched = [s for s in _fetched if self._has_data(s[0])]
+        _latest = {_sat_id: _sat_data for _sat_data, _sat_id, _ in self._satellites
+                   if self._has_data(_sat_data)}
+        _latest.update((_sat_id, _sat_data) for _sat_data, _sat_id, _ in _fetched)
+        _fetched_ids = {_sat_id for _, _sat_id, _ in _fetched}
+        _satellites = []
+        for satellite in _valid_satellites:
+            _sat_id = satellite.get('id', None)
+            _sat_data = _latest.get(_sat_id, {})
+            if _sat_id not in _fetched_ids and _sat_data:
+                _sat_data = dict(_sat_data, **self._node_flags(satellite))
+            _satellites.append((_sat_data, _sat_id, satellite.get('url', None)))
+        return _satellites
+
+    def _get_valid_satellites(self, _node):
+        _valid_satellites = []
+        for satellite in _node.get('satellites', []):
             logger.debug(f'Processing satellite {satellite}')
             if satellite and isinstance(satellite, dict):
-                _sat_data, _sat_id, _sat_url = self._get_sat_data(satellite)
-                for template in _metric_template_map:
-                    template.data_dict = _sat_data
-                    template.extra_labels_values = [_sat_id, _sat_url]
-                    template.add_metric_samples()
+                _valid_satellites.append(satellite)
             else:
                 logger.debug('Node data for satellite is invalid, skipping satellite')
-        for template in _metric_template_map:
-            yield template.metric_object
+        return _valid_satellites
+
+    def _get_metrics(self):
+        _satellites = self._satellites
+        for plan in self._plans:
+            metric = plan.new_metric()
+            for _sat_data, _sat_id, _sat_url in _satellites:
+                plan.add_samples(metric, _sat_data, (_sat_id, _sat_url))
+            yield metric
 
-    def _get_sat_data(self, satellite):
+    async def _get_sat_data(self, client, satellite):
         _sat_data = {}
         _sat_id = satellite.get('id', None)
         _sat_url = satellite.get('url', None)
+        if self._can_get_sat_data(_sat_id, _sat_url):
+            _sat_data = self._check_sat_data(satellite, await client.satellite(_sat_id))
+        return _sat_data, _sat_id, _sat_url
+
+    def _can_get_sat_data(self, _sat_id, _sat_url):
         if _sat_id and _sat_url:
             logger.debug(f'Getting data for satellite {_sat_url} ({_sat_id})')
-            _sat_data = self.client.satellite(_sat_id)
-            if _sat_data and isinstance(_sat_data, dict):
-                _sat_data = self._prepare_sat_data(satellite, _sat_data)
-            else:
-                logger.debug('Satellite data is invalid, skipping satellite')
+            return True
+        logger.debug(f'_sat_id = {_sat_id} and _sat_url = {_sat_url}, '
+                     'skipping satellite ...')
+        return False
+
+    def _check_sat_data(self, satellite, _sat_data):
+        if _sat_data and isinstance(_sat_data, dict):
+            _sat_data = self._prepare_sat_data(satellite, _sat_data)
         else:
-            logger.debug(f'_sat_id = {_sat_id} and _sat_url = {_sat_url}, '
-                         'skipping satellite ...')
-        return _sat_data, _sat_id, _sat_url
+            logger.debug('Satellite data is invalid, skipping satellite')
+        return _sat_data
 
     def _prepare_sat_data(self, satellite, _sat_data):
         logger.debug('Preparing satellite data for adding samples ...')
-        _suspended = 1 if satellite.get('suspended', None) else 0
-        _sat_data.update({'suspended': _suspended})
-
-        _disqualified = 1 if satellite.get('disqualified', None) else 0
-        _sat_data.update({'disqualified': _disqualified})
-
-        _month_ingress = sum_list_of_dicts(
-            _sat_data.get('bandwidthDaily', {}), "ingress")
-        _sat_data.update({'month_ingress': _month_ingress})
+        _sat_data = dict(_sat_data)
+        _sat_data.update(self._node_flags(satellite))
 
-        _month_egress = sum_list_of_dicts(
-            _sat_data.get('bandwidthDaily', {}), "egress")
-        _sat_data.update({'month_egress': _month_egress})
-
-        _day_bandwidth = safe_list_get(_sat_data.get('bandwidthDaily', [{}]), -1)
-        _sat_data.update({'day_bandwidth': _day_bandwidth})
-
-        _day_storage = safe_list_get(_sat_data.get('storageDaily', None), -1)
-        _sat_data.update({'day_storage': _day_storage})
+        _bandwidth = DailySeries(_sat_data.get('bandwidthDaily', None))
+        _storage = DailySeries(_sat_data.get('storageDaily', None))
+        _sat_data.update({'month_ingress': _bandwidth.total('ingress'),
+                          'month_egress': _bandwidth.total('egress'),
+                          'day_bandwidth': _bandwidth.last(),
+                          'day_storage': _storage.last()})
         return _sat_data
 
-    def _get_metric_template_map(self, _sat_data, _sat_id, _sat_url):
+    @staticmethod
+    def _node_flags(satellite):
+        return {'suspended': 1 if satellite.get('suspended', None) else 0,
+                'disqualified': 1 if satellite.get('disqualified', None) else 0}
+
+    def _get_metric_template_map(self):
         _metric_template_map = [
             GaugeMetricTemplate(
                 metric_name='storj_sat_summary',
                 documentation='Storj satellite summary metrics',
-                data_dict=_sat_data,
                 data_keys=['storageSummary', 'bandwidthSummary', 'egressSummary',
                             'ingressSummary', 'currentStorageUsed', 'disqualified',
                             'suspended'],
-                labels=['type', 'satellite', 'url'],
-                extra_labels_values=[_sat_id, _sat_url]
+                labels=['type', 'satellite', 'url']
             ),
             GaugeMetricTemplate(
                 metric_name='storj_sat_audit',
                 documentation='Storj satellite audit metrics',
-                data_dict=_sat_data,
                 nested_path=['audits'],
                 data_keys=['auditScore', 'suspensionScore', 'onlineScore'],
-                labels=['type', 'satellite', 'url'],
-                extra_labels_values=[_sat_id, _sat_url]
+                labels=['type', 'satellite', 'url']
             ),
             GaugeMetricTemplate(
                 metric_name='storj_sat_month_egress',
                 documentation='Storj satellite egress since current month start',
-                data_dict=_sat_data,
                 nested_path=['month_egress'],
                 data_keys=['repair', 'audit', 'usage'],
-                labels=['type', 'satellite', 'url'],
-                extra_labels_values=[_sat_id, _sat_url]
+                labels=['type', 'satellite', 'url']
             ),
             GaugeMetricTemplate(
                 metric_name='storj_sat_month_ingress',
                 documentation='Storj satellite ingress since current month start',
-                data_dict=_sat_data,
                 nested_path=['month_ingress'],
                 data_keys=['repair', 'usage'],
-                labels=['type', 'satellite', 'url'],
-                extra_labels_values=[_sat_id, _sat_url]
+                labels=['type', 'satellite', 'url']
             ),
             GaugeMetricTemplate(
                 metric_name='storj_sat_day_storage',
                 documentation='Storj satellite data stored on disk since current '
                               'day start',
-                data_dict=_sat_data,
                 nested_path=['day_storage'],
                 data_keys=['atRestTotal'],
-                labels=['type', 'satellite', 'url'],
-                extra_labels_values=[_sat_id, _sat_url]
+                labels=['type', 'satellite', 'url']
             ),
         ]
         return _metric_template_map
 
 
-class PayoutCollector(StorjCollector):
-    def _refresh_data(self):
-        self._payout = self.client.payout()
+class DailyCollector(SatCollector):
+    """
+    Daily satellite bandwidth and storage of the current month, one sample per day
+    timestamped with the day start (intervalStart), except for the latest day:
+    still open, its value grows between refreshes and Prometheus would drop the
+    new values of a timestamp it already has, so it is exposed without timestamp
+    and updates on every scrape. Converted days are kept in an index by satellite
+    and day so that a refresh only converts days that are new or changed, and
+    satellite responses served again from the api cache are not walked at all.
+    """
+    api_keys = {
+        'sno/': ['satellites'],
+        'sno/satellite/': ['bandwidthDaily', 'storageDaily'],
+    }
+    # metric name, documentation, daily api key, nested path, data keys
+    daily_metrics = (
+        ('storj_sat_daily_egress', 'Storj satellite egress by day',
+         'bandwidthDaily', 'egress', ('repair', 'audit', 'usage')),
+        ('storj_sat_daily_ingress', 'Storj satellite ingress by day',
+         'bandwidthDaily', 'ingress', ('repair', 'usage')),
+        ('storj_sat_daily_storage', 'Storj satellite data stored on disk by day',
+         'storageDaily', None, ('atRestTotal', 'atRestTotalBytes')),
+    )
+    daily_keys = ('bandwidthDaily', 'storageDaily')
 
-    def collect(self):
-        logger.debug(f'{self.__class__.__name__}.collect() called, refreshing data ...')
-        self._refresh_data()
-        logger.debug(f'Creating metrics objects for {self.__class__.__name__}')
-        _metric_template_map = self._get_metric_template_map()
-        for template in _metric_template_map:
-            template.add_metric_samples()
-            yield template.metric_object
+    def __init__(self, client, refresh_on_collect=True, max_workers=4, batch_size=0):
+        self._index = {}
+        super().__init__(client, refresh_on_collect, max_workers, batch_size)
+
+    def describe(self):
+        return [self._new_metric(name, documentation)
+                for name, documentation, _, _, _ in self.daily_metrics]
+
+    def _get_metrics(self):
+        metrics = {name: self._new_metric(name, documentation)
+                   for name, documentation, _, _, _ in self.daily_metrics}
+        for _sat_data, _sat_id, _sat_url in self._satellites:
+            for name, samples in _sat_data.get('days', {}).items():
+                metric = metrics[name]
+                for key, value, timestamp in samples:
+                    metric.add_metric([key, _sat_id, _sat_url], value, timestamp)
+        return metrics.values()
+
+    @staticmethod
+    def _new_metric(name, documentation):
+        return GaugeMetricFamily(name, documentation,
+                                 labels=['type', 'satellite', 'url'])
+
+    def _merge_satellites(self, _valid_satellites, _fetched):
+        _satellites = super()._merge_satellites(_valid_satellites, _fetched)
+        _sat_ids = {_sat_id for _, _sat_id, _ in _satellites}
+        for _sat_id in [i for i in self._index if i not in _sat_ids]:
+            del self._index[_sat_id]
+        return _satellites
+
+    def _prepare_sat_data(self, satellite, _sat_data):
+        _sat_id = satellite.get('id', None)
+        _response, _days, _prepared = self._index.get(_sat_id, (None, {}, None))
+        if _sat_data is _response:
+            return _prepared
+        _new_days = {}
+        for daily_key in self.daily_keys:
+            for day in _sat_data.get(daily_key, None) or []:
+                if not isinstance(day, dict):
+                    continue
+                key = (daily_key, day.get('intervalStart', None))
+                entry = _days.get(key, None)
+                if entry is None or entry[0] != day:
+                    entry = (day, self._convert_day(daily_key, day))
+                _new_days[key] = entry
+        _open = {}
+        for daily_key, start in _new_days:
+            if isinstance(start, str) and start > _open.get(daily_key, ''):
+                _open[daily_key] = start
+        _prepared = {'days': {name: [] for name, *_ in self.daily_metrics}}
+        for (daily_key, start), (_, samples) in _new_days.items():
+            _is_open = _open.get(daily_key, None) == start
+            for name, (key, value, timestamp) in samples:
+                _prepared['days'][name].append(
+                    (key, value, None if _is_open else timestamp))
+        self._index[_sat_id] = (_sat_data, _new_days, _prepared)
+        return _prepared
+
+    def _convert_day(self, daily_key, day):
+        """Returns (metric name, (type, value, timestamp)) samples of a day."""
+        timestamp = to_timestamp(day.get('intervalStart', None))
+        if timestamp is None:
+            return []
+        samples = []
+        for name, _, key, nested_key, data_keys in self.daily_metrics:
+            data = day.get(nested_key, None) if nested_key else day
+            if key != daily_key or not isinstance(data, dict):
+                continue
+            for data_key in data_keys:
+                value = to_float(data.get(data_key, None))
+                if value is not None:
+                    samples.append((name, (data_key, value, timestamp)))
+        return samples
 
     def _get_metric_template_map(self):
-        _payout_data = self._payout.get('currentMonth', {})
-        _payout_data['currentMonthExpectations'] = self._payout.get(
+        return []
+
+
+class AuditHistoryCollector(SatCollector):
+    """
+    Online audit windows of each satellite (auditHistory), one sample per window
+    and type timestamped with the window start, and the resulting online score.
+    The last window is still open and its counts grow, so it is exposed without
+    timestamp, like the current day of DailyCollector.
+    Windows are append-only: each satellite keeps a deque of converted windows
+    where a refresh drops windows that left the history, re-checks the last one,
+    which is still open, and only converts windows started after it, scanning the
+    response from its end so that refresh cost does not grow with the history.
+    """
+    api_keys = {
+        'sno/': ['satellites'],
+        'sno/satellite/': ['auditHistory'],
+    }
+
+    def __init__(self, client, refresh_on_collect=True, max_workers=4, batch_size=0):
+        self._history = {}
+        super().__init__(client, refresh_on_collect, max_workers, batch_size)
+
+    def describe(self):
+        return list(self._new_metrics())
+
+    def _get_metrics(self):
+        window_metric, score_metric = self._new_metrics()
+        for _sat_data, _sat_id, _sat_url in self._satellites:
+            _windows = _sat_data.get('windows', ())
+            _open = len(_windows) - 1
+            for index, (_, _, samples) in enumerate(_windows):
+                for key, value, timestamp in samples:
+                    window_metric.add_metric([key, _sat_id, _sat_url], value,
+                                             None if index == _open else timestamp)
+            score = _sat_data.get('score', None)
+            if score is not None:
+                score_metric.add_metric([_sat_id, _sat_url], score)
+        return window_metric, score_metric
+
+    @staticmethod
+    def _new_metrics():
+        return (GaugeMetricFamily('storj_sat_audit_window',
+                                  'Storj satellite audits by online window',
+                                  labels=['type', 'satellite', 'url']),
+                GaugeMetricFamily('storj_sat_audit_history_score',
+                                  'Storj satellite online score of audit windows',
+                                  labels=['satellite', 'url']))
+
+    def _merge_satellites(self, _valid_satellites, _fetched):
+        _satellites = super()._merge_satellites(_valid_satellites, _fetched)
+        _sat_ids = {_sat_id for _, _sat_id, _ in _satellites}
+        for _sat_id in [i for i in self._history if i not in _sat_ids]:
+            del self._history[_sat_id]
+        return _satellites
+
+    def _prepare_sat_data(self, satellite, _sat_data):
+        _audit_history = _sat_data.get('auditHistory', None)
+        if not isinstance(_audit_history, dict):
+            _audit_history = {}
+        _windows = _audit_history.get('windows', None)
+        if not isinstance(_windows, list):
+            _windows = []
+        _history = self._history.setdefault(satellite.get('id', None), deque())
+        self._update_history(_history, _windows)
+        return {'windows': tuple(_history),
+                'score': to_float(_audit_history.get('score', None))}
+
+    def _update_history(self, _history, _windows):
+        """Appends windows newer than the history, replacing its open last one."""
+        if not _windows:
+            _history.clear()
+            return
+        _first = self._window_start(_windows[0])
+        while _history and _history[0][0] < _first:
+            _history.popleft()
+        _last = _history[-1][0] if _history else ''
+        _start = len(_windows)
+        while _start and self._window_start(_windows[_start - 1]) >= _last:
+            _start -= 1
+        if _history and _start < len(_windows) and _windows[_start] == _history[-1][1]:
+            _start += 1
+        elif _history:
+            _history.pop()
+        for window in _windows[_start:]:
+            if isinstance(window, dict):
+                _history.append(self._convert_window(window))
+
+    @staticmethod
+    def _window_start(window):
+        if not isinstance(window, dict):
+            return ''
+        return str(window.get('windowStart', None) or '')
+
+    def _convert_window(self, window):
+        """Returns (window start, window, [(type, value, timestamp)])."""
+        start = self._window_start(window)
+        timestamp = to_timestamp(start)
+        total = to_float(window.get('totalCount', None))
+        online = to_float(window.get('onlineCount', None))
+        samples = []
+        if timestamp is not None and total is not None and online is not None:
+            samples = [('total', total, timestamp), ('online', online, timestamp),
+                       ('offline', total - online, timestamp)]
+        return start, window, samples
+
+    def _get_metric_template_map(self):
+        return []
+
+
+class PayoutCollector(StorjCollector):
+    api_keys = {
+        'sno/estimated-payout': ['currentMonth', 'currentMonthExpectations'],
+    }
+    _payout = {}
+
+    async def _refresh_data(self, client):
+        self._payout = await client.payout()
+
+    def _get_metric_data(self):
+        _payout = self._payout
+        _payout_data = dict(_payout.get('currentMonth', {}))
+        _payout_data['currentMonthExpectations'] = _payout.get(
             'currentMonthExpectations', None)
+        return _payout_data
+
+    def _get_metric_template_map(self):
         _metric_template_map = [
             GaugeMetricTemplate(
                 metric_name='storj_payout_currentMonth',
                 documentation='Storj estimated payouts for current month',
-                data_dict=_payout_data,
                 data_keys=['egressBandwidth', 'egressBandwidthPayout',
                            'egressRepairAudit', 'egressRepairAuditPayout',
                            'diskSpace', 'diskSpacePayout', 'heldRate', 'payout',
@@ -203,3 +608,255 @@ class PayoutCollector(StorjCollector):
             ),
         ]
         return _metric_template_map
+
+
+class PaystubCollector(StorjCollector):
+    """
+    Paystubs of every payout period and held amount history of each satellite.
+    Paystubs of past periods never change: they are fetched once and kept in
+    `store`, on disk if it has a directory, and never fetched again. Only the list
+    of periods, the paystubs of the latest one and held history are fetched again,
+    at most every `interval` seconds, refreshes in between keeping the latest data.
+    Failed fetches wait for the next interval too, unless cut short by the scrape
+    deadline, so that a failing endpoint isn't called on every scrape.
+    """
+    _paystubs = []
+    _held_history = []
+
+    def __init__(self, client, refresh_on_collect=True, store=None, interval=3600):
+        self.store = store or PermanentStore()
+        self.interval = interval
+        self._refreshed_at = None
+        super().__init__(client, refresh_on_collect)
+
+    def _due(self):
+        return self._refreshed_at is None or \
+            time.monotonic() - self._refreshed_at >= self.interval
+
+    async def _refresh_data(self, client):
+        if not self._due():
+            return
+        _periods, _paystubs, _fetch = self._plan_periods(await client.periods())
+        for period in _fetch:
+            _paystubs[period] = await client.paystubs(period)
+        self._update(client, _periods, _paystubs, await client.held_history())
+
+    def _plan_periods(self, _periods):
+        """Returns sorted periods, paystubs found in store and periods to fetch."""
+        _periods = sorted({p for p in _periods if p and isinstance(p, str)}) \
+            if isinstance(_periods, list) else []
+        _paystubs = {}
+        for period in _periods[:-1]:
+            _stored = self.store.get(period)
+            if _stored is not None:
+                _paystubs[period] = _stored
+        return _periods, _paystubs, [p for p in _periods if p not in _paystubs]
+
+    def _update(self, client, _periods, _paystubs, _held_history):
+        for period in _periods[:-1]:
+            _endpoint = 'heldamount/paystubs/' + period
+            if _paystubs[period] and not client.is_failing(_endpoint) and \
+                    self.store.get(period) is None:
+                self.store.put(period, _paystubs[period])
+        if _periods or not client.is_failing('heldamount/periods'):
+            self._paystubs = [(period, _paystubs[period]) for period in _periods]
+            self._held_history = _held_history
+        _deadline = current_deadline()
+        if not (_deadline and _deadline.partial):
+            self._refreshed_at = time.monotonic()
+
+    def _get_metrics(self):
+        paystub_plan, held_plan = self._plans
+        paystub_metric = paystub_plan.new_metric()
+        for period, _stubs in self._paystubs:
+            for _stub, _sat_id in self._by_satellite(_stubs):
+                paystub_plan.add_samples(paystub_metric, _stub, (_sat_id, period))
+        held_metric = held_plan.new_metric()
+        for _held, _sat_id in self._by_satellite(self._held_history):
+            held_plan.add_samples(held_metric, _held, (_sat_id,))
+        return paystub_metric, held_metric
+
+    @staticmethod
+    def _by_satellite(entries):
+        """Yields (entry, satellite id) of valid entries of a heldamount response."""
+        for entry in entries if isinstance(entries, list) else []:
+            if isinstance(entry, dict):
+                _sat_id = entry.get('satelliteId', None) or \
+                    entry.get('satelliteID', None)
+                if _sat_id:
+                    yield entry, str(_sat_id)
+
+    def _get_metric_template_map(self):
+        _metric_template_map = [
+            GaugeMetricTemplate(
+                metric_name='storj_paystub',
+                documentation='Storj paystub of each satellite by payout period',
+                data_keys=['usageAtRest', 'usageGet', 'usagePut', 'usageGetRepair',
+                           'usagePutRepair', 'usageGetAudit', 'compAtRest',
+                           'compGet', 'compPut', 'compGetRepair', 'compPutRepair',
+                           'compGetAudit', 'surgePercent', 'held', 'owed',
+                           'disposed', 'paid', 'distributed'],
+                labels=['type', 'satellite', 'period']
+            ),
+            GaugeMetricTemplate(
+                metric_name='storj_held_history',
+                documentation='Storj held amount history of each satellite',
+                data_keys=['holdForFirstPeriod', 'holdForSecondPeriod',
+                           'holdForThirdPeriod', 'totalHeld', 'totalDisposed'],
+                labels=['type', 'satellite']
+            ),
+        ]
+        return _metric_template_map
+
+
+class ParallelCollector(object):
+    """
+    Collects `collectors` as one: their data is refreshed in parallel, up to
+    max_workers at a time, then their metrics are yielded in order once all are
+    refreshed. Scrape duration is then the one of the slowest collector instead of
+    the sum of all of them. Refreshing threads run in a copy of the scrape context
+    to share its deadline.
+    """
+    def __init__(self, collectors, max_workers=None):
+        self.collectors = collectors
+        self.max_workers = max_workers or len(collectors)
+
+    def describe(self):
+        return [metric for collector in self.collectors
+                for metric in collector.describe()]
+
+    def collect(self):
+        started = time.monotonic()
+        if self.max_workers > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(contextvars.copy_context().run,
+                                           collector.refresh)
+                           for collector in self.collectors]
+                for future in futures:
+                    future.result()
+        else:
+            for collector in self.collectors:
+                collector.refresh()
+        for collector in self.collectors:
+            yield from collector.collect_latest(started)
+
+
+class ExporterCollector(StorjCollector):
+    """
+    Exporter internal metrics, always refreshed on collect as no api calls are made.
+    Should be registered after `collectors` so that their collect durations and
+    whether data is partial are the ones of the same scrape.
+    """
+    def __init__(self, client, collectors=()):
+        self.collectors = collectors
+        super().__init__(client, refresh_on_collect=True)
+
+    def describe(self):
+        return self.collect()
+
+    def refresh(self):
+        """Only reads client state, so no event loop is run for it."""
+        self._refresh_state()
+
+    async def _refresh_data(self, client):
+        self._refresh_state()
+
+    def _refresh_state(self):
+        self._cache_stats = self.client.cache_stats()
+        self._cache_ages = self.client.cache_ages()
+        self._breaker_states = self.client.breaker_states()
+        self._staleness = self.client.staleness()
+        self._api_stats = self.client.stats.snapshot()
+        _deadline = current_deadline()
+        self._partial = bool(_deadline and _deadline.partial)
+
+    def _get_metrics(self):
+        yield from super()._get_metrics()
+        yield from self._get_api_metrics()
+        yield self._get_collector_duration_metric()
+        partial = GaugeMetricFamily(
+            'storj_exporter_scrape_partial',
+            'Storj scrape deadline was reached before all api data was fetched, '
+            'missing data is stale or left out')
+        partial.add_metric([], 1 if self._partial else 0)
+        yield partial
+
+    def _get_api_metrics(self):
+        durations = HistogramMetricFamily(
+            'storj_exporter_api_request_duration_seconds',
+            'Storj api request duration by endpoint, including retries',
+            labels=['endpoint'])
+        sizes = HistogramMetricFamily(
+            'storj_exporter_api_response_size_bytes',
+            'Storj api response body size by endpoint', labels=['endpoint'])
+        for histograms, metric in ((self._api_stats['durations'], durations),
+                                   (self._api_stats['sizes'], sizes)):
+            for endpoint, (buckets, _sum) in histograms.items():
+                metric.add_metric([endpoint], [(floatToGoString(le), c)
+                                               for le, c in buckets], _sum)
+        retries = CounterMetricFamily(
+            'storj_exporter_api_retries', 'Storj api request retries by endpoint',
+            labels=['endpoint'])
+        for endpoint, count in self._api_stats['retries'].items():
+            if count:
+                retries.add_metric([endpoint], count)
+        errors = CounterMetricFamily(
+            'storj_exporter_api_errors',
+            'Storj api failed requests by endpoint and failure type (timeout, '
+            'connection, http_status, json_decode)', labels=['endpoint', 'type'])
+        for (endpoint, error), count in self._api_stats['errors'].items():
+            errors.add_metric([endpoint, error], count)
+        return [durations, sizes, retries, errors]
+
+    def _get_collector_duration_metric(self):
+        metric = GaugeMetricFamily(
+            'storj_exporter_collector_duration_seconds',
+            'Storj duration of the latest data refresh and collect of each collector',
+            labels=['collector', 'phase'])
+        for collector in self.collectors:
+            for phase, duration in (('refresh', collector.refresh_duration),
+                                    ('collect', collector.collect_duration)):
+                if duration is not None:
+                    metric.add_metric([collector.__class__.__name__, phase], duration)
+        return metric
+
+    def _get_metric_data(self):
+        return {'cache_requests': self._cache_stats, 'cache_ages': self._cache_ages,
+                'breaker_states': self._breaker_states, 'staleness': self._staleness}
+
+    def _get_metric_template_map(self):
+        _metric_template_map = [
+            CounterMetricTemplate(
+                metric_name='storj_exporter_api_cache_requests',
+                documentation='Storj api requests served from cache or from a '
+                              'coalesced in-flight request (hit) or sent to the '
+                              'api (miss)',
+                nested_path=['cache_requests'],
+                data_keys=['hit', 'miss'],
+                labels=['result']
+            ),
+            GaugeMetricTemplate(
+                metric_name='storj_exporter_api_cache_age_seconds',
+                documentation='Storj age of cached api responses by endpoint',
+                nested_path=['cache_ages'],
+                data_keys=None,
+                labels=['endpoint']
+            ),
+            GaugeMetricTemplate(
+                metric_name='storj_exporter_api_circuit_state',
+                documentation='Storj api circuit breaker state by endpoint, 0 closed, '
+                              '1 open (api not called), 2 half open (probing api)',
+                nested_path=['breaker_states'],
+                data_keys=None,
+                labels=['endpoint']
+            ),
+            GaugeMetricTemplate(
+                metric_name='storj_exporter_api_staleness_seconds',
+                documentation='Storj seconds since the latest successful api '
+                              'response by endpoint, i.e. age of stale data served',
+                nested_path=['staleness'],
+                data_keys=None,
+                labels=['endpoint']
+            ),
+        ]
+        return _metric_template_map
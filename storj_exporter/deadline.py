@@ -0,0 +1,55 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar('storj_scrape_deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Scrape deadline is reached, api call is not worth making or retrying."""
+
+
+class Deadline(object):
+    """
+    Time budget of a scrape, in monotonic time. `partial` is set as soon as an
+    api call is skipped or cut short because of it, i.e. the scrape is missing
+    some fresh data.
+    """
+    def __init__(self, timeout, started=None):
+        self.expires_at = (time.monotonic() if started is None else started) + timeout
+        self.partial = False
+
+    def remaining(self):
+        return max(self.expires_at - time.monotonic(), 0)
+
+
+def current():
+    """Returns the Deadline of the scrape being collected, None outside scrapes."""
+    return _current.get()
+
+
+def remaining(default):
+    """Returns seconds left before the current deadline, at most `default`."""
+    deadline = _current.get()
+    if deadline is None:
+        return default
+    return min(default, deadline.remaining())
+
+
+@contextmanager
+def scrape_deadline(timeout, started=None):
+    """
+    Sets a deadline `timeout` seconds from now, or from `started` monotonic time
+    (e.g. when the scrape request was received), for api calls made in this
+    context, or no deadline if timeout is None. Threads started in this context
+    only see it if run with a copy of it, see contextvars.copy_context().
+    """
+    if timeout is None:
+        yield None
+        return
+    deadline = Deadline(timeout, started)
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
@@ -0,0 +1,154 @@
+import gzip
+import logging
+import threading
+import time
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.exposition import (
+    CONTENT_TYPE_LATEST,
+    generate_latest,
+    gzip_accepted
+)
+from deadline import current as current_deadline
+
+logger = logging.getLogger(__name__)
+
+
+class Exposition(object):
+    """Text exposition rendered once, kept as plain and gzip-compressed bytes."""
+    content_type = CONTENT_TYPE_LATEST
+
+    def __init__(self, plain):
+        self.plain = plain
+        self.gzipped = gzip.compress(plain)
+
+    def encode(self, accept_encoding):
+        if gzip_accepted(accept_encoding):
+            return self.gzipped, 'gzip'
+        return self.plain, None
+
+
+class _Metrics(object):
+    """Registry stand-in rendering a list of metrics with generate_latest."""
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def collect(self):
+        return self.metrics
+
+
+class ExpositionCache(object):
+    """
+    Renders the registry into an Exposition and serves scrapes from it.
+
+    With render_on_scrape a scrape re-renders the registry, unless it runs
+    concurrently with a rendering or within min_interval seconds of the last one,
+    in which case it is served from the same result. Otherwise rendering is left
+    to render() calls, e.g. by the poller after each data refresh. Within a scrape
+    deadline, a scrape waiting for a rendering longer than the time left is served
+    the previous exposition instead, marking the scrape as partial.
+
+    With a snapshot, renderings are saved to it when snapshot_if() is true, and a
+    snapshot loaded on init is served, with its age, until the first rendering.
+    With render_on_scrape that first rendering is then done in background, so
+    scrapes get the snapshot right away instead of waiting for a full collection.
+    """
+    def __init__(self, registry, min_interval=0, render_on_scrape=True,
+                 snapshot=None, snapshot_if=None):
+        self.registry = registry
+        self.min_interval = min_interval
+        self.render_on_scrape = render_on_scrape
+        self.snapshot = snapshot
+        self.snapshot_if = snapshot_if
+        self.coalesced_scrapes = 0
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._rendered_at = None
+        self._exposition = None
+        self._stale = snapshot.load() if snapshot else None
+        self._warmup_lock = threading.Lock()
+        self._warmup = None
+
+    def get(self):
+        stale = self._get_stale()
+        if stale is not None:
+            return stale
+        generation = self._generation
+        if not self._acquire():
+            logger.info('Rendering exposition takes longer than scrape deadline, '
+                        'serving previous exposition')
+            current_deadline().partial = True
+            return self._exposition
+        try:
+            if self._is_fresh(generation):
+                self.coalesced_scrapes += 1
+                logger.debug('Serving scrape from shared exposition')
+            else:
+                self._render()
+            return self._exposition
+        finally:
+            self._lock.release()
+
+    def _acquire(self):
+        """
+        Acquires the lock within the scrape deadline if there is a previous
+        exposition to serve otherwise, returns whether it was acquired.
+        """
+        deadline = current_deadline()
+        if deadline is None or self._exposition is None:
+            return self._lock.acquire()
+        return self._lock.acquire(timeout=deadline.remaining())
+
+    def render(self):
+        with self._lock:
+            self._render()
+
+    def _is_fresh(self, generation):
+        if self._exposition is None:
+            return False
+        if not self.render_on_scrape or generation != self._generation:
+            return True
+        return time.monotonic() - self._rendered_at < self.min_interval
+
+    def _render(self):
+        logger.debug('Rendering exposition from registry')
+        rendered_at = time.monotonic()
+        self._exposition = Exposition(generate_latest(self.registry))
+        self._rendered_at = rendered_at
+        self._generation += 1
+        self._stale = None
+        if self.snapshot and (self.snapshot_if is None or self.snapshot_if()):
+            self.snapshot.save(self._exposition)
+
+    def _get_stale(self):
+        """Exposition of the loaded snapshot while nothing was rendered yet."""
+        stale = self._stale
+        if stale is None:
+            return None
+        if self.render_on_scrape:
+            self._start_warmup()
+        plain, saved_at = stale
+        age = GaugeMetricFamily(
+            'storj_exporter_snapshot_age_seconds',
+            'Storj age of the snapshot served after a restart until fresh data is '
+            'collected')
+        age.add_metric([], max(time.time() - saved_at, 0))
+        logger.debug('Serving scrape from snapshot')
+        return Exposition(plain + generate_latest(_Metrics([age])))
+
+    def _start_warmup(self):
+        with self._warmup_lock:
+            if self._warmup is None or not self._warmup.is_alive():
+                self._warmup = threading.Thread(target=self.render,
+                                                name='storj-snapshot-warmup',
+                                                daemon=True)
+                self._warmup.start()
+
+    def describe(self):
+        return self.collect()
+
+    def collect(self):
+        metric = CounterMetricFamily(
+            'storj_exporter_coalesced_scrapes',
+            'Storj exporter scrapes served from a shared exposition')
+        metric.add_metric([], self.coalesced_scrapes)
+        yield metric
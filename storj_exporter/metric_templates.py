@@ -1,75 +1,101 @@
-import logging
 from dataclasses import dataclass, field
 from prometheus_client.core import (
+    CounterMetricFamily,
     GaugeMetricFamily,
     InfoMetricFamily,
     UnknownMetricFamily
 )
-from utils import to_float, nested_get
-
-logger = logging.getLogger(__name__)
+from utils import to_float
 
 
 @dataclass
 class MetricTemplate(object):
+    """
+    Declaration of a metric: name, documentation, labels, and where its samples
+    are in api data, i.e. a nested path and data keys (all keys if None), one
+    sample per key with the key as first label. Compiled once on collector init
+    into an ExtractionPlan which builds the metric on every collect.
+    """
     metric_name: str
     documentation: str
     data_keys: list
-    data_dict: dict = field(default_factory=lambda: {})
     nested_path: list = field(default_factory=lambda: [])
-    metric_object: object = field(init=False)
     labels: list = field(default_factory=lambda: ['type'])
-    extra_labels_values: list = field(default_factory=lambda: [])
     _metric_class = UnknownMetricFamily
 
-    def __post_init__(self):
-        self.metric_object = self._metric_class(
-            name=self.metric_name, documentation=self.documentation, labels=self.labels)
-        logger.debug(f'... {self.metric_name} metric object created')
-
-    def _get_value(self, key):
-        return self.data_dict.get(key, None)
-
-    def add_metric_samples(self):
-        logger.debug(f'... adding samples to {self.metric_name}')
-        if self.nested_path:
-            self.data_dict = nested_get(self.data_dict, self.nested_path)
-        if self.data_dict and isinstance(self.data_dict, dict):
-            for key in self.data_keys:
-                value = self._get_value(key)
-                labels_list = [key] + self.extra_labels_values
-                if labels_list and value is not None:
-                    self.metric_object.add_metric(labels_list, value)
-                else:
-                    logger.debug(f'{self.metric_name} sample not added for {key}, '
-                                 f'labels: {labels_list}, value: {value}')
-        else:
-            logger.debug(f'{self.metric_name} data is empty or invalid, '
-                         'not adding samples')
-        self.data_dict = {}
+    @staticmethod
+    def _convert(key, value):
+        return value
+
+    def compile(self):
+        return ExtractionPlan(self._metric_class, self.metric_name, self.documentation,
+                              self.labels, self.nested_path, self.data_keys,
+                              self._convert)
 
 
 @dataclass
 class GaugeMetricTemplate(MetricTemplate):
     _metric_class = GaugeMetricFamily
 
-    def _get_value(self, key):
-        value = self.data_dict.get(key, None)
-        if value is not None:
-            value = to_float(value)
-        else:
-            logger.debug(f'{self.metric_name} value for key {key} is None or not found')
-        return value
+    @staticmethod
+    def _convert(key, value):
+        return to_float(value)
+
+
+@dataclass
+class CounterMetricTemplate(GaugeMetricTemplate):
+    _metric_class = CounterMetricFamily
 
 
 @dataclass
 class InfoMetricTemplate(MetricTemplate):
     _metric_class = InfoMetricFamily
 
-    def _get_value(self, key):
-        value = self.data_dict.get(key, None)
-        if value is not None:
-            value = {key: str(value)}
-        else:
-            logger.debug(f'{self.metric_name} value for key {key} is None or not found')
-        return value
+    @staticmethod
+    def _convert(key, value):
+        return {key: str(value)}
+
+
+class ExtractionPlan(object):
+    """
+    Flat form of a MetricTemplate compiled once at startup: nested path, data keys
+    (all keys of the data if None) with their label values and a value converter.
+    add_samples() runs a tight loop over the payload, without building templates
+    or formatting debug logs.
+    """
+    __slots__ = ('metric_class', 'metric_name', 'documentation', 'labels',
+                 'nested_path', 'keys', 'convert')
+
+    def __init__(self, metric_class, metric_name, documentation, labels, nested_path,
+                 data_keys, convert):
+        self.metric_class = metric_class
+        self.metric_name = metric_name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.nested_path = tuple(nested_path)
+        self.keys = None
+        if data_keys is not None:
+            self.keys = tuple((key, (key,)) for key in data_keys)
+        self.convert = convert
+
+    def new_metric(self):
+        return self.metric_class(self.metric_name, self.documentation,
+                                 labels=self.labels)
+
+    def add_samples(self, metric, data, extra_labels_values=()):
+        for k in self.nested_path:
+            if not isinstance(data, dict):
+                return
+            data = data.get(k, None)
+        if not data or not isinstance(data, dict):
+            return
+        convert = self.convert
+        keys = self.keys
+        if keys is None:
+            keys = [(key, (key,)) for key in data]
+        for key, key_labels in keys:
+            value = data.get(key, None)
+            if value is not None:
+                value = convert(key, value)
+                if value is not None:
+                    metric.add_metric(key_labels + extra_labels_values, value)
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Poller(object):
+    """
+    Refreshes collectors data in a background thread as soon as started and then
+    every `interval` seconds, so that collect() only has to read the latest
+    snapshot. `after_poll` is called once all collectors are refreshed.
+    """
+    def __init__(self, collectors, interval, after_poll=None):
+        self.collectors = collectors
+        self.interval = interval
+        self.after_poll = after_poll
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self, name='storj-poller'):
+        logger.info(f'Starting {name} with {self.interval}s interval')
+        self._thread = threading.Thread(target=self._run, name=name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+    def poll(self):
+        for collector in self.collectors:
+            try:
+                collector.refresh()
+            except Exception:
+                logger.error(f'Failed to refresh {collector.__class__.__name__}',
+                             exc_info=True)
+        if self.after_poll:
+            try:
+                self.after_poll()
+            except Exception:
+                logger.error('Failed to run after poll callback', exc_info=True)
+
+    def _run(self):
+        self.poll()
+        while not self._stop_event.wait(self.interval):
+            self.poll()
+
+
+class AsyncPoller(object):
+    """
+    Refreshes collectors of all targets concurrently from a single asyncio event
+    loop running in a background thread, as soon as started and then every
+    `interval` seconds. Collectors of a target are refreshed with its async_client
+    and its exposition is rendered as soon as they are done, so a slow target does
+    not hold back the others.
+    """
+    def __init__(self, targets, interval):
+        self.targets = targets
+        self.interval = interval
+        self._loop = None
+        self._task = None
+        self._thread = None
+
+    def start(self, name='storj-async-poller'):
+        logger.info(f'Starting {name} for {len(self.targets)} targets with '
+                    f'{self.interval}s interval')
+        self._thread = threading.Thread(target=asyncio.run, args=(self._run(),),
+                                        name=name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+        if self._thread:
+            self._thread.join()
+
+    async def poll(self):
+        await asyncio.gather(*[self._poll_target(t) for t in self.targets])
+
+    async def _poll_target(self, target):
+        results = await asyncio.gather(
+            *[c.refresh_async(target.async_client) for c in target.collectors],
+            return_exceptions=True)
+        for collector, result in zip(target.collectors, results):
+            if isinstance(result, Exception):
+                logger.error(f'Failed to refresh {collector.__class__.__name__} '
+                             f'for {target.name}', exc_info=result)
+        try:
+            target.exposition_cache.render()
+        except Exception:
+            logger.error(f'Failed to render exposition for {target.name}',
+                         exc_info=True)
+
+    async def _run(self):
+        self._loop = asyncio.get_event_loop()
+        self._task = asyncio.current_task()
+        try:
+            while True:
+                await self.poll()
+                await asyncio.sleep(self.interval)
+        except asyncio.CancelledError:
+            logger.debug('Async poller stopped')
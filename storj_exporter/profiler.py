@@ -0,0 +1,95 @@
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import threading
+import time
+import tracemalloc
+from prometheus_client.core import CollectorRegistry
+from prometheus_client.exposition import generate_latest
+from collectors import ExporterCollector
+
+logger = logging.getLogger(__name__)
+
+SORT_KEYS = ('cumulative', 'tottime', 'calls', 'ncalls', 'time', 'name')
+
+
+class ProfilerBusyError(Exception):
+    """Another collection cycle is already being profiled."""
+
+
+class CollectionProfiler(object):
+    """
+    Profiles full collection cycles of a target, i.e. a data refresh of all its
+    collectors followed by rendering its registry, with cProfile and optionally
+    tracemalloc. Cycles run on a separate set of the target's collectors sharing
+    its api client, so that the ones serving scrapes and polls are left alone.
+    cProfile only sees the calling thread, so satellites are fetched one by one.
+    Only one profile runs at a time.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def profile(self, target, cycles=1, sort='cumulative', limit=30, memory=False,
+                output='text'):
+        """Returns (body, content_type) with the profile as text or pstats data."""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError('A profile is already running')
+        try:
+            return self._profile(target, cycles, sort, limit, memory, output)
+        finally:
+            self._lock.release()
+
+    def _profile(self, target, cycles, sort, limit, memory, output):
+        logger.info(f'Profiling {cycles} collection cycles of {target.name}')
+        trace_memory = memory and not tracemalloc.is_tracing()
+        if trace_memory:
+            tracemalloc.start()
+        profiler = cProfile.Profile()
+        collectors, registry = self._make_registry(target)
+        started = time.monotonic()
+        try:
+            for _ in range(cycles):
+                profiler.runcall(self._collection_cycle, collectors, registry)
+            duration = time.monotonic() - started
+            snapshot = tracemalloc.take_snapshot() if memory else None
+            peak = tracemalloc.get_traced_memory()[1] if memory else None
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+        profiler.create_stats()
+        if output == 'pstats':
+            return marshal.dumps(profiler.stats), 'application/octet-stream'
+        text = io.StringIO()
+        text.write(f'{cycles} collection cycles of {target.name} in '
+                   f'{duration:.3f}s\n\n')
+        pstats.Stats(profiler, stream=text).sort_stats(sort).print_stats(limit)
+        if snapshot:
+            self._write_memory_stats(text, snapshot, peak, limit)
+        return text.getvalue().encode('utf-8'), 'text/plain; charset=utf-8'
+
+    @staticmethod
+    def _make_registry(target):
+        collectors = target.make_collectors(refresh_on_collect=False, max_workers=1)
+        registry = CollectorRegistry(auto_describe=False)
+        for collector in collectors + [ExporterCollector(target.client, collectors)]:
+            registry.register(collector)
+        return collectors, registry
+
+    @staticmethod
+    def _collection_cycle(collectors, registry):
+        for collector in collectors:
+            collector.refresh()
+        generate_latest(registry)
+
+    @staticmethod
+    def _write_memory_stats(text, snapshot, peak, limit):
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ])
+        text.write(f'Memory allocated while profiling, peak {peak} bytes, '
+                   f'top {limit} allocation sites still allocated:\n')
+        for stat in snapshot.statistics('lineno')[:limit]:
+            text.write(f'{stat}\n')
@@ -0,0 +1,67 @@
+from array import array
+
+_numbers = (int, float)
+
+
+class DailySeries(object):
+    """
+    Columnar view of a satellite daily array (bandwidthDaily, storageDaily): one
+    float array per field, indexed by day, e.g. ('egress', 'repair') for a nested
+    field. A column is built in a single pass on first use and kept, so a series
+    built once per satellite response serves every total and day value of it. A
+    field missing from a day or not a number counts as 0, entries that are not
+    dicts are skipped.
+    """
+    __slots__ = ('days', 'columns')
+
+    def __init__(self, days):
+        self.days = [d for d in days if isinstance(d, dict)] \
+            if isinstance(days, list) else []
+        self.columns = {}
+
+    def __len__(self):
+        return len(self.days)
+
+    @property
+    def starts(self):
+        return [d.get('intervalStart', None) for d in self.days]
+
+    def fields(self, key):
+        """Returns the sorted keys of the nested dict `key` found in any day."""
+        fields = set()
+        for day in self.days:
+            value = day.get(key, None)
+            if isinstance(value, dict):
+                fields.update(value)
+        return sorted(fields)
+
+    def column(self, key, nested_key=None):
+        path = (key, nested_key)
+        column = self.columns.get(path, None)
+        if column is None:
+            column = self.columns[path] = self._build_column(key, nested_key)
+        return column
+
+    def _build_column(self, key, nested_key):
+        try:
+            if nested_key is None:
+                return array('d', [day[key] for day in self.days])
+            return array('d', [day[key][nested_key] for day in self.days])
+        except (KeyError, TypeError):
+            return array('d', [self._get(day, key, nested_key) for day in self.days])
+
+    @staticmethod
+    def _get(day, key, nested_key):
+        value = day.get(key, None)
+        if nested_key is not None:
+            value = value.get(nested_key, None) if isinstance(value, dict) else None
+        return value if isinstance(value, _numbers) else 0.0
+
+    def total(self, key):
+        """Returns {nested key: sum over days} of the nested dict `key`."""
+        return {nested_key: sum(self.column(key, nested_key))
+                for nested_key in self.fields(key)}
+
+    def last(self):
+        """Returns a copy of the last day, an empty dict without days."""
+        return dict(self.days[-1]) if self.days else {}
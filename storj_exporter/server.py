@@ -0,0 +1,280 @@
+import asyncio
+import json
+import logging
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+from deadline import scrape_deadline
+from profiler import CollectionProfiler, ProfilerBusyError, SORT_KEYS
+
+logger = logging.getLogger(__name__)
+
+
+class ExporterApp(object):
+    """
+    Serves exporter http requests independently of the http server: /status,
+    /debug/profile if profiling is enabled and metrics of `targets` mapped by name
+    on any other path. Target is selected by `?target=` query parameter,
+    defaulting to the first one. handle() returns (status, headers, body).
+
+    `scrape_timeout` is the X-Prometheus-Scrape-Timeout-Seconds request header:
+    metrics are then collected within a deadline of that many seconds minus
+    timeout_offset, so that partial results are served before Prometheus gives
+    up on the scrape. The deadline runs from `received_at`, the monotonic time the
+    request was received, if given, so that time spent waiting for a worker
+    counts against it.
+    """
+    def __init__(self, targets, profiling=False, timeout_offset=0.5):
+        self.targets = targets
+        self.profiler = CollectionProfiler() if profiling else None
+        self.timeout_offset = timeout_offset
+
+    def handle(self, path, accept_encoding=None, scrape_timeout=None,
+               received_at=None):
+        url = urlsplit(path)
+        query = parse_qs(url.query)
+        if url.path == "/status":
+            message = dict(status="alive")
+            return 200, [('Content-Type', 'application/json')], \
+                bytes(json.dumps(message), "utf-8")
+        elif url.path == "/debug/profile" and self.profiler:
+            return self._profile(query)
+        return self._metrics(query.get('target', [None])[0], accept_encoding,
+                             scrape_timeout, received_at)
+
+    def _metrics(self, target_name, accept_encoding, scrape_timeout, received_at):
+        target = self._get_target(target_name)
+        if not target:
+            return self.error(404, f'Unknown target {target_name}')
+        with scrape_deadline(self._deadline_timeout(scrape_timeout), received_at):
+            exposition = target.exposition_cache.get()
+        body, encoding = exposition.encode(accept_encoding)
+        headers = [('Content-Type', exposition.content_type)]
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        return 200, headers, body
+
+    def _profile(self, query):
+        """
+        Profiles collection cycles of a target, query parameters being `target`,
+        `cycles` (1-100), `sort` (pstats sort key), `limit` (number of functions
+        and allocation sites listed), `memory=1` to trace memory allocations and
+        `format=pstats` to get marshalled pstats data instead of text.
+        """
+        target_name = query.get('target', [None])[0]
+        target = self._get_target(target_name)
+        if not target:
+            return self.error(404, f'Unknown target {target_name}')
+        try:
+            cycles = min(max(int(query.get('cycles', ['1'])[0]), 1), 100)
+            limit = max(int(query.get('limit', ['30'])[0]), 1)
+        except ValueError:
+            return self.error(400, 'cycles and limit must be integers')
+        sort = query.get('sort', ['cumulative'])[0]
+        output = query.get('format', ['text'])[0]
+        if sort not in SORT_KEYS or output not in ('text', 'pstats'):
+            return self.error(400, f'sort must be one of {SORT_KEYS}, '
+                                   'format text or pstats')
+        memory = query.get('memory', ['0'])[0].lower() in ('true', '1')
+        try:
+            body, content_type = self.profiler.profile(target, cycles, sort, limit,
+                                                       memory, output)
+        except ProfilerBusyError as e:
+            return self.error(409, str(e))
+        return 200, [('Content-Type', content_type)], body
+
+    def _deadline_timeout(self, scrape_timeout):
+        try:
+            timeout = float(scrape_timeout)
+        except (TypeError, ValueError):
+            return None
+        if timeout <= 0:
+            return None
+        return max(timeout - self.timeout_offset, 0)
+
+    def _get_target(self, target_name):
+        if target_name is None:
+            return next(iter(self.targets.values()), None)
+        return self.targets.get(target_name, None)
+
+    @staticmethod
+    def error(status, message):
+        return status, [('Content-Type', 'text/plain; charset=utf-8')], \
+            f'{status} {message}\n'.encode('utf-8')
+
+
+class AsyncHTTPServer(object):
+    """
+    Event driven HTTP/1.1 server for an ExporterApp. Connections, including idle
+    keep-alive ones, are handled by an asyncio event loop while requests are
+    served by a pool of at most `max_workers` threads, further requests waiting
+    for a free worker.
+
+    serve_forever() runs until stop() is called or, when run from the main
+    thread, SIGINT or SIGTERM is received. The server then stops accepting
+    connections, closes idle ones and waits up to `shutdown_timeout` seconds for
+    requests in progress to be answered.
+    """
+    max_header_lines = 100
+
+    def __init__(self, app, host='', port=9651, max_workers=4, keepalive_timeout=75,
+                 shutdown_timeout=30):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.max_workers = max(1, max_workers)
+        self.keepalive_timeout = keepalive_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self.ready = threading.Event()
+        self.server_address = None
+        self._loop = None
+        self._stopping = None
+        self._connections = {}
+        self._active = 0
+
+    def serve_forever(self):
+        asyncio.run(self._serve())
+
+    def stop(self):
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._executor = ThreadPoolExecutor(self.max_workers,
+                                            thread_name_prefix='storj-http')
+        server = await asyncio.start_server(self._handle_connection,
+                                            self.host or None, self.port)
+        self.server_address = server.sockets[0].getsockname()
+        self._install_signal_handlers()
+        logger.info(f'Serving HTTP on port {self.server_address[1]} with '
+                    f'{self.max_workers} workers')
+        self.ready.set()
+        try:
+            await self._stopping.wait()
+            logger.info('Shutting down HTTP server')
+            server.close()
+            self._close_idle_connections()
+            try:
+                await asyncio.wait_for(self._idle.wait(), self.shutdown_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f'{self._active} requests still in progress after '
+                               f'{self.shutdown_timeout}s, shutting down anyway')
+        finally:
+            for writer in list(self._connections):
+                writer.close()
+            self._executor.shutdown(wait=False)
+
+    def _install_signal_handlers(self):
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            self._loop.add_signal_handler(signum, self._on_signal, signum)
+
+    def _on_signal(self, signum):
+        print(f"\nReceived {signal.Signals(signum).name} signal, exiting ...")
+        self._stopping.set()
+
+    def _close_idle_connections(self):
+        for writer, busy in list(self._connections.items()):
+            if not busy:
+                writer.close()
+
+    async def _handle_connection(self, reader, writer):
+        self._connections[writer] = False
+        try:
+            keep_alive = True
+            while keep_alive and not self._stopping.is_set():
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader),
+                                                     self.keepalive_timeout)
+                except (asyncio.TimeoutError, ConnectionError, ValueError,
+                        asyncio.IncompleteReadError):
+                    break
+                if request is None:
+                    break
+                self._set_busy(writer, True)
+                try:
+                    keep_alive = await self._respond(writer, *request)
+                finally:
+                    self._set_busy(writer, False)
+        except ConnectionError:
+            logger.debug('Client connection lost', exc_info=True)
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    def _set_busy(self, writer, busy):
+        """Tracks connections with a request in progress, to drain on shutdown."""
+        self._connections[writer] = busy
+        self._active += 1 if busy else -1
+        if self._active:
+            self._idle.clear()
+        else:
+            self._idle.set()
+
+    async def _read_request(self, reader):
+        """Returns (method, path, version, headers) or None on EOF or bad request."""
+        line = await reader.readline()
+        if not line:
+            return None
+        parts = line.decode('latin-1').split()
+        headers = {}
+        for _ in range(self.max_header_lines):
+            header = await reader.readline()
+            if header in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = header.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        else:
+            parts = []
+        if len(parts) != 3 or not parts[2].startswith('HTTP/1.'):
+            return 'BAD', None, 'HTTP/1.0', headers
+        length = headers.get('content-length', '0')
+        if 'transfer-encoding' in headers or not length.isdigit() \
+                or int(length) > 65536:
+            return 'BAD', None, 'HTTP/1.0', headers
+        await reader.readexactly(int(length))
+        return parts[0], parts[1], parts[2], headers
+
+    async def _respond(self, writer, method, path, version, headers):
+        """Writes the response to a request, returns whether to keep connection."""
+        received_at = time.monotonic()
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' \
+            else connection != 'close'
+        if method == 'BAD':
+            status, response_headers, body = self.app.error(400, 'Bad request')
+            keep_alive = False
+        elif method not in ('GET', 'HEAD'):
+            status, response_headers, body = self.app.error(405, 'Method not allowed')
+        else:
+            status, response_headers, body = await self._call_app(
+                path, headers.get('accept-encoding'),
+                headers.get('x-prometheus-scrape-timeout-seconds'), received_at)
+        keep_alive = keep_alive and not self._stopping.is_set()
+        head = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}',
+                f'Content-Length: {len(body)}',
+                f'Connection: {"keep-alive" if keep_alive else "close"}']
+        head.extend(f'{key}: {value}' for key, value in response_headers)
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+        if method != 'HEAD':
+            writer.write(body)
+        await writer.drain()
+        logger.debug(f'Client request: {method} {path} {status}')
+        return keep_alive
+
+    async def _call_app(self, path, accept_encoding, scrape_timeout, received_at):
+        try:
+            return await self._loop.run_in_executor(
+                self._executor, self.app.handle, path, accept_encoding,
+                scrape_timeout, received_at)
+        except Exception:
+            logger.error(f'Failed to serve {path}', exc_info=True)
+            return self.app.error(500, 'Internal server error')
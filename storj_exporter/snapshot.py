@@ -0,0 +1,51 @@
+import gzip
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ExpositionSnapshot(object):
+    """
+    Latest good exposition of a target saved to `path`, gzip-compressed as served
+    to scrapes, so that a restarted exporter can serve it right away until fresh
+    data is rendered. Saved atomically at most every `interval` seconds, snapshots
+    older than max_age seconds are not loaded. Disk errors are logged and leave
+    the exporter running without snapshot.
+    """
+    def __init__(self, path, interval=60, max_age=3600):
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+        self._saved_at = None
+
+    def load(self):
+        """Returns (plain exposition, wall time it was saved at) or None."""
+        try:
+            saved_at = os.stat(self.path).st_mtime
+            if time.time() - saved_at > self.max_age:
+                logger.info(f'Snapshot {self.path} is too old, not loading it')
+                return None
+            with open(self.path, 'rb') as f:
+                plain = gzip.decompress(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError):
+            logger.warning(f'Failed to load snapshot {self.path}', exc_info=True)
+            return None
+        logger.info(f'Loaded snapshot {self.path}')
+        return plain, saved_at
+
+    def save(self, exposition):
+        now = time.monotonic()
+        if self._saved_at is not None and now - self._saved_at < self.interval:
+            return
+        self._saved_at = now
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path + '.tmp', 'wb') as f:
+                f.write(exposition.gzipped)
+            os.replace(self.path + '.tmp', self.path)
+        except OSError:
+            logger.warning(f'Failed to save snapshot {self.path}', exc_info=True)
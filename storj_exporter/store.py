@@ -0,0 +1,63 @@
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentStore(object):
+    """
+    Store of api responses that never change once available, e.g. paystubs of past
+    payout periods, so that they are fetched from the api only once. Responses are
+    kept in memory and, with a directory, as one json file per key written
+    atomically, so that they are not fetched again after a restart either. Disk
+    errors are logged and leave the store working from memory.
+    """
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, re.sub(r'[^\w.-]', '_', key) + '.json')
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key]
+        value = self._load(key)
+        if value is not None:
+            with self._lock:
+                self._entries[key] = value
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+        self._save(key, value)
+
+    def _load(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning(f'Failed to load {key} from {self.directory}', exc_info=True)
+            return None
+
+    def _save(self, key, value):
+        if not self.directory:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path + '.tmp', 'w') as f:
+                json.dump(value, f, separators=(',', ':'))
+            os.replace(path + '.tmp', path)
+        except (OSError, TypeError, ValueError):
+            logger.warning(f'Failed to save {key} to {self.directory}', exc_info=True)
@@ -0,0 +1,137 @@
+import logging
+import os
+import re
+from prometheus_client.core import CollectorRegistry
+from collectors import (
+    AuditHistoryCollector,
+    DailyCollector,
+    ExporterCollector,
+    NodeCollector,
+    ParallelCollector,
+    PaystubCollector,
+    PayoutCollector,
+    SatCollector
+)
+from exposition import ExpositionCache
+from poller import Poller
+from snapshot import ExpositionSnapshot
+from store import PermanentStore
+
+logger = logging.getLogger(__name__)
+
+
+def parse_addresses(addresses, default_port):
+    """
+    Parses a comma or whitespace separated list of storagenode addresses in
+    `host[:port]` format into a list of `host:port` strings.
+    """
+    result = []
+    for address in re.split(r'[\s,]+', addresses.strip()):
+        if not address:
+            continue
+        if ':' not in address:
+            address = f'{address}:{default_port}'
+        if address not in result:
+            result.append(address)
+    return result
+
+
+class Target(object):
+    """
+    A storagenode monitored by the exporter, with its own collectors registered in
+    `registry`, an exposition cache serving its scrapes and, if poll_interval is
+    set, a poller refreshing its data in background. Targets with an async_client
+    are left to be polled together by an AsyncPoller instead. Without polling,
+    collectors are refreshed in parallel on scrape by a ParallelCollector. With
+    selective_json, clients only keep the keys of api responses that the
+    collectors use. With data_dir, data kept across restarts is stored in a
+    subdirectory of it named after the target: paystubs of past periods and, with
+    snapshot_interval, a snapshot of the exposition taken while the node is up and
+    served after a restart until fresh data is collected.
+    """
+    collector_types = {
+        'payout': PayoutCollector,
+        'sat': SatCollector,
+        'daily': DailyCollector,
+        'audit': AuditHistoryCollector,
+        'paystub': PaystubCollector,
+    }
+
+    def __init__(self, name, client, collectors, registry=None, poll_interval=0,
+                 min_collect_interval=0, sat_concurrency=4, async_client=None,
+                 selective_json=False, sat_batch_size=0, data_dir=None,
+                 paystub_interval=3600, snapshot_interval=60, snapshot_max_age=3600):
+        self.name = name
+        self.client = client
+        self.async_client = async_client
+        self.registry = registry or CollectorRegistry(auto_describe=False)
+        refresh_on_collect = poll_interval <= 0
+        collector_classes = [NodeCollector] + [
+            cls for key, cls in self.collector_types.items() if key in collectors]
+        if selective_json:
+            self._select_keys(collector_classes, [client, async_client])
+        self.data_dir = os.path.join(data_dir, re.sub(r'[^\w.-]', '_', name)) \
+            if data_dir else None
+        self._collector_classes = collector_classes
+        self._collector_kwargs = {
+            SatCollector: {'max_workers': sat_concurrency,
+                           'batch_size': sat_batch_size},
+            PaystubCollector: {'store': PermanentStore(self._data_path('paystubs')),
+                               'interval': paystub_interval},
+        }
+        self.collectors = self.make_collectors(refresh_on_collect)
+        exporter_collector = ExporterCollector(async_client or client, self.collectors)
+        self.collector_group = None
+        registered = self.collectors
+        if refresh_on_collect and len(self.collectors) > 1:
+            self.collector_group = ParallelCollector(self.collectors)
+            registered = [self.collector_group]
+        for collector in self.collectors + [exporter_collector]:
+            logger.info(f'Registering {collector.__class__.__name__} for {name}')
+        for collector in registered + [exporter_collector]:
+            self.registry.register(collector)
+
+        snapshot = None
+        if self.data_dir and snapshot_interval > 0:
+            snapshot = ExpositionSnapshot(self._data_path('exposition.gz'),
+                                          snapshot_interval, snapshot_max_age)
+        self.exposition_cache = ExpositionCache(
+            self.registry, min_collect_interval, render_on_scrape=refresh_on_collect,
+            snapshot=snapshot, snapshot_if=lambda: self.collectors[0].up)
+        self.registry.register(self.exposition_cache)
+        self.poller = None
+        if not refresh_on_collect and not async_client:
+            self.poller = Poller(self.collectors, poll_interval,
+                                 after_poll=self.exposition_cache.render)
+
+    def make_collectors(self, refresh_on_collect, max_workers=None):
+        """
+        New collectors of the target with its options, e.g. to profile collection
+        apart from the collectors serving scrapes. max_workers overrides
+        satellite fetch concurrency.
+        """
+        collectors = []
+        for collector_class in self._collector_classes:
+            kwargs = {}
+            for base, base_kwargs in self._collector_kwargs.items():
+                if issubclass(collector_class, base):
+                    kwargs.update(base_kwargs)
+            if max_workers and 'max_workers' in kwargs:
+                kwargs['max_workers'] = max_workers
+            collectors.append(
+                collector_class(self.client, refresh_on_collect, **kwargs))
+        return collectors
+
+    def _data_path(self, *paths):
+        return os.path.join(self.data_dir, *paths) if self.data_dir else None
+
+    def _select_keys(self, collector_classes, clients):
+        """Selects api response keys used by collectors before the first refresh."""
+        for collector_class in collector_classes:
+            for prefix, keys in collector_class.api_keys.items():
+                for client in filter(None, clients):
+                    client.select_keys(prefix, keys)
+
+    def start(self):
+        if self.poller:
+            self.poller.start(name=f'storj-poller-{self.name}')
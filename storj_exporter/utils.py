@@ -1,4 +1,5 @@
 from collections import Counter
+from datetime import datetime, timezone
 import json
 
 
@@ -30,6 +31,16 @@ def to_float(value):
         value = None
     return value
 
+def to_timestamp(value):
+    try:
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        value = value.timestamp()
+    except Exception:
+        value = None
+    return value
+
 def nested_get(input_dict, nested_path):
     internal_dict_value = input_dict
     for k in nested_path:
@@ -1,7 +1,9 @@
 import json
 import re
+import threading
 import pytest
 import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from storj_exporter.api_wrapper import ApiClient
 from storj_exporter.collectors import StorjCollector
 
@@ -15,7 +17,7 @@ def set_globals():
 
 @pytest.fixture
 def client():
-    return ApiClient(pytest.base_url)
+    return ApiClient(pytest.base_url, backoff_factor=0)
 
 @pytest.fixture
 def storj_collector():
@@ -80,3 +82,59 @@ def mock_get_satellite(requests_mock, request):
 def mock_returns_none(requests_mock):
     matcher = re.compile(f'{pytest.base_url}/api/')
     requests_mock.get(url=matcher, json=None)
+
+
+class MockApiHandler(BaseHTTPRequestHandler):
+    """
+    Serves recorded api responses over http, for clients that requests_mock does
+    not intercept (AsyncApiClient). `mode` is success, chunked (success with
+    chunked transfer encoding), wrongtext (invalid json) or notfound (404).
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    mode = 'success'
+    mock_path = None
+
+    def do_GET(self):
+        if self.mode == 'notfound':
+            return self._send(404, b'Not found')
+        if self.mode == 'wrongtext':
+            return self._send(200, b'Wrong')
+        if self.path.endswith('/estimated-payout'):
+            filename = 'payout.json'
+        elif '/satellite/' in self.path:
+            filename = 'satellite.json'
+        else:
+            filename = 'sno.json'
+        with open(f'{self.mock_path}/{filename}', 'rb') as f:
+            self._send(200, f.read())
+
+    def _send(self, status, body):
+        self.send_response(status)
+        if self.mode == 'chunked':
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for i in range(0, len(body), 1000):
+                chunk = body[i:i + 1000]
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.write(b'0\r\n\r\n')
+        else:
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(params=["success"])
+def mock_api_server(request):
+    handler = type('MockApiHandler', (MockApiHandler,),
+                   {'mode': request.param, 'mock_path': pytest.mock_path})
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    t = threading.Thread(target=httpd.serve_forever, args=(0.05,))
+    t.daemon = True
+    t.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
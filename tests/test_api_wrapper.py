@@ -1,6 +1,30 @@
+import asyncio
+import socket
+import threading
+import time
 import requests
 import pytest
-from storj_exporter.api_wrapper import ApiClient
+from storj_exporter.api_wrapper import (
+    ApiClient,
+    ApiStats,
+    AsyncApiClient,
+    AwaitableClient,
+    CircuitBreaker,
+    Histogram,
+    ResponseCache,
+    parse_response
+)
+from deadline import scrape_deadline  # flat module used by storj_exporter modules
+
+
+@pytest.fixture
+def silent_server():
+    """Accepts connections but never answers."""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen()
+    yield f'http://127.0.0.1:{sock.getsockname()[1]}'
+    sock.close()
 
 
 class TestApiClient:
@@ -10,9 +34,11 @@ class TestApiClient:
         assert client._timeout == 10
 
     def test_init_custom_attributes(self):
-        client = ApiClient(pytest.base_url, path='/testpath/', timeout=60)
+        client = ApiClient(pytest.base_url, path='/testpath/', timeout=60,
+                           pool_maxsize=3)
         assert client._api_url == f'{pytest.base_url}/testpath/'
         assert client._timeout == 60
+        assert client._session.get_adapter('http://')._pool_maxsize == 3
 
     @pytest.mark.usefixtures("mock_get_sno")
     @pytest.mark.parametrize(
@@ -95,6 +121,450 @@ class TestApiClient:
             assert response == {}
 
 
+class TestResponseCache:
+    @pytest.mark.parametrize("ttl, endpoint, expected", [
+        (5, 'sno/', 5),
+        (5, 'sno/satellite/id', 5),
+        ({'sno/': 5, 'sno/satellite/': 600}, 'sno/', 5),
+        ({'sno/': 5, 'sno/satellite/': 600}, 'sno/satellite/id', 600),
+        ({'sno/satellite/': 600}, 'sno/estimated-payout', 0),
+    ])
+    def test_ttl(self, ttl, endpoint, expected):
+        assert ResponseCache(ttl).ttl(endpoint) == expected
+
+    def test_get_put(self):
+        cache = ResponseCache({'sno/': 60, 'sno/satellite/': 0.01})
+        cache.put('sno/', {'k': 'v'})
+        cache.put('sno/satellite/id', {'k': 'v'})
+        cache.put('sno/estimated-payout/', None)
+        assert cache.get('sno/') == {'k': 'v'}
+        time.sleep(0.02)
+        assert cache.get('sno/satellite/id') is None
+        assert cache.get('sno/estimated-payout/') is None
+        assert set(cache.ages()) == {'sno/'}
+
+    def test_expire(self):
+        cache = ResponseCache({'sno/': 0.01}, stale_ttl=0.03)
+        cache.put('sno/satellite/a', 1)
+        time.sleep(0.02)
+        cache.put('sno/satellite/b', 2)
+        assert set(cache.ages()) == {'sno/satellite/a', 'sno/satellite/b'}
+        time.sleep(0.02)
+        cache.put('sno/', 3)
+        assert list(cache._entries) == ['sno/satellite/b', 'sno/']
+        cache.forget('sno/')
+        assert set(cache.ages()) == {'sno/satellite/b'}
+
+    def test_get_stale(self):
+        cache = ResponseCache(0, stale_ttl=0.05)
+        cache.put('sno/', {'k': 'v'})
+        assert cache.get('sno/') is None
+        assert cache.get_stale('sno/') == {'k': 'v'}
+        time.sleep(0.06)
+        assert cache.get_stale('sno/') is None
+
+    def test_eviction(self):
+        cache = ResponseCache(60, max_size=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        assert [cache.get(k) for k in 'abc'] == [1, None, 3]
+
+
+class TestParseResponse:
+    @pytest.mark.parametrize("body, keys, expected", [
+        (b'{"a": 1, "b": {"c": 2}}', None, {'a': 1, 'b': {'c': 2}}),
+        (b'{"a": 1, "b": {"c": 2}}', ['b', 'd'], {'b': {'c': 2}}),
+        ('{"a": 1}', [], {}),
+        (b'[1, 2]', ['a'], [1, 2]),
+    ])
+    def test_parse_response(self, body, keys, expected):
+        assert parse_response(body, keys) == expected
+
+    def test_parse_response_invalid(self):
+        with pytest.raises(ValueError):
+            parse_response(b'wrongtext')
+
+
+class TestApiClientSelectKeys:
+    @pytest.mark.usefixtures("mock_get_sno")
+    @pytest.mark.usefixtures("mock_get_satellite")
+    def test_select_keys(self, client):
+        client.select_keys('sno/', ['nodeID'])
+        client.select_keys('sno/', ['satellites', 'nodeID'])
+        client.select_keys('sno/satellite/', ['audits'])
+        assert set(client.node()) == {'nodeID', 'satellites'}
+        assert set(client.satellite(pytest.sat_id)) == {'audits'}
+
+    @pytest.mark.parametrize("mock_api_server", ["success"], indirect=True)
+    def test_select_keys_async(self, mock_api_server):
+        client = AsyncApiClient(mock_api_server)
+        client.select_keys('sno/estimated-payout', ['currentMonth'])
+        assert set(asyncio.run(client.payout())) == {'currentMonth'}
+
+
+class TestApiStats:
+    def test_histogram(self):
+        histogram = Histogram((1, 5))
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value)
+        assert histogram.cumulative() == [(1, 2), (5, 3), (float('inf'), 4)]
+        assert histogram.sum == 14.5
+
+    def test_observe(self):
+        stats = ApiStats()
+        stats.observe('sno/', 0.1, 100, retries=1)
+        stats.observe('sno/', 0.2, error='timeout')
+        snapshot = stats.snapshot()
+        assert snapshot['durations']['sno/'][0][-1] == (float('inf'), 2)
+        assert snapshot['sizes']['sno/'][0][-1] == (float('inf'), 1)
+        assert snapshot['retries'] == {'sno/': 1}
+        assert snapshot['errors'] == {('sno/', 'timeout'): 1}
+
+    def test_observe_size_groups(self):
+        stats = ApiStats()
+        for sat_id in ('a', 'b'):
+            stats.observe('sno/satellite/' + sat_id, 0.1, 100)
+        stats.observe('heldamount/paystubs/2023-01', 0.1, 100)
+        snapshot = stats.snapshot()
+        assert set(snapshot['durations']) == {
+            'sno/satellite/a', 'sno/satellite/b', 'heldamount/paystubs/2023-01'}
+        assert {e: h[0][-1][1] for e, h in snapshot['sizes'].items()} == {
+            'sno/satellite/': 2, 'heldamount/paystubs/': 1}
+
+    @pytest.mark.parametrize("mock_get_sno, expected_errors", [
+        ("success", {}),
+        ("wrongtext", {('sno/', 'json_decode'): 1}),
+        ("notfound", {('sno/', 'http_status'): 1}),
+        ("timeout", {('sno/', 'timeout'): 1}),
+    ], indirect=['mock_get_sno'])
+    def test_client_stats(self, client, mock_get_sno, expected_errors):
+        client.node()
+        snapshot = client.stats.snapshot()
+        assert snapshot['durations']['sno/'][0][-1][1] == 1
+        assert snapshot['errors'] == expected_errors
+
+    @pytest.mark.parametrize("mock_api_server, expected_errors", [
+        ("success", {}),
+        ("wrongtext", {('sno/', 'json_decode'): 1}),
+        ("notfound", {('sno/', 'http_status'): 1}),
+    ], indirect=['mock_api_server'])
+    def test_async_client_stats(self, mock_api_server, expected_errors):
+        client = AsyncApiClient(mock_api_server)
+        asyncio.run(client.node())
+        snapshot = client.stats.snapshot()
+        assert snapshot['durations']['sno/'][0][-1][1] == 1
+        assert snapshot['errors'] == expected_errors
+
+    def test_client_retries(self):
+        client = ApiClient('http://127.0.0.1:1', retries=2, backoff_factor=0)
+        client.node()
+        snapshot = client.stats.snapshot()
+        assert snapshot['retries'] == {'sno/': 2}
+        assert snapshot['errors'] == {('sno/', 'connection'): 1}
+
+    def test_async_client_retries(self):
+        client = AsyncApiClient('http://127.0.0.1:1', retries=2, backoff_factor=0)
+        asyncio.run(client.node())
+        snapshot = client.stats.snapshot()
+        assert snapshot['retries'] == {'sno/': 2}
+        assert snapshot['errors'] == {('sno/', 'connection'): 1}
+
+
+class TestCircuitBreaker:
+    def test_states(self):
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=0.05)
+        breaker.record('sno/', False)
+        assert breaker.allow('sno/')
+        breaker.record('sno/', False)
+        assert not breaker.allow('sno/')
+        assert breaker.states() == {'sno/': CircuitBreaker.OPEN}
+        time.sleep(0.06)
+        assert breaker.allow('sno/')
+        assert breaker.state('sno/') == CircuitBreaker.HALF_OPEN
+        breaker.record('sno/', False)
+        assert breaker.state('sno/') == CircuitBreaker.OPEN
+        time.sleep(0.06)
+        breaker.record('sno/', True)
+        assert breaker.states() == {'sno/': CircuitBreaker.CLOSED}
+
+    def test_disabled(self):
+        breaker = CircuitBreaker(failure_threshold=0)
+        for _ in range(10):
+            breaker.record('sno/', False)
+        assert breaker.allow('sno/')
+
+
+class TestApiClientBreaker:
+    @pytest.mark.parametrize("mock_get_sno", ["timeout"], indirect=True)
+    def test_fail_fast(self, requests_mock, mock_get_sno):
+        client = ApiClient(pytest.base_url, retries=0, breaker_failures=2,
+                           breaker_cooldown=60)
+        for _ in range(4):
+            assert client.node() == {}
+        assert requests_mock.call_count == 2
+        assert client.breaker_states() == {'sno/': CircuitBreaker.OPEN}
+        assert client.stats.snapshot()['errors'] == {
+            ('sno/', 'timeout'): 2, ('sno/', 'circuit_open'): 2}
+        assert client.is_failing('sno/')
+
+    @pytest.mark.usefixtures("mock_get_sno")
+    @pytest.mark.parametrize("stale_ttl, expected_stale", [(0, False), (60, True)])
+    def test_stale(self, requests_mock, stale_ttl, expected_stale):
+        client = ApiClient(pytest.base_url, stale_ttl=stale_ttl, breaker_failures=1)
+        node = client.node()
+        assert not client.is_failing('sno/')
+        requests_mock.get(f'{pytest.base_url}/api/sno/', status_code=500)
+        for _ in range(2):
+            assert (client.node() == node) == expected_stale
+        assert requests_mock.call_count == 2
+        assert client.is_failing('sno/')
+        assert 0 < client.staleness()['sno/'] < 1
+
+    def test_async_fail_fast(self):
+        client = AsyncApiClient('http://127.0.0.1:1', retries=0,
+                                breaker_failures=2, breaker_cooldown=60)
+
+        async def get_node(times):
+            return [await client.node() for _ in range(times)]
+
+        assert asyncio.run(get_node(4)) == [{}] * 4
+        assert client.breaker_states() == {'sno/': CircuitBreaker.OPEN}
+        assert client.stats.snapshot()['errors'] == {
+            ('sno/', 'connection'): 2, ('sno/', 'circuit_open'): 2}
+
+    @pytest.mark.parametrize("mock_api_server", ["success"], indirect=True)
+    def test_async_stale(self, mock_api_server):
+        client = AsyncApiClient(mock_api_server, stale_ttl=60)
+        node = asyncio.run(client.node())
+        client._port = 1
+        client._retries = 0
+        assert asyncio.run(client.node()) == node
+        assert client.is_failing('sno/')
+        assert set(client.staleness()) == {'sno/'}
+
+
+class TestApiClientDeadline:
+    @pytest.mark.usefixtures("mock_get_sno")
+    def test_skipped_when_reached(self, requests_mock):
+        client = ApiClient(pytest.base_url)
+        with scrape_deadline(0) as deadline:
+            assert client.node() == {}
+        assert deadline.partial
+        assert requests_mock.call_count == 0
+        assert client.stats.snapshot()['errors'] == {('sno/', 'deadline'): 1}
+        assert not client.is_failing('sno/')
+        assert client.breaker_states() == {}
+
+    @pytest.mark.usefixtures("mock_get_sno")
+    def test_stale_served_when_reached(self, requests_mock):
+        client = ApiClient(pytest.base_url, stale_ttl=60)
+        node = client.node()
+        with scrape_deadline(0):
+            assert client.node() == node
+
+    def test_timeout_capped(self, silent_server):
+        client = ApiClient(silent_server, timeout=10, retries=2)
+        started = time.monotonic()
+        with scrape_deadline(0.2) as deadline:
+            assert client.node() == {}
+        assert time.monotonic() - started < 1
+        assert deadline.partial
+        assert client.stats.snapshot()['errors'] == {('sno/', 'deadline'): 1}
+        assert client.breaker_states() == {}
+
+    def test_timeout_without_deadline(self, silent_server):
+        # (0.1 + 0.25) - 0.25 < 0.1 must not be mistaken for a deadline
+        client = ApiClient(silent_server, timeout=0.1, retries=2, backoff_factor=0.125)
+        assert client.node() == {}
+        snapshot = client.stats.snapshot()
+        assert snapshot['retries'] == {'sno/': 2}
+        assert snapshot['errors'] == {('sno/', 'timeout'): 1}
+        assert client.is_failing('sno/')
+
+    def test_retries_stop_at_deadline(self):
+        client = ApiClient('http://127.0.0.1:1', retries=2, backoff_factor=1)
+        started = time.monotonic()
+        with scrape_deadline(0.5) as deadline:
+            assert client.node() == {}
+        assert time.monotonic() - started < 0.5
+        assert not deadline.partial
+        snapshot = client.stats.snapshot()
+        assert snapshot['retries'] == {'sno/': 1}
+        assert snapshot['errors'] == {('sno/', 'connection'): 1}
+        assert client.is_failing('sno/')
+
+    def test_waiting_for_inflight_stops_at_deadline(self, silent_server):
+        client = ApiClient(silent_server, timeout=0.5, retries=0)
+        leader = threading.Thread(target=client.node)
+        leader.start()
+        time.sleep(0.05)
+        with scrape_deadline(0.05) as deadline:
+            assert client.node() == {}
+        assert deadline.partial
+        leader.join()
+
+
+class TestApiClientCache:
+    @pytest.mark.usefixtures("mock_get_sno")
+    @pytest.mark.parametrize("cache_ttl, expected_calls, expected_stats", [
+        (0, 2, {'hit': 0, 'miss': 2}),
+        (60, 1, {'hit': 1, 'miss': 1}),
+    ])
+    def test_cache_ttl(self, requests_mock, cache_ttl, expected_calls,
+                       expected_stats):
+        client = ApiClient(pytest.base_url, cache_ttl=cache_ttl)
+        first = client.node()
+        second = client.node()
+        assert first == second
+        assert requests_mock.call_count == expected_calls
+        assert client.cache_stats() == expected_stats
+
+    def test_cache_expired(self, requests_mock):
+        requests_mock.get(url='/api/sno/', json={'k': 'v'})
+        client = ApiClient(pytest.base_url, cache_ttl=0.01)
+        client.node()
+        time.sleep(0.02)
+        client.node()
+        assert requests_mock.call_count == 2
+
+    @pytest.mark.usefixtures("mock_get_sno")
+    @pytest.mark.parametrize("mock_get_sno", [("notfound"), ("timeout")],
+                             indirect=['mock_get_sno'])
+    def test_failures_not_cached(self, requests_mock):
+        client = ApiClient(pytest.base_url, cache_ttl=60, backoff_factor=0)
+        assert client.node() == {}
+        assert client.node() == {}
+        assert client.cache_stats() == {'hit': 0, 'miss': 2}
+
+    def test_inflight_requests_coalesced(self, requests_mock):
+        def slow_response(request, context):
+            time.sleep(0.1)
+            return {'k': 'v'}
+
+        requests_mock.get(url='/api/sno/', json=slow_response)
+        client = ApiClient(pytest.base_url)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(client.node()))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results == [{'k': 'v'}] * 5
+        assert requests_mock.call_count == 1
+        assert client.cache_stats() == {'hit': 4, 'miss': 1}
+
+    def test_forget(self, requests_mock):
+        requests_mock.get(url='/api/sno/satellite/a', json={'k': 'v'})
+        requests_mock.get(url='/api/sno/satellite/b', status_code=500)
+        client = ApiClient(pytest.base_url, cache_ttl=60, retries=0,
+                           breaker_failures=1)
+        client.satellite('a')
+        client.satellite('b')
+        client.forget('sno/satellite/a')
+        client.forget('sno/satellite/b')
+        assert client.cache_ages() == {}
+        assert client.staleness() == {}
+        assert client.breaker_states() == {}
+        assert not client.is_failing('sno/satellite/b')
+        snapshot = client.stats.snapshot()
+        assert (snapshot['durations'], snapshot['retries'], snapshot['errors']) == \
+            ({}, {}, {})
+        assert set(snapshot['sizes']) == {'sno/satellite/'}
+
+
+class TestAsyncApiClient:
+    @pytest.mark.parametrize(
+        "mock_api_server, expected_result",
+        [
+            ("success", True),
+            ("chunked", True),
+            ("wrongtext", False),
+            ("notfound", False),
+        ],
+        indirect=['mock_api_server'])
+    def test_endpoints(self, mock_api_server, expected_result):
+        client = AsyncApiClient(mock_api_server)
+
+        async def get_all():
+            return await asyncio.gather(
+                client.node(), client.payout(), client.satellite(pytest.sat_id))
+
+        node, payout, satellite = asyncio.run(get_all())
+        for response in (node, payout, satellite):
+            assert isinstance(response, dict)
+            assert bool(response) == expected_result
+        if expected_result:
+            assert len(node['satellites']) == 6
+            assert 'currentMonth' in payout
+            assert 'audits' in satellite
+
+    def test_connection_refused(self):
+        client = AsyncApiClient('http://127.0.0.1:1', retries=1, backoff_factor=0)
+        assert asyncio.run(client.node()) == {}
+
+    def test_timeout(self, silent_server):
+        client = AsyncApiClient(silent_server, timeout=0.05, retries=2,
+                                backoff_factor=0)
+        started = time.monotonic()
+        assert asyncio.run(client.node()) == {}
+        assert time.monotonic() - started < 1
+        snapshot = client.stats.snapshot()
+        assert snapshot['retries'] == {'sno/': 2}
+        assert snapshot['errors'] == {('sno/', 'timeout'): 1}
+
+    def test_timeout_capped_by_deadline(self, silent_server):
+        client = AsyncApiClient(silent_server, timeout=10, retries=2)
+
+        async def get_node():
+            with scrape_deadline(0.2) as deadline:
+                return await client.node(), deadline
+
+        started = time.monotonic()
+        node, deadline = asyncio.run(get_node())
+        assert node == {}
+        assert time.monotonic() - started < 1
+        assert deadline.partial
+        assert client.stats.snapshot()['errors'] == {('sno/', 'deadline'): 1}
+        assert client.breaker_states() == {}
+
+    @pytest.mark.parametrize("cache_ttl, expected_stats", [
+        (0, {'hit': 1, 'miss': 2}),
+        (60, {'hit': 2, 'miss': 1}),
+    ])
+    def test_cache(self, mock_api_server, cache_ttl, expected_stats):
+        client = AsyncApiClient(mock_api_server, cache_ttl=cache_ttl)
+
+        async def get_twice():
+            await asyncio.gather(client.node(), client.node())
+            return await client.node()
+
+        assert asyncio.run(get_twice())['nodeID']
+        assert client.cache_stats() == expected_stats
+
+
+class TestAwaitableClient:
+    @pytest.mark.usefixtures("mock_get_sno")
+    @pytest.mark.parametrize("threaded", [False, True])
+    def test_node(self, client, threaded):
+        awaitable = AwaitableClient(client, threaded)
+        assert asyncio.run(awaitable.node()) == client.node()
+        assert awaitable.cache_stats() == client.cache_stats()
+
+    def test_threaded_shares_deadline(self, silent_server):
+        client = AwaitableClient(ApiClient(silent_server, timeout=10), threaded=True)
+
+        async def get_node():
+            with scrape_deadline(0.1) as deadline:
+                return await client.node(), deadline
+
+        node, deadline = asyncio.run(get_node())
+        assert node == {}
+        assert deadline.partial
+
+
 class TestApiClientKeys:
     @pytest.mark.usefixtures("mock_get_sno")
     def test_node_keys(self, client):
@@ -1,7 +1,21 @@
+import asyncio
+import re
+import threading
+import time
 import pytest
+from storj_exporter.api_wrapper import ApiClient, AsyncApiClient
 from storj_exporter.collectors import StorjCollector, NodeCollector, SatCollector
-from storj_exporter.collectors import PayoutCollector
+from storj_exporter.collectors import PayoutCollector, ExporterCollector
+from storj_exporter.collectors import PaystubCollector
+from storj_exporter.store import PermanentStore
+from storj_exporter.collectors import (
+    AuditHistoryCollector,
+    DailyCollector,
+    ParallelCollector
+)
 from prometheus_client.exposition import generate_latest
+from prometheus_client.parser import text_string_to_metric_families
+from deadline import scrape_deadline  # flat module used by storj_exporter modules
 
 
 @pytest.fixture
@@ -9,6 +23,15 @@ def gauge_dict():
     return {'used': 42, 'available': 10, 'trash': 15, 'overused': 0}
 
 
+def exposed_samples(collector):
+    """Rendered samples as ((name, type, timestamp, labels), value) in order."""
+    text = generate_latest(collector).decode('utf-8')
+    return [((s.name, s.labels.get('type', None), s.timestamp,
+              tuple(sorted(s.labels.items()))), s.value)
+            for family in text_string_to_metric_families(text)
+            for s in family.samples]
+
+
 class TestStorjCollector:
     def test_init(self, client):
         collector = StorjCollector(client)
@@ -16,34 +39,58 @@ class TestStorjCollector:
 
 
 class TestNodeCollector:
+    @pytest.mark.usefixtures("mock_get_sno")
+    def test_collect_without_refresh(self, client, requests_mock):
+        collector = NodeCollector(client, refresh_on_collect=False)
+        assert len(list(collector.collect())[0].samples) == 0
+        collector.refresh()
+        calls = requests_mock.call_count
+        res_list = list(collector.collect())
+        assert requests_mock.call_count == calls
+        assert len(res_list) == 4
+        assert len(res_list[0].samples) == 6
+
     @pytest.mark.usefixtures("mock_get_sno")
     @pytest.mark.parametrize("mock_get_sno, expected_len",
                              [("success", 5), ("notfound", 0), ("timeout", 0)],
                              indirect=['mock_get_sno'])
     def test_refresh_data(self, client, expected_len):
         collector = NodeCollector(client)
-        collector._refresh_data()
+        collector.refresh()
         assert isinstance(collector._node, dict)
         assert len(list(collector._node)) >= expected_len
 
     @pytest.mark.usefixtures("mock_get_sno")
     @pytest.mark.parametrize(
-        "mock_get_sno, expected_samples",
+        "mock_get_sno, expected_samples, expected_up",
         [
-            ("success", 1),
-            ("wrongtext", 0),
-            ("missingkeys", 0),
-            ("notfound", 0),
-            ("timeout", 0)
+            ("success", 1, 1),
+            ("wrongtext", 0, 0),
+            ("missingkeys", 0, 1),
+            ("notfound", 0, 0),
+            ("timeout", 0, 0)
         ],
         indirect=['mock_get_sno'])
-    def test_collect(self, client, expected_samples):
+    def test_collect(self, client, expected_samples, expected_up):
         collector = NodeCollector(client)
         result = collector.collect()
         res_list = list(result)
-        assert len(res_list) == 3
+        assert len(res_list) == 4
         for metric in res_list:
             assert len(metric.samples) >= expected_samples
+        assert res_list[-1].name == 'storj_up'
+        assert res_list[-1].samples[0].value == expected_up
+        assert collector.refresh_duration >= 0
+        assert collector.collect_duration >= collector.refresh_duration
+
+    @pytest.mark.usefixtures("mock_get_sno")
+    def test_up_with_stale_data(self, requests_mock):
+        collector = NodeCollector(ApiClient(pytest.base_url, stale_ttl=60))
+        collector.refresh()
+        requests_mock.get(f'{pytest.base_url}/api/sno/', status_code=500)
+        res_list = list(collector.collect())
+        assert len(res_list[0].samples) == 6
+        assert res_list[-1].samples[0].value == 0
 
     @pytest.mark.usefixtures("mock_get_sno")
     @pytest.mark.parametrize("mock_get_sno",
@@ -74,14 +121,179 @@ class TestNodeCollector:
 
 class TestSatCollector:
     @pytest.mark.usefixtures("mock_get_sno")
-    @pytest.mark.parametrize("mock_get_sno, expected_len",
-                             [("success", 14), ("notfound", 0), ("timeout", 0)],
+    @pytest.mark.usefixtures("mock_get_satellite")
+    @pytest.mark.parametrize("mock_get_sno, expected_len, expected_sats",
+                             [("success", 14, 6), ("notfound", 0, 0),
+                              ("timeout", 0, 0)],
                              indirect=['mock_get_sno'])
-    def test_refresh_data(self, client, expected_len):
+    def test_refresh_data(self, client, expected_len, expected_sats):
         collector = SatCollector(client)
-        collector._refresh_data()
+        collector.refresh()
         assert isinstance(collector._node, dict)
         assert len(list(collector._node)) == expected_len
+        assert len(collector._satellites) == expected_sats
+
+    @pytest.mark.usefixtures("mock_get_sno")
+    @pytest.mark.parametrize("max_workers, expected_peak", [(1, 1), (3, 3)])
+    def test_refresh_data_concurrency(self, client, monkeypatch, max_workers,
+                                      expected_peak):
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+
+        def slow_satellite(sat_id):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.05)
+            with lock:
+                state['running'] -= 1
+            return {'id': sat_id}
+
+        monkeypatch.setattr(client, 'satellite', slow_satellite)
+        collector = SatCollector(client, max_workers=max_workers)
+        collector.refresh()
+        assert state['peak'] == expected_peak
+        sat_ids = [s['id'] for s in collector._node['satellites']]
+        assert [sat_id for _, sat_id, _ in collector._satellites] == sat_ids
+        assert [d['id'] for d, _, _ in collector._satellites] == sat_ids
+
+    @pytest.mark.usefixtures("mock_get_sno")
+    @pytest.mark.parametrize("max_workers", [1, 3])
+    def test_refresh_data_batch(self, client, monkeypatch, max_workers):
+        fetched = []
+
+        def satellite(sat_id):
+            fetched.append(sat_id)
+            return {'id': sat_id, 'refresh': refresh}
+
+        monkeypatch.setattr(client, 'satellite', satellite)
+        collector = SatCollector(client, max_workers=max_workers, batch_size=4)
+        sat_ids = [s['id'] for s in client.node()['satellites']]
+        refresh = 0
+        collector.refresh()
+        assert sorted(fetched) == sorted(sat_ids)
+        for refresh, batch in enumerate(
+                [sat_ids[4:] + sat_ids[:2], sat_ids[2:], sat_ids[:4]], start=1):
+            fetched.clear()
+            collector.refresh()
+            assert sorted(fetched) == sorted(batch)
+            assert [sat_id for _, sat_id, _ in collector._satellites] == sat_ids
+            for _sat_data, _sat_id, _ in collector._satellites:
+                assert _sat_data['id'] == _sat_id
+                assert (_sat_data['refresh'] == refresh) == (_sat_id in batch)
+                assert 'suspended' in _sat_data
+
+    @pytest.mark.usefixtures("mock_get_sno")
+    def test_refresh_data_batch_flags(self, client, requests_mock, monkeypatch):
+        monkeypatch.setattr(client, 'satellite', lambda sat_id: {'id': sat_id})
+        collector = SatCollector(client, batch_size=1)
+        collector.refresh()
+        node = client.node()
+        node = dict(node, satellites=[dict(s, suspended='2023-01-01T00:00:00Z')
+                                      for s in node['satellites']])
+        requests_mock.get(f'{pytest.base_url}/api/sno/', json=node)
+        collector.refresh()
+        assert [d['suspended'] for d, _, _ in collector._satellites] == [1] * 6
+
+    @pytest.mark.usefixtures("mock_get_sno")
+    @pytest.mark.parametrize("failure", [{}, ['invalid']])
+    def test_refresh_data_batch_failing(self, client, monkeypatch, failure):
+        failing = set()
+
+        def satellite(sat_id):
+            return failure if sat_id in failing else {'id': sat_id}
+
+        monkeypatch.setattr(client, 'satellite', satellite)
+        collector = SatCollector(client, refresh_on_collect=False, batch_size=2)
+        collector.refresh()
+        expected = generate_latest(collector)
+        sat_ids = [s['id'] for s in client.node()['satellites']]
+        failing.update(sat_ids[:3])
+        for _ in range(3):
+            collector.refresh()
+            assert [d['id'] for d, _, _ in collector._satellites] == sat_ids
+            assert generate_latest(collector) == expected
+
+    @pytest.mark.usefixtures("mock_get_sno")
+    def test_refresh_data_batch_deadline(self, requests_mock):
+        delay = {'seconds': 0}
+
+        def slow_satellite(request, context):
+            time.sleep(delay['seconds'])
+            return {'audits': {'auditScore': 1}}
+
+        requests_mock.get(url=re.compile(r'/api/sno/satellite/'), json=slow_satellite)
+        client = ApiClient(pytest.base_url)
+        collector = SatCollector(client, refresh_on_collect=False, max_workers=1,
+                                 batch_size=3)
+        collector.refresh()
+        sat_ids = [s['id'] for s in client.node()['satellites']]
+        delay['seconds'] = 0.1
+        requests_mock.reset_mock()
+        with scrape_deadline(0.15) as deadline:
+            collector.refresh()
+        assert deadline.partial
+        assert all(d for d, _, _ in collector._satellites)
+
+        def fetched():
+            return [r.path.rsplit('/', 1)[-1] for r in requests_mock.request_history
+                    if '/satellite/' in r.path]
+
+        assert fetched() == [s.lower() for s in sat_ids[3:5]]
+        delay['seconds'] = 0
+        requests_mock.reset_mock()
+        collector.refresh()
+        assert sorted(fetched()) == sorted(s.lower() for s in sat_ids[5:] + sat_ids[:2])
+
+    def test_refresh_async_batch(self, mock_api_server):
+        client = AsyncApiClient(mock_api_server)
+        collector = SatCollector(client, refresh_on_collect=False, batch_size=2)
+        asyncio.run(collector.refresh_async(client))
+        asyncio.run(collector.refresh_async(client))
+        assert client.stats.snapshot()['durations'].keys() == \
+            {'sno/'} | {f'sno/satellite/{s}' for _, s, _ in collector._satellites}
+        requests = {endpoint: buckets[-1][1] for endpoint, (buckets, _) in
+                    client.stats.snapshot()['durations'].items()}
+        assert sorted(requests.values()) == [1, 1, 1, 1, 2, 2, 2]
+        assert all(d for d, _, _ in collector._satellites)
+
+    @pytest.mark.usefixtures("mock_get_sno")
+    @pytest.mark.parametrize("node_status, expected_forgotten", [(200, 1), (500, 0)])
+    def test_refresh_data_departed(self, client, requests_mock, monkeypatch,
+                                   node_status, expected_forgotten):
+        forgotten = []
+        monkeypatch.setattr(client, 'satellite', lambda sat_id: {'id': sat_id})
+        monkeypatch.setattr(client, 'forget', forgotten.append)
+        collector = SatCollector(client)
+        collector.refresh()
+        node = client.node()
+        departed = node['satellites'][0]['id']
+        requests_mock.get(f'{pytest.base_url}/api/sno/', status_code=node_status,
+                          json=dict(node, satellites=node['satellites'][1:]))
+        collector.refresh()
+        assert forgotten == [f'sno/satellite/{departed}'] * expected_forgotten
+
+    @pytest.mark.usefixtures("mock_get_sno")
+    @pytest.mark.parametrize("max_workers", [1, 3])
+    def test_refresh_data_deadline(self, requests_mock, max_workers):
+        def slow_satellite(request, context):
+            time.sleep(0.1)
+            return {'audits': {'auditScore': 1}}
+
+        requests_mock.get(url=re.compile(r'/api/sno/satellite/'), json=slow_satellite)
+        client = ApiClient(pytest.base_url)
+        collector = SatCollector(client, refresh_on_collect=False,
+                                 max_workers=max_workers)
+        requests_mock.reset_mock()
+        with scrape_deadline(0.15) as deadline:
+            collector.refresh()
+        assert deadline.partial
+        sat_calls = [r for r in requests_mock.request_history
+                     if '/satellite/' in r.path]
+        assert 0 < len(sat_calls) < 6
+        fetched = [d for d, _, _ in collector._satellites if d]
+        assert len(fetched) == len(sat_calls)
+        assert len(collector._satellites) == 6
 
     @pytest.mark.usefixtures("mock_get_sno")
     @pytest.mark.usefixtures("mock_get_satellite")
@@ -113,11 +325,9 @@ class TestSatCollector:
                              indirect=['mock_get_satellite'])
     def test_gen_sat_metric_map(self, client):
         collector = SatCollector(client)
-        _sat_data = collector.client.satellite('id')
-        _metric_template_map = collector._get_metric_template_map(
-            _sat_data, 'id', 'url')
+        _metric_template_map = collector._get_metric_template_map()
         assert isinstance(_metric_template_map, list)
-        assert _metric_template_map
+        assert len(_metric_template_map) == len(collector._plans) == 5
 
     @pytest.mark.usefixtures("mock_get_sno")
     @pytest.mark.usefixtures("mock_get_satellite")
@@ -141,6 +351,182 @@ class TestSatCollector:
         assert len(output.splitlines()) >= expected_len
 
 
+class TestDailyCollector:
+    @pytest.mark.usefixtures("mock_get_sno", "mock_get_satellite")
+    def test_collect(self, client):
+        collector = DailyCollector(client)
+        metrics = {m.name: m for m in collector.collect()}
+        assert [m.name for m in collector.describe()] == list(metrics)
+        egress = metrics['storj_sat_daily_egress'].samples
+        assert len(egress) == 6 * 9 * 3
+        assert egress[0].labels['type'] == 'repair'
+        assert egress[0].value == 11051520
+        assert egress[0].timestamp == 1675209600
+        assert egress[3].timestamp == 1675209600 + 86400
+        storage = metrics['storj_sat_daily_storage'].samples
+        assert {s.labels['type'] for s in storage} == {'atRestTotal',
+                                                       'atRestTotalBytes'}
+        assert b' 1.105152e+07 1675209600000\n' in generate_latest(collector)
+
+    @pytest.mark.usefixtures("mock_get_sno", "mock_get_satellite")
+    def test_refresh_incremental(self, requests_mock, monkeypatch):
+        client = ApiClient(pytest.base_url, cache_ttl={'sno/satellite/': 60})
+        collector = DailyCollector(client, refresh_on_collect=False)
+        converted = []
+        convert_day = collector._convert_day
+
+        def spy(daily_key, day):
+            converted.append(day['intervalStart'])
+            return convert_day(daily_key, day)
+
+        monkeypatch.setattr(collector, '_convert_day', spy)
+        collector.refresh()
+        assert len(converted) == 6 * 18
+        expected = generate_latest(collector)
+
+        converted.clear()
+        collector.refresh()
+        assert converted == []
+        assert generate_latest(collector) == expected
+
+        client._cache = type(client._cache)()
+        satellite = client.satellite(pytest.sat_id)
+        satellite['bandwidthDaily'][-1] = dict(
+            satellite['bandwidthDaily'][-1], delete=1)
+        requests_mock.get(re.compile('/api/sno/satellite/'), json=satellite)
+        converted.clear()
+        collector.refresh()
+        assert converted == [satellite['bandwidthDaily'][-1]['intervalStart']] * 6
+        assert generate_latest(collector) == expected
+
+    @pytest.mark.usefixtures("mock_get_sno", "mock_get_satellite")
+    def test_open_day(self, client, requests_mock):
+        collector = DailyCollector(client, refresh_on_collect=False)
+        collector.refresh()
+        samples = exposed_samples(collector)
+        assert len({series for series, _ in samples}) == len(samples)
+        samples = dict(samples)
+        open_day = {s: v for s, v in samples.items() if s[2] is None}
+        assert len(open_day) == 6 * (3 + 2 + 2)
+
+        satellite = client.satellite(pytest.sat_id)
+        last = satellite['bandwidthDaily'][-1]
+        satellite['bandwidthDaily'][-1] = dict(
+            last, egress=dict(last['egress'], repair=last['egress']['repair'] + 1))
+        requests_mock.get(re.compile('/api/sno/satellite/'), json=satellite)
+        collector.refresh()
+        updated = dict(exposed_samples(collector))
+        assert updated.keys() == samples.keys()
+        assert {s for s in samples if samples[s] != updated[s]} == {
+            s for s in open_day if s[:2] == ('storj_sat_daily_egress', 'repair')}
+
+    @pytest.mark.usefixtures("mock_get_sno", "mock_get_satellite")
+    def test_satellites_removed(self, client, requests_mock):
+        collector = DailyCollector(client)
+        collector.refresh()
+        assert len(collector._index) == 6
+        requests_mock.get(f'{pytest.base_url}/api/sno/', json={'satellites': []})
+        collector.refresh()
+        assert collector._index == {}
+
+
+class TestAuditHistoryCollector:
+    @pytest.mark.usefixtures("mock_get_sno", "mock_get_satellite")
+    def test_collect(self, client):
+        collector = AuditHistoryCollector(client)
+        metrics = {m.name: m for m in collector.collect()}
+        assert [m.name for m in collector.describe()] == list(metrics)
+        windows = metrics['storj_sat_audit_window'].samples
+        assert len(windows) == 6 * 48 * 3
+        assert [(s.labels['type'], s.value, s.timestamp) for s in windows[:3]] == [
+            ('total', 39, 1673308800), ('online', 39, 1673308800),
+            ('offline', 0, 1673308800)]
+        assert windows[3].timestamp == 1673308800 + 43200
+        score = metrics['storj_sat_audit_history_score'].samples
+        assert len(score) == 6
+        assert score[0].value == 0.9994903307112822
+
+    @pytest.mark.usefixtures("mock_get_sno", "mock_get_satellite")
+    def test_refresh_incremental(self, client, requests_mock, monkeypatch):
+        collector = AuditHistoryCollector(client, refresh_on_collect=False,
+                                          max_workers=1)
+        converted = []
+        convert_window = collector._convert_window
+
+        def spy(window):
+            converted.append(window['windowStart'])
+            return convert_window(window)
+
+        monkeypatch.setattr(collector, '_convert_window', spy)
+        collector.refresh()
+        assert len(converted) == 6 * 48
+        expected = generate_latest(collector)
+
+        converted.clear()
+        client._cache = type(client._cache)()
+        collector.refresh()
+        assert converted == []
+        assert generate_latest(collector) == expected
+
+        satellite = client.satellite(pytest.sat_id)
+        windows = satellite['auditHistory']['windows']
+        last = dict(windows[-1], totalCount=windows[-1]['totalCount'] + 2)
+        new = {'windowStart': '2023-02-10T00:00:00Z', 'totalCount': 3,
+               'onlineCount': 1}
+        satellite['auditHistory']['windows'] = windows[2:-1] + [last, new]
+        requests_mock.get(re.compile('/api/sno/satellite/'), json=satellite)
+        client._cache = type(client._cache)()
+        converted.clear()
+        collector.refresh()
+        assert converted == [last['windowStart'], new['windowStart']] * 6
+        _sat_data = collector._satellites[0][0]
+        assert [w for _, w, _ in _sat_data['windows']] == windows[2:-1] + [last, new]
+        assert _sat_data['windows'][-1][2] == [
+            ('total', 3, 1675987200), ('online', 1, 1675987200),
+            ('offline', 2, 1675987200)]
+
+    @pytest.mark.usefixtures("mock_get_sno", "mock_get_satellite")
+    def test_open_window(self, client, requests_mock):
+        collector = AuditHistoryCollector(client, refresh_on_collect=False)
+        collector.refresh()
+        samples = exposed_samples(collector)
+        assert len({series for series, _ in samples}) == len(samples)
+        samples = dict(samples)
+        open_window = {s for s in samples
+                       if s[0] == 'storj_sat_audit_window' and s[2] is None}
+        assert len(open_window) == 6 * 3
+
+        satellite = client.satellite(pytest.sat_id)
+        windows = satellite['auditHistory']['windows']
+        windows[-1] = dict(windows[-1], totalCount=windows[-1]['totalCount'] + 2)
+        requests_mock.get(re.compile('/api/sno/satellite/'), json=satellite)
+        collector.refresh()
+        updated = dict(exposed_samples(collector))
+        assert updated.keys() == samples.keys()
+        assert {s for s in samples if samples[s] != updated[s]} == {
+            s for s in open_window if s[1] in ('total', 'offline')}
+
+    @pytest.mark.usefixtures("mock_get_sno", "mock_get_satellite")
+    def test_satellites_removed(self, client, requests_mock):
+        collector = AuditHistoryCollector(client)
+        collector.refresh()
+        assert len(collector._history) == 6
+        requests_mock.get(f'{pytest.base_url}/api/sno/', json={'satellites': []})
+        collector.refresh()
+        assert collector._history == {}
+
+    @pytest.mark.parametrize("audit_history", [
+        None, [], {}, {'windows': None}, {'windows': [None, 'test']},
+        {'windows': [{'windowStart': 'test', 'totalCount': 1}]},
+    ])
+    def test_prepare_invalid(self, client, audit_history):
+        collector = AuditHistoryCollector(client)
+        _sat_data = collector._prepare_sat_data(
+            {'id': pytest.sat_id}, {'auditHistory': audit_history})
+        assert _sat_data['score'] is None
+        assert all(samples == [] for _, _, samples in _sat_data['windows'])
+
+
 class TestPayoutCollector:
     @pytest.mark.usefixtures("mock_get_payout")
     @pytest.mark.parametrize("mock_get_payout, expected_len",
@@ -148,7 +534,7 @@ class TestPayoutCollector:
                              indirect=['mock_get_payout'])
     def test_refresh_data(self, client, expected_len):
         collector = PayoutCollector(client)
-        collector._refresh_data()
+        collector.refresh()
         assert isinstance(collector._payout, dict)
         assert len(list(collector._payout)) == expected_len
 
@@ -195,3 +581,224 @@ class TestPayoutCollector:
         output = generate_latest(collector)
         assert isinstance(output, bytes)
         assert len(output.splitlines()) == expected_len
+
+
+class TestPaystubCollector:
+    periods = ['2023-01', '2022-12', '2023-02']
+
+    @staticmethod
+    def paystubs(period):
+        return [{'satelliteId': f'sat{i}', 'period': period, 'held': 1,
+                 'paid': 2, 'codes': 'test'} for i in range(2)]
+
+    @pytest.fixture
+    def mock_heldamount(self, requests_mock):
+        base_url = f'{pytest.base_url}/api/heldamount'
+        requests_mock.get(f'{base_url}/periods', json=self.periods)
+        for period in self.periods:
+            requests_mock.get(f'{base_url}/paystubs/{period}',
+                              json=self.paystubs(period))
+        requests_mock.get(f'{base_url}/held-history', json=[
+            {'satelliteID': 'sat0', 'totalHeld': 3, 'totalDisposed': 4},
+            {'satelliteName': 'sat1', 'totalHeld': 3}])
+        return requests_mock
+
+    def paystub_calls(self, requests_mock):
+        return [r.path.rsplit('/', 1)[1] for r in requests_mock.request_history
+                if '/paystubs/' in r.path]
+
+    @pytest.mark.usefixtures("mock_heldamount")
+    def test_collect(self, client):
+        collector = PaystubCollector(client)
+        metrics = {m.name: m for m in collector.collect()}
+        assert [m.name for m in collector.describe()] == list(metrics)
+        paystubs = metrics['storj_paystub'].samples
+        assert len(paystubs) == 3 * 2 * 2
+        assert [s.labels for s in paystubs[:2]] == [
+            {'type': 'held', 'satellite': 'sat0', 'period': '2022-12'},
+            {'type': 'paid', 'satellite': 'sat0', 'period': '2022-12'}]
+        assert [(s.labels, s.value) for s in metrics['storj_held_history'].samples] \
+            == [({'type': 'totalHeld', 'satellite': 'sat0'}, 3),
+                ({'type': 'totalDisposed', 'satellite': 'sat0'}, 4)]
+
+    def test_refresh_interval(self, client, mock_heldamount, monkeypatch):
+        collector = PaystubCollector(client, refresh_on_collect=False, interval=60)
+        collector.refresh()
+        assert self.paystub_calls(mock_heldamount) == sorted(self.periods)
+        expected = generate_latest(collector)
+        mock_heldamount.reset_mock()
+        collector.refresh()
+        assert mock_heldamount.call_count == 0
+        assert generate_latest(collector) == expected
+
+        refreshed_at = collector._refreshed_at
+        monkeypatch.setattr(time, 'monotonic', lambda: refreshed_at + 60)
+        collector.refresh()
+        assert self.paystub_calls(mock_heldamount) == ['2023-02']
+        assert generate_latest(collector) == expected
+
+    def test_store(self, client, mock_heldamount, tmp_path):
+        collector = PaystubCollector(client, store=PermanentStore(str(tmp_path)))
+        expected = generate_latest(collector)
+        assert sorted(p.name for p in tmp_path.iterdir()) == [
+            '2022-12.json', '2023-01.json']
+        mock_heldamount.reset_mock()
+        collector = PaystubCollector(client, store=PermanentStore(str(tmp_path)))
+        assert generate_latest(collector) == expected
+        assert self.paystub_calls(mock_heldamount) == ['2023-02']
+
+    def test_failures_not_stored(self, client, mock_heldamount):
+        mock_heldamount.get(f'{pytest.base_url}/api/heldamount/paystubs/2022-12',
+                            status_code=500)
+        collector = PaystubCollector(client, refresh_on_collect=False)
+        collector.refresh()
+        assert collector.store.get('2022-12') is None
+        assert collector.store.get('2023-01') == self.paystubs('2023-01')
+        assert collector.store.get('2023-02') is None
+        assert [p for p, _ in collector._paystubs] == sorted(self.periods)
+
+    def test_periods_failure(self, client, mock_heldamount):
+        collector = PaystubCollector(client, refresh_on_collect=False)
+        collector.refresh()
+        expected = generate_latest(collector)
+        mock_heldamount.get(f'{pytest.base_url}/api/heldamount/periods',
+                            status_code=500)
+        collector._refreshed_at = None
+        collector.refresh()
+        assert collector._refreshed_at is not None
+        assert generate_latest(collector) == expected
+        mock_heldamount.reset_mock()
+        collector.refresh()
+        assert mock_heldamount.call_count == 0
+
+    def test_refresh_deadline(self, client, mock_heldamount):
+        collector = PaystubCollector(client, refresh_on_collect=False)
+        with scrape_deadline(0):
+            collector.refresh()
+        assert collector._refreshed_at is None
+
+
+class TestExporterCollector:
+    @pytest.mark.usefixtures("mock_get_sno")
+    @pytest.mark.parametrize("cache_ttl, expected_ages", [(0, 0), (60, 1)])
+    def test_collect(self, cache_ttl, expected_ages):
+        client = ApiClient(pytest.base_url, cache_ttl=cache_ttl)
+        collector = ExporterCollector(client)
+        client.node()
+        res_list = list(collector.collect())
+        assert len(res_list) == 10
+        samples = {s.labels['result']: s.value for s in res_list[0].samples
+                   if s.name.endswith('_total')}
+        assert samples == {'hit': 0.0, 'miss': 1.0}
+        assert len(res_list[1].samples) == expected_ages
+        for sample in res_list[1].samples:
+            assert sample.labels == {'endpoint': 'sno/'}
+            assert 0 <= sample.value < 1
+
+    @pytest.mark.usefixtures("mock_get_sno")
+    def test_collect_api_stats(self, requests_mock):
+        client = ApiClient(pytest.base_url)
+        node_collector = NodeCollector(client)
+        list(node_collector.collect())
+        requests_mock.get(f'{pytest.base_url}/api/sno/estimated-payout',
+                          status_code=500)
+        client.payout()
+        metrics = {m.name: m for m in
+                   ExporterCollector(client, [node_collector]).collect()}
+        samples = {(s.name, s.labels.get('endpoint'), s.labels.get('le')): s.value
+                   for m in metrics.values() for s in m.samples}
+        duration = 'storj_exporter_api_request_duration_seconds'
+        assert samples[(f'{duration}_count', 'sno/', None)] == 1
+        assert samples[(f'{duration}_bucket', 'sno/', '+Inf')] == 1
+        assert samples[(f'{duration}_count', 'sno/estimated-payout', None)] == 1
+        assert samples[('storj_exporter_api_response_size_bytes_sum', 'sno/',
+                        None)] > 0
+        assert [(s.labels, s.value) for s in
+                metrics['storj_exporter_api_errors'].samples] == \
+            [({'endpoint': 'sno/estimated-payout', 'type': 'http_status'}, 1)]
+        assert {tuple(s.labels.values()) for s in
+                metrics['storj_exporter_collector_duration_seconds'].samples} == \
+            {('NodeCollector', 'refresh'), ('NodeCollector', 'collect')}
+
+    @pytest.mark.parametrize("timeout, expected_partial", [
+        (None, 0), (10, 0), (0, 1)])
+    @pytest.mark.usefixtures("mock_get_sno")
+    def test_collect_partial(self, timeout, expected_partial):
+        client = ApiClient(pytest.base_url)
+        node_collector = NodeCollector(client, refresh_on_collect=False)
+        collectors = [node_collector, ExporterCollector(client, [node_collector])]
+        with scrape_deadline(timeout):
+            node_collector.refresh()
+            metrics = {m.name: m for c in collectors for m in c.collect()}
+        assert metrics['storj_exporter_scrape_partial'].samples[0].value == \
+            expected_partial
+
+
+class TestDescribe:
+    @pytest.mark.parametrize("collector_class", [
+        NodeCollector, SatCollector, PayoutCollector])
+    def test_describe(self, client, requests_mock, mock_get_sno, mock_get_payout,
+                      mock_get_satellite, collector_class):
+        collector = collector_class(client)
+        described = [(m.name, m.type) for m in collector.describe()]
+        assert requests_mock.call_count == 0
+        assert all(not m.samples for m in collector.describe())
+        assert described == [(m.name, m.type) for m in collector.collect()]
+
+    def test_describe_parallel(self, client):
+        collectors = [NodeCollector(client), PayoutCollector(client)]
+        assert [m.name for m in ParallelCollector(collectors).describe()] == \
+            [m.name for c in collectors for m in c.describe()]
+
+
+class TestParallelCollector:
+    @pytest.fixture
+    def slow_client(self, client, monkeypatch):
+        """Client with node taking 0.1s, payout 0.2s and each satellite 0.1s."""
+        node, payout, satellite = (client.node(), client.payout(),
+                                   client.satellite(pytest.sat_id))
+
+        def slow(result, delay):
+            def call(*args):
+                time.sleep(delay)
+                return result
+            return call
+
+        monkeypatch.setattr(client, 'node', slow(node, 0.1))
+        monkeypatch.setattr(client, 'payout', slow(payout, 0.2))
+        monkeypatch.setattr(client, 'satellite', slow(satellite, 0.1))
+        return client
+
+    @pytest.mark.usefixtures("mock_get_sno", "mock_get_payout", "mock_get_satellite")
+    @pytest.mark.parametrize("max_workers, expected_min, expected_max", [
+        (None, 0.2, 0.35),
+        (1, 0.5, 1),
+    ])
+    def test_collect(self, slow_client, max_workers, expected_min, expected_max):
+        collectors = [NodeCollector(slow_client),
+                      PayoutCollector(slow_client),
+                      SatCollector(slow_client, max_workers=6)]
+        expected = [m for c in collectors for m in c.collect()]
+        group = ParallelCollector(collectors, max_workers)
+        started = time.monotonic()
+        metrics = list(group.collect())
+        duration = time.monotonic() - started
+        assert expected_min <= duration < expected_max
+        assert [m.name for m in metrics] == [m.name for m in expected]
+        assert metrics == expected
+        for collector in collectors:
+            assert collector.refresh_duration < collector.collect_duration
+
+
+class TestAsyncRefresh:
+    @pytest.mark.parametrize("collector_class", [
+        NodeCollector, SatCollector, PayoutCollector])
+    def test_refresh_async(self, mock_api_server, collector_class):
+        collector = collector_class(ApiClient(mock_api_server),
+                                    refresh_on_collect=False)
+        collector.refresh()
+        expected = generate_latest(collector)
+        collector = collector_class(ApiClient('http://127.0.0.1:1', retries=0),
+                                    refresh_on_collect=False)
+        asyncio.run(collector.refresh_async(AsyncApiClient(mock_api_server)))
+        assert generate_latest(collector) == expected
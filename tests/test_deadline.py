@@ -0,0 +1,33 @@
+import threading
+import time
+from storj_exporter import deadline
+
+
+class TestScrapeDeadline:
+    def test_no_deadline(self):
+        assert deadline.current() is None
+        assert deadline.remaining(10) == 10
+        with deadline.scrape_deadline(None) as _deadline:
+            assert _deadline is None
+            assert deadline.current() is None
+
+    def test_deadline(self):
+        with deadline.scrape_deadline(5) as _deadline:
+            assert deadline.current() is _deadline
+            assert 4 < deadline.remaining(10) <= 5
+            assert deadline.remaining(1) == 1
+            assert not _deadline.partial
+        assert deadline.current() is None
+
+    def test_expired(self):
+        with deadline.scrape_deadline(0.01):
+            time.sleep(0.02)
+            assert deadline.remaining(10) == 0
+
+    def test_not_shared_with_other_threads(self):
+        seen = []
+        with deadline.scrape_deadline(5):
+            t = threading.Thread(target=lambda: seen.append(deadline.current()))
+            t.start()
+            t.join()
+        assert seen == [None]
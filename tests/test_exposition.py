@@ -0,0 +1,162 @@
+import gzip
+import threading
+import time
+import pytest
+from prometheus_client.core import CollectorRegistry, GaugeMetricFamily
+from storj_exporter.exposition import Exposition, ExpositionCache
+from storj_exporter.snapshot import ExpositionSnapshot
+from deadline import scrape_deadline  # flat module used by storj_exporter modules
+
+
+class FakeCollector:
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.collected = 0
+
+    def collect(self):
+        self.collected += 1
+        time.sleep(self.delay)
+        metric = GaugeMetricFamily('test_metric', 'test_documentation')
+        metric.add_metric([], self.collected)
+        yield metric
+
+
+def make_cache(delay=0, **kwargs):
+    collector = FakeCollector(delay)
+    registry = CollectorRegistry(auto_describe=False)
+    registry.register(collector)
+    cache = ExpositionCache(registry, **kwargs)
+    registry.register(cache)
+    return cache, collector
+
+
+class TestExposition:
+    @pytest.mark.parametrize("accept_encoding, expected_encoding", [
+        (None, None),
+        ('', None),
+        ('identity', None),
+        ('gzip', 'gzip'),
+        ('deflate, GZIP;q=1.0', 'gzip'),
+    ])
+    def test_encode(self, accept_encoding, expected_encoding):
+        exposition = Exposition(b'test_metric 1.0\n')
+        body, encoding = exposition.encode(accept_encoding)
+        assert encoding == expected_encoding
+        if encoding:
+            body = gzip.decompress(body)
+        assert body == b'test_metric 1.0\n'
+
+
+class TestExpositionCache:
+    @pytest.mark.parametrize("min_interval, expected_collected, expected_coalesced", [
+        (0, 2, 0),
+        (60, 1, 1),
+    ])
+    def test_back_to_back(self, min_interval, expected_collected,
+                          expected_coalesced):
+        cache, collector = make_cache(min_interval=min_interval)
+        first = cache.get()
+        second = cache.get()
+        assert collector.collected == expected_collected
+        assert (first is second) == (expected_collected == 1)
+        assert cache.coalesced_scrapes == expected_coalesced
+        assert b'test_metric 1.0' in first.plain
+
+    def test_interval_expired(self):
+        cache, collector = make_cache(min_interval=0.01)
+        cache.get()
+        time.sleep(0.02)
+        exposition = cache.get()
+        assert collector.collected == 2
+        assert b'test_metric 2.0' in exposition.plain
+
+    def test_concurrent(self):
+        cache, collector = make_cache(delay=0.1)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get()))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert collector.collected == 1
+        assert all(r is results[0] for r in results)
+        assert cache.coalesced_scrapes == 4
+
+    @pytest.mark.parametrize("timeout, expected_partial", [(0.05, True), (1, False)])
+    def test_deadline(self, timeout, expected_partial):
+        cache, collector = make_cache()
+        previous = cache.get()
+        collector.delay = 0.2
+        render = threading.Thread(target=cache.render)
+        render.start()
+        time.sleep(0.05)
+        started = time.monotonic()
+        with scrape_deadline(timeout) as deadline:
+            exposition = cache.get()
+        assert (time.monotonic() - started < 0.1) == expected_partial
+        assert (exposition is previous) == expected_partial
+        assert deadline.partial == expected_partial
+        render.join()
+
+    def test_deadline_first_render(self):
+        cache, collector = make_cache(delay=0.1)
+        with scrape_deadline(0.01) as deadline:
+            exposition = cache.get()
+        assert b'test_metric 1.0' in exposition.plain
+        assert not deadline.partial
+
+    def test_render_without_scrape(self):
+        cache, collector = make_cache(render_on_scrape=False)
+        cache.get()
+        cache.get()
+        assert collector.collected == 1
+        cache.render()
+        exposition = cache.get()
+        assert collector.collected == 2
+        assert b'storj_exporter_coalesced_scrapes_total 1.0' in exposition.plain
+        assert gzip.decompress(exposition.gzipped) == exposition.plain
+
+
+class TestExpositionCacheSnapshot:
+    @pytest.fixture
+    def snapshot(self, tmp_path):
+        snapshot = ExpositionSnapshot(str(tmp_path / 'exposition.gz'))
+        snapshot.save(Exposition(b'test_metric 5.0\n'))
+        return ExpositionSnapshot(snapshot.path)
+
+    def test_served_until_render(self, snapshot):
+        cache, collector = make_cache(render_on_scrape=False, snapshot=snapshot)
+        exposition = cache.get()
+        assert collector.collected == 0
+        assert exposition.plain.startswith(b'test_metric 5.0\n')
+        assert b'\nstorj_exporter_snapshot_age_seconds ' in exposition.plain
+        assert gzip.decompress(exposition.gzipped) == exposition.plain
+        cache.render()
+        exposition = cache.get()
+        assert b'test_metric 1.0' in exposition.plain
+        assert b'snapshot_age' not in exposition.plain
+        assert snapshot.load()[0] == exposition.plain
+
+    def test_render_in_background(self, snapshot):
+        cache, collector = make_cache(delay=0.1, snapshot=snapshot)
+        started = time.monotonic()
+        exposition = cache.get()
+        assert time.monotonic() - started < 0.1
+        assert exposition.plain.startswith(b'test_metric 5.0\n')
+        cache.get()
+        cache._warmup.join()
+        assert collector.collected == 1
+        exposition = cache.get()
+        assert b'test_metric 2.0' in exposition.plain
+
+    @pytest.mark.parametrize("snapshot_if, expected", [
+        (None, b'test_metric 1.0'),
+        (lambda: True, b'test_metric 1.0'),
+        (lambda: False, b'test_metric 5.0'),
+    ])
+    def test_saved_on_render(self, snapshot, snapshot_if, expected):
+        cache, collector = make_cache(render_on_scrape=False, snapshot=snapshot,
+                                      snapshot_if=snapshot_if)
+        cache.render()
+        assert expected in snapshot.load()[0]
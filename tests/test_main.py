@@ -0,0 +1,110 @@
+import gzip
+import threading
+import pytest
+import requests
+from http.server import ThreadingHTTPServer
+from prometheus_client.core import CollectorRegistry, GaugeMetricFamily
+from storj_exporter.__main__ import HTTPRequestHandler
+from storj_exporter.api_wrapper import ApiClient
+from storj_exporter.exposition import ExpositionCache
+
+
+class FakeCollector:
+    refresh_duration = collect_duration = None
+
+    def __init__(self, value):
+        self.value = value
+
+    def collect(self):
+        metric = GaugeMetricFamily('test_metric', 'test_documentation')
+        metric.add_metric([], self.value)
+        yield metric
+
+    def refresh(self):
+        pass
+
+
+class FakeTarget:
+    def __init__(self, value):
+        self.name = f'node{value}:14002'
+        self.value = value
+        self.client = ApiClient('http://127.0.0.1:1')
+        self.collectors = []
+        self.collector_group = None
+        self.registry = CollectorRegistry(auto_describe=False)
+        self.registry.register(FakeCollector(value))
+        self.exposition_cache = ExpositionCache(self.registry)
+
+    def make_collectors(self, refresh_on_collect, max_workers=None):
+        return [FakeCollector(self.value)]
+
+
+@pytest.fixture(params=[False])
+def server_url(request):
+    targets = {'node1:14002': FakeTarget(1), 'node2:14002': FakeTarget(2)}
+    httpd = ThreadingHTTPServer(
+        ('127.0.0.1', 0), HTTPRequestHandler.factory(targets, request.param))
+    t = threading.Thread(target=httpd.serve_forever, args=(0.05,))
+    t.daemon = True
+    t.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def session():
+    with requests.Session() as session:
+        yield session
+
+
+class TestHTTPRequestHandler:
+    def test_status(self, server_url, session):
+        response = session.get(f'{server_url}/status')
+        assert response.status_code == 200
+        assert response.json() == {'status': 'alive'}
+
+    @pytest.mark.parametrize("accept_encoding, expected_encoding", [
+        ('identity', None),
+        ('gzip', 'gzip'),
+    ])
+    def test_metrics(self, server_url, session, accept_encoding, expected_encoding):
+        response = session.get(f'{server_url}/metrics', stream=True,
+                               headers={'Accept-Encoding': accept_encoding})
+        body = response.raw.read()
+        assert response.status_code == 200
+        assert response.headers.get('Content-Encoding') == expected_encoding
+        assert int(response.headers['Content-Length']) == len(body)
+        if expected_encoding:
+            body = gzip.decompress(body)
+        assert b'test_metric 1.0' in body
+
+    @pytest.mark.parametrize("path, expected_status, expected_value", [
+        ('/metrics', 200, b'test_metric 1.0'),
+        ('/metrics?target=node1:14002', 200, b'test_metric 1.0'),
+        ('/metrics?target=node2:14002', 200, b'test_metric 2.0'),
+        ('/metrics?target=node3:14002', 404, None),
+    ])
+    def test_metrics_target(self, server_url, session, path, expected_status,
+                            expected_value):
+        response = session.get(f'{server_url}{path}')
+        assert response.status_code == expected_status
+        if expected_value:
+            assert expected_value in response.content
+
+    @pytest.mark.parametrize("server_url, path, expected_status, expected_text", [
+        (False, '/debug/profile', 200, 'test_metric 1.0'),
+        (True, '/debug/profile', 200, '1 collection cycles of node1:14002'),
+        (True, '/debug/profile?target=node2:14002&cycles=3&sort=tottime',
+         200, '3 collection cycles of node2:14002'),
+        (True, '/debug/profile?memory=1', 200, 'Memory allocated'),
+        (True, '/debug/profile?target=node3:14002', 404, None),
+        (True, '/debug/profile?cycles=x', 400, None),
+        (True, '/debug/profile?sort=x', 400, None),
+    ], indirect=['server_url'])
+    def test_profile(self, server_url, session, path, expected_status,
+                     expected_text):
+        response = session.get(f'{server_url}{path}')
+        assert response.status_code == expected_status
+        if expected_text:
+            assert expected_text in response.text
@@ -2,112 +2,91 @@ import pytest
 from storj_exporter.metric_templates import (
     MetricTemplate,
     InfoMetricTemplate,
-    GaugeMetricTemplate
+    GaugeMetricTemplate,
+    CounterMetricTemplate
 )
 from prometheus_client.core import (
+    CounterMetricFamily,
     GaugeMetricFamily,
     InfoMetricFamily,
     UnknownMetricFamily
 )
 
 
+def add_samples(template, data, extra_labels_values=()):
+    plan = template.compile()
+    metric = plan.new_metric()
+    plan.add_samples(metric, data, tuple(extra_labels_values))
+    return metric
+
+
 class TestMetricTemplate:
     def test_init(self):
         template = MetricTemplate(
             metric_name='test_metric_name',
             documentation='test_documentation',
-            data_dict={'test_key': 1.1},
             data_keys=['test_key'],
-            labels=['label1', 'label2'],
-            extra_labels_values=['label2_value']
+            nested_path=['test_path'],
+            labels=['label1', 'label2']
         )
         assert template.metric_name == 'test_metric_name'
         assert template.documentation == 'test_documentation'
-        assert template.data_dict == {'test_key': 1.1}
         assert template.data_keys == ['test_key']
+        assert template.nested_path == ['test_path']
         assert template.labels == ['label1', 'label2']
-        assert template.extra_labels_values == ['label2_value']
-        assert type(template.metric_object) == UnknownMetricFamily
-        assert template.metric_object.name == 'test_metric_name'
-        assert template.metric_object.documentation == 'test_documentation'
-        assert len(template.metric_object.samples) == 0
 
     def test_init_defaults(self):
-        gauge_template = MetricTemplate(
+        template = MetricTemplate(
             metric_name='test_metric_name',
             documentation='test_documentation',
-            data_dict={'test_key': 'test_value'},
             data_keys=['test_key']
         )
-        assert gauge_template.metric_name == 'test_metric_name'
-        assert gauge_template.documentation == 'test_documentation'
-        assert gauge_template.data_dict == {'test_key': 'test_value'}
-        assert gauge_template.data_keys == ['test_key']
-        assert gauge_template.labels == ['type']
-        assert gauge_template.extra_labels_values == []
-
-    def test_get_value(self):
-        metric_template = MetricTemplate(
+        assert template.nested_path == []
+        assert template.labels == ['type']
+
+    def test_compile(self):
+        plan = MetricTemplate(
             metric_name='test_metric_name',
             documentation='test_documentation',
-            data_dict={'test_key': 1.1},
             data_keys=['test_key'],
-        )
-        value = metric_template._get_value('test_key')
-        assert value == 1.1
+            labels=['label1', 'label2']
+        ).compile()
+        metric = plan.new_metric()
+        assert isinstance(metric, UnknownMetricFamily)
+        assert metric.name == 'test_metric_name'
+        assert metric.documentation == 'test_documentation'
+        assert len(metric.samples) == 0
+        assert plan.new_metric() is not metric
 
-    def test_template_metric_object(self):
-        metric_template = MetricTemplate(
+    def test_metric_object(self):
+        metric = add_samples(MetricTemplate(
             metric_name='test_metric_name',
             documentation='test_documentation',
-            data_dict={'test_key': 1.1},
             data_keys=['test_key'],
-            labels=['label1', 'label2'],
-            extra_labels_values=['label2_value']
-        )
-        metric_template.add_metric_samples()
-        metric_object = metric_template.metric_object
-        assert type(metric_object) == UnknownMetricFamily
-        assert metric_object.name == 'test_metric_name'
-        assert metric_object.documentation == 'test_documentation'
-        assert len(metric_object.samples) == 1
-        assert metric_object.samples[0].labels == {
+            labels=['label1', 'label2']
+        ), {'test_key': 1.1}, ['label2_value'])
+        assert len(metric.samples) == 1
+        assert metric.samples[0].labels == {
             'label1': 'test_key', 'label2': 'label2_value'}
-        assert metric_object.samples[0].value == 1.1
-
-    def test_template_metric_object_none_value(self):
-        metric_template = MetricTemplate(
-            metric_name='test_metric_name',
-            documentation='test_documentation',
-            data_dict={'test_key': None},
-            data_keys=['test_key']
-        )
-        metric_template.add_metric_samples()
-        metric_object = metric_template.metric_object
-        assert type(metric_object) == UnknownMetricFamily
-        assert metric_object.name == 'test_metric_name'
-        assert len(metric_object.samples) == 0
+        assert metric.samples[0].value == 1.1
 
     @pytest.mark.parametrize('value, expected_samples', [(1.1, 1), (None, 0)])
     @pytest.mark.parametrize('extra_labels_values, expected_labels', [
         (['l2_value'], {'l1': 'test_key', 'l2': 'l2_value'}),
         ([], {'l1': 'test_key'}),
     ])
-    def test_add_metric_samples(self, value, extra_labels_values, expected_samples,
-                                expected_labels):
-        metric_template = MetricTemplate(
+    def test_add_samples(self, value, extra_labels_values, expected_samples,
+                         expected_labels):
+        labels = ['l1', 'l2'] if extra_labels_values else ['l1']
+        metric = add_samples(MetricTemplate(
             metric_name='test_metric_name',
             documentation='test_documentation',
-            data_dict={'test_key': value},
             data_keys=['test_key'],
-            labels=['l1', 'l2'],
-            extra_labels_values=extra_labels_values
-        )
-        metric_template.add_metric_samples()
-        metric_object = metric_template.metric_object
-        assert len(metric_object.samples) == expected_samples
+            labels=labels
+        ), {'test_key': value}, extra_labels_values)
+        assert len(metric.samples) == expected_samples
         if expected_samples > 0:
-            assert metric_object.samples[0].labels == expected_labels
+            assert metric.samples[0].labels == expected_labels
 
 
 class TestGaugeMetricTemplate(object):
@@ -116,37 +95,37 @@ class TestGaugeMetricTemplate(object):
         ('1.1', 1.1),
         (0, 0.0),
         (True, 1.0),
-        (None, None),
         ('test', None),
         ('', None)
     ])
-    def test_get_value(self, value, expected):
-        metric_template = GaugeMetricTemplate(
+    def test_convert(self, value, expected):
+        assert GaugeMetricTemplate._convert('test_key', value) == expected
+
+    def test_metric_object(self):
+        metric = add_samples(GaugeMetricTemplate(
             metric_name='test_metric_name',
             documentation='test_documentation',
-            data_dict={'test_key': value},
-            data_keys=['test_key'],
-        )
-        assert metric_template._get_value('test_key') == expected
+            data_keys=['test_key', 'invalid_key'],
+            labels=['label1', 'label2']
+        ), {'test_key': 1.1, 'invalid_key': 'test'}, ['label2_value'])
+        assert isinstance(metric, GaugeMetricFamily)
+        assert metric.name == 'test_metric_name'
+        assert len(metric.samples) == 1
+        assert metric.samples[0].labels == {
+            'label1': 'test_key', 'label2': 'label2_value'}
+        assert metric.samples[0].value == 1.1
+
 
-    def test_get_metric_object(self):
-        metric_template = GaugeMetricTemplate(
+class TestCounterMetricTemplate(object):
+    def test_metric_object(self):
+        metric = add_samples(CounterMetricTemplate(
             metric_name='test_metric_name',
             documentation='test_documentation',
-            data_dict={'test_key': 1.1},
             data_keys=['test_key'],
-            labels=['label1', 'label2'],
-            extra_labels_values=['label2_value']
-        )
-        metric_template.add_metric_samples()
-        metric_object = metric_template.metric_object
-        assert type(metric_object) == GaugeMetricFamily
-        assert metric_object.name == 'test_metric_name'
-        assert metric_object.documentation == 'test_documentation'
-        assert len(metric_object.samples) == 1
-        assert metric_object.samples[0].labels == {
-            'label1': 'test_key', 'label2': 'label2_value'}
-        assert metric_object.samples[0].value == 1.1
+        ), {'test_key': '2'})
+        assert isinstance(metric, CounterMetricFamily)
+        assert metric.samples[0].name == 'test_metric_name_total'
+        assert metric.samples[0].value == 2.0
 
 
 class TestInfoMetricTemplate(object):
@@ -157,32 +136,53 @@ class TestInfoMetricTemplate(object):
         (True, {'test_key': 'True'}),
         (1.1, {'test_key': '1.1'}),
         (0, {'test_key': '0'}),
-        (None, None)
     ])
-    def test_get_value(self, value, expected):
-        metric_template = InfoMetricTemplate(
+    def test_convert(self, value, expected):
+        assert InfoMetricTemplate._convert('test_key', value) == expected
+
+    def test_metric_object(self):
+        metric = add_samples(InfoMetricTemplate(
             metric_name='test_metric_name',
             documentation='test_documentation',
-            data_dict={'test_key': value},
             data_keys=['test_key'],
-        )
-        assert metric_template._get_value('test_key') == expected
+            labels=['label1', 'label2']
+        ), {'test_key': 1.1}, ['label2_value'])
+        assert isinstance(metric, InfoMetricFamily)
+        assert metric.name == 'test_metric_name'
+        assert len(metric.samples) == 1
+        assert metric.samples[0].labels == {
+            'label1': 'test_key', 'label2': 'label2_value', 'test_key': '1.1'}
+        assert metric.samples[0].value == 1
+
 
-    def test_get_metric_object(self):
-        metric_template = InfoMetricTemplate(
+class TestExtractionPlan(object):
+    @pytest.mark.parametrize('data, nested_path, data_keys, expected', [
+        ({'a': 1, 'b': '2', 'c': None}, [], ['a', 'b', 'c', 'd'],
+         [(('a', 'x'), 1.0), (('b', 'x'), 2.0)]),
+        ({'n': {'a': 1, 'b': 2}}, ['n'], ['b'], [(('b', 'x'), 2.0)]),
+        ({'n': {'a': 1, 'b': 2}}, ['n'], None, [(('a', 'x'), 1.0), (('b', 'x'), 2.0)]),
+        ({'n': [1, 2]}, ['n', 'a'], ['a'], []),
+        ({'n': None}, ['n'], ['a'], []),
+        ({}, [], ['a'], []),
+    ])
+    def test_add_samples(self, data, nested_path, data_keys, expected):
+        plan = GaugeMetricTemplate(
             metric_name='test_metric_name',
             documentation='test_documentation',
-            data_dict={'test_key': 1.1},
-            data_keys=['test_key'],
-            labels=['label1', 'label2'],
-            extra_labels_values=['label2_value']
-        )
-        metric_template.add_metric_samples()
-        metric_object = metric_template.metric_object
-        assert type(metric_object) == InfoMetricFamily
-        assert metric_object.name == 'test_metric_name'
-        assert metric_object.documentation == 'test_documentation'
-        assert len(metric_object.samples) == 1
-        assert metric_object.samples[0].labels == {
-            'label1': 'test_key', 'label2': 'label2_value', 'test_key': '1.1'}
-        assert metric_object.samples[0].value == 1
+            nested_path=nested_path,
+            data_keys=data_keys,
+            labels=['type', 'extra']
+        ).compile()
+        metric = plan.new_metric()
+        plan.add_samples(metric, data, ('x',))
+        assert isinstance(metric, GaugeMetricFamily)
+        assert [((s.labels['type'], s.labels['extra']), s.value)
+                for s in metric.samples] == expected
+
+    def test_info_none_value(self):
+        metric = add_samples(InfoMetricTemplate(
+            metric_name='test_metric_name',
+            documentation='test_documentation',
+            data_keys=['a', 'b'],
+        ), {'a': 1, 'b': None})
+        assert [s.labels for s in metric.samples] == [{'type': 'a', 'a': '1'}]
@@ -0,0 +1,133 @@
+import asyncio
+import time
+from storj_exporter.poller import Poller, AsyncPoller
+
+
+class FakeCollector:
+    def __init__(self, fail=False):
+        self.refreshed = 0
+        self.fail = fail
+
+    def refresh(self):
+        self.refreshed += 1
+        if self.fail:
+            raise ValueError('refresh failed')
+
+
+class FakeAsyncCollector:
+    def __init__(self, delay=0, fail=False):
+        self.refreshed_with = []
+        self.delay = delay
+        self.fail = fail
+
+    async def refresh_async(self, client):
+        await asyncio.sleep(self.delay)
+        self.refreshed_with.append(client)
+        if self.fail:
+            raise ValueError('refresh failed')
+
+
+class FakeExpositionCache:
+    def __init__(self, fail=False):
+        self.rendered = 0
+        self.fail = fail
+
+    def render(self):
+        self.rendered += 1
+        if self.fail:
+            raise ValueError('render failed')
+
+
+class FakeTarget:
+    def __init__(self, name, collectors, render_fails=False):
+        self.name = name
+        self.async_client = f'{name}_client'
+        self.collectors = collectors
+        self.exposition_cache = FakeExpositionCache(render_fails)
+
+
+class TestPoller:
+    def test_poll(self):
+        collectors = [FakeCollector(fail=True), FakeCollector()]
+        poller = Poller(collectors, 60)
+        poller.poll()
+        assert [c.refreshed for c in collectors] == [1, 1]
+
+    def test_after_poll(self):
+        collector = FakeCollector()
+        polled = []
+        poller = Poller([collector], 60,
+                        after_poll=lambda: polled.append(collector.refreshed))
+        poller.poll()
+        assert polled == [1]
+
+    def test_start_stop(self):
+        collector = FakeCollector()
+        poller = Poller([collector], 0.01)
+        poller.start()
+        time.sleep(0.1)
+        poller.stop()
+        refreshed = collector.refreshed
+        assert refreshed > 0
+        time.sleep(0.05)
+        assert collector.refreshed == refreshed
+
+    def test_after_poll_fails(self):
+        collector = FakeCollector()
+        poller = Poller([collector], 0.01, after_poll=FakeExpositionCache(True).render)
+        poller.start()
+        time.sleep(0.1)
+        poller.stop()
+        assert collector.refreshed > 1
+
+    def test_polls_on_start(self):
+        collector = FakeCollector()
+        poller = Poller([collector], 60)
+        poller.start()
+        time.sleep(0.05)
+        assert collector.refreshed == 1
+        poller.stop()
+
+
+class TestAsyncPoller:
+    def test_poll(self):
+        targets = [
+            FakeTarget('node1', [FakeAsyncCollector(0.1), FakeAsyncCollector(0.1)]),
+            FakeTarget('node2', [FakeAsyncCollector(0.1, fail=True)]),
+        ]
+        poller = AsyncPoller(targets, 60)
+        started = time.monotonic()
+        asyncio.run(poller.poll())
+        assert time.monotonic() - started < 0.2
+        for target in targets:
+            assert target.exposition_cache.rendered == 1
+            for collector in target.collectors:
+                assert collector.refreshed_with == [target.async_client]
+
+    def test_start_stop(self):
+        target = FakeTarget('node1', [FakeAsyncCollector()])
+        poller = AsyncPoller([target], 0.01)
+        poller.start()
+        time.sleep(0.1)
+        poller.stop()
+        rendered = target.exposition_cache.rendered
+        assert rendered > 0
+        time.sleep(0.05)
+        assert target.exposition_cache.rendered == rendered
+
+    def test_render_fails(self):
+        targets = [FakeTarget('node1', [FakeAsyncCollector()], render_fails=True),
+                   FakeTarget('node2', [FakeAsyncCollector()])]
+        poller = AsyncPoller(targets, 0.01)
+        poller.start()
+        time.sleep(0.1)
+        poller.stop()
+        assert all(t.exposition_cache.rendered > 1 for t in targets)
+
+    def test_polls_on_start(self):
+        target = FakeTarget('node1', [FakeAsyncCollector()])
+        poller = AsyncPoller([target], 60)
+        poller.start()
+        time.sleep(0.05)
+        assert target.exposition_cache.rendered == 1
+        poller.stop()
@@ -0,0 +1,59 @@
+import marshal
+import threading
+import pytest
+from storj_exporter.api_wrapper import ApiClient
+from storj_exporter.profiler import CollectionProfiler, ProfilerBusyError
+from storj_exporter.target import Target
+
+
+@pytest.fixture
+def target(mock_api_server):
+    return Target('node1:14002', ApiClient(mock_api_server), ['payout', 'sat'],
+                  poll_interval=60)
+
+
+class TestCollectionProfiler:
+    def test_profile_text(self, target):
+        body, content_type = CollectionProfiler().profile(target, cycles=2, limit=5)
+        assert content_type.startswith('text/plain')
+        text = body.decode('utf-8')
+        assert text.startswith('2 collection cycles of node1:14002')
+        assert '_prepare_sat_data' in CollectionProfiler().profile(
+            target, sort='tottime', limit=1000)[0].decode('utf-8')
+
+    def test_profile_leaves_target_collectors(self, target, monkeypatch):
+        refreshed = []
+        for collector in target.collectors:
+            monkeypatch.setattr(collector, 'refresh',
+                                lambda c=collector: refreshed.append(c))
+        CollectionProfiler().profile(target, cycles=2)
+        assert refreshed == []
+        assert target.collectors[2].max_workers == 4
+
+    def test_profile_memory(self, target):
+        body, _ = CollectionProfiler().profile(target, memory=True, limit=3)
+        assert b'Memory allocated while profiling' in body
+
+    def test_profile_pstats(self, target):
+        body, content_type = CollectionProfiler().profile(target, output='pstats')
+        assert content_type == 'application/octet-stream'
+        stats = marshal.loads(body)
+        assert any(func[2] == '_collection_cycle' for func in stats)
+
+    def test_profile_busy(self, target):
+        profiler = CollectionProfiler()
+        started, release = threading.Event(), threading.Event()
+
+        def wait(*args):
+            started.set()
+            release.wait()
+            return b'', 'text/plain'
+
+        profiler._profile = wait
+        t = threading.Thread(target=profiler.profile, args=(target,))
+        t.start()
+        started.wait()
+        with pytest.raises(ProfilerBusyError):
+            profiler.profile(target)
+        release.set()
+        t.join()
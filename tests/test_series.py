@@ -0,0 +1,58 @@
+import pytest
+from storj_exporter.series import DailySeries
+
+
+@pytest.fixture(name="days")
+def fixture_days():
+    return [
+        {'egress': {'repair': 1, 'audit': 2, 'usage': 3}, 'delete': 4,
+         'intervalStart': '2023-02-01T00:00:00Z'},
+        {'egress': {'repair': 1, 'audit': 2}, 'ingress': {'usage': 5},
+         'intervalStart': '2023-02-02T00:00:00Z'},
+        {'egress': {'repair': 1, 'audit': None, 'usage': 'test'}, 'delete': 4,
+         'intervalStart': '2023-02-03T00:00:00Z'},
+    ]
+
+
+class TestDailySeries:
+    def test_columns(self, days):
+        series = DailySeries(days)
+        assert len(series) == 3
+        assert series.starts == ['2023-02-01T00:00:00Z', '2023-02-02T00:00:00Z',
+                                 '2023-02-03T00:00:00Z']
+        assert series.fields('egress') == ['audit', 'repair', 'usage']
+        assert series.fields('delete') == []
+        assert list(series.column('egress', 'repair')) == [1, 1, 1]
+        assert list(series.column('egress', 'usage')) == [3, 0, 0]
+        assert list(series.column('ingress', 'usage')) == [0, 5, 0]
+        assert list(series.column('delete')) == [4, 0, 4]
+        assert list(series.column('test')) == [0, 0, 0]
+
+    def test_column_cached(self, days):
+        series = DailySeries(days)
+        column = series.column('egress', 'audit')
+        assert list(column) == [2, 2, 0]
+        assert series.column('egress', 'audit') is column
+
+    def test_total(self, days):
+        series = DailySeries(days)
+        assert series.total('egress') == {'repair': 3, 'audit': 4, 'usage': 3}
+        assert series.total('ingress') == {'usage': 5}
+        assert series.total('delete') == {}
+        assert series.total('test') == {}
+
+    def test_last(self, days):
+        series = DailySeries(days)
+        assert series.last() == days[-1]
+        series.last()['test'] = 1
+        assert 'test' not in days[-1]
+
+    @pytest.mark.parametrize('days', [None, {}, [], 'test', [None, 1, 'test']])
+    def test_invalid(self, days):
+        series = DailySeries(days)
+        assert len(series) == 0
+        assert series.total('egress') == {}
+        last = series.last()
+        assert last == {}
+        last['test'] = 1
+        assert series.last() == {}
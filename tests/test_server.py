@@ -0,0 +1,205 @@
+import gzip
+import http.client
+import socket
+import threading
+import time
+import pytest
+from prometheus_client.core import GaugeMetricFamily
+from storj_exporter.server import AsyncHTTPServer, ExporterApp
+from tests.test_main import FakeTarget
+from deadline import current as current_deadline  # flat module used by the app
+
+
+class DeadlineCollector:
+    """Exposes seconds left before the scrape deadline, -1 without deadline."""
+    def collect(self):
+        deadline = current_deadline()
+        metric = GaugeMetricFamily('test_deadline', 'test_documentation')
+        metric.add_metric([], deadline.remaining() if deadline else -1)
+        yield metric
+
+
+def deadline_target():
+    target = FakeTarget(1)
+    target.registry.register(DeadlineCollector())
+    return target
+
+
+def scraped_deadline(body):
+    for line in body.decode().splitlines():
+        if line.startswith('test_deadline '):
+            return float(line.split()[1])
+
+
+class SlowApp(ExporterApp):
+    """Takes `delay` seconds to answer, recording the max concurrent requests."""
+    def __init__(self, delay):
+        super().__init__({'node1:14002': deadline_target()})
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def handle(self, path, accept_encoding=None, scrape_timeout=None,
+               received_at=None):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return super().handle(path, accept_encoding, scrape_timeout, received_at)
+
+
+def start_server(app, **kwargs):
+    server = AsyncHTTPServer(app, '127.0.0.1', 0, **kwargs)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    server.ready.wait(5)
+    return server, thread
+
+
+@pytest.fixture
+def server():
+    targets = {'node1:14002': FakeTarget(1), 'node2:14002': FakeTarget(2)}
+    server, thread = start_server(ExporterApp(targets))
+    yield server
+    server.stop()
+    thread.join(5)
+
+
+def connect(server):
+    return http.client.HTTPConnection(*server.server_address[:2], timeout=5)
+
+
+class TestExporterApp:
+    @pytest.mark.parametrize("scrape_timeout, expected_min, expected_max", [
+        (None, -1, -1),
+        ('x', -1, -1),
+        ('0', -1, -1),
+        ('10', 9, 9.5),
+        ('0.2', 0, 0),
+    ])
+    def test_scrape_deadline(self, scrape_timeout, expected_min, expected_max):
+        app = ExporterApp({'node1:14002': deadline_target()}, timeout_offset=0.5)
+        status, _, body = app.handle('/metrics', None, scrape_timeout)
+        assert status == 200
+        assert expected_min <= scraped_deadline(body) <= expected_max
+        assert current_deadline() is None
+
+    def test_scrape_deadline_from_received(self):
+        app = ExporterApp({'node1:14002': deadline_target()}, timeout_offset=0.5)
+        _, _, body = app.handle('/metrics', None, '10', time.monotonic() - 3)
+        assert 6 <= scraped_deadline(body) <= 6.5
+
+
+class TestAsyncHTTPServer:
+    @pytest.mark.parametrize("path, headers, expected_status, expected_body", [
+        ('/status', {}, 200, b'{"status": "alive"}'),
+        ('/metrics', {}, 200, b'test_metric 1.0'),
+        ('/?target=node2:14002', {}, 200, b'test_metric 2.0'),
+        ('/metrics', {'Accept-Encoding': 'gzip'}, 200, b'test_metric 1.0'),
+        ('/?target=node3:14002', {}, 404, b'Unknown target'),
+    ])
+    def test_get(self, server, path, headers, expected_status, expected_body):
+        conn = connect(server)
+        conn.request('GET', path, headers=headers)
+        response = conn.getresponse()
+        body = response.read()
+        assert response.status == expected_status
+        assert int(response.getheader('Content-Length')) == len(body)
+        if response.getheader('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        assert expected_body in body
+
+    def test_scrape_timeout_header(self):
+        server, thread = start_server(
+            ExporterApp({'node1:14002': deadline_target()}, timeout_offset=1))
+        conn = connect(server)
+        conn.request('GET', '/metrics',
+                     headers={'X-Prometheus-Scrape-Timeout-Seconds': '10'})
+        assert 8 < scraped_deadline(conn.getresponse().read()) <= 9
+        server.stop()
+        thread.join(5)
+
+    def test_keep_alive(self, server):
+        conn = connect(server)
+        conn.request('GET', '/status')
+        response = conn.getresponse()
+        response.read()
+        assert response.getheader('Connection') == 'keep-alive'
+        sock = conn.sock
+        conn.request('GET', '/metrics')
+        assert conn.getresponse().read().startswith(b'# HELP')
+        assert conn.sock is sock
+
+    @pytest.mark.parametrize("request_bytes, expected", [
+        (b'GET /status HTTP/1.0\r\n\r\n', b'HTTP/1.1 200 OK'),
+        (b'GET /status HTTP/1.1\r\nConnection: close\r\n\r\n', b'HTTP/1.1 200 OK'),
+        (b'POST /status HTTP/1.1\r\nConnection: close\r\n\r\n',
+         b'HTTP/1.1 405 Method Not Allowed'),
+        (b'garbage\r\n\r\n', b'HTTP/1.1 400 Bad Request'),
+    ])
+    def test_connection_closed(self, server, request_bytes, expected):
+        with socket.create_connection(server.server_address[:2], timeout=5) as sock:
+            sock.sendall(request_bytes)
+            response = b''
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                response += data
+        assert response.startswith(expected)
+        assert b'Connection: close' in response
+
+    def test_head(self, server):
+        conn = connect(server)
+        conn.request('HEAD', '/status')
+        response = conn.getresponse()
+        assert response.status == 200
+        assert int(response.getheader('Content-Length')) > 0
+        assert response.read() == b''
+
+    def test_bounded_workers(self):
+        app = SlowApp(0.1)
+        server, thread = start_server(app, max_workers=2)
+        conns = [connect(server) for _ in range(6)]
+        for conn in conns:
+            conn.request('GET', '/status')
+        assert all(conn.getresponse().status == 200 for conn in conns)
+        assert app.max_active == 2
+        server.stop()
+        thread.join(5)
+
+    def test_deadline_includes_queue(self):
+        server, thread = start_server(SlowApp(0.3), max_workers=1)
+        conns = [connect(server) for _ in range(2)]
+        for conn in conns:
+            conn.request('GET', '/metrics',
+                         headers={'X-Prometheus-Scrape-Timeout-Seconds': '1.5'})
+        deadlines = sorted(scraped_deadline(conn.getresponse().read())
+                           for conn in conns)
+        assert deadlines[0] < 0.55 < deadlines[1] <= 0.75
+        server.stop()
+        thread.join(5)
+
+    def test_shutdown_drains_requests(self):
+        server, thread = start_server(SlowApp(0.3), shutdown_timeout=5)
+        idle = connect(server)
+        idle.request('GET', '/status')
+        idle.getresponse().read()
+        busy = connect(server)
+        busy.request('GET', '/status')
+        time.sleep(0.1)
+        started = time.monotonic()
+        server.stop()
+        response = busy.getresponse()
+        assert response.status == 200
+        assert response.getheader('Connection') == 'close'
+        assert response.read() == b'{"status": "alive"}'
+        thread.join(5)
+        assert not thread.is_alive()
+        assert time.monotonic() - started < 1
+        with pytest.raises(OSError):
+            connect(server).request('GET', '/status')
@@ -0,0 +1,43 @@
+import gzip
+import os
+import time
+from storj_exporter.exposition import Exposition
+from storj_exporter.snapshot import ExpositionSnapshot
+
+
+class TestExpositionSnapshot:
+    def test_save_load(self, tmp_path):
+        path = str(tmp_path / 'node1' / 'exposition.gz')
+        snapshot = ExpositionSnapshot(path)
+        assert snapshot.load() is None
+        snapshot.save(Exposition(b'test_metric 1.0\n'))
+        assert gzip.decompress((tmp_path / 'node1' / 'exposition.gz').read_bytes()) \
+            == b'test_metric 1.0\n'
+        plain, saved_at = ExpositionSnapshot(path).load()
+        assert plain == b'test_metric 1.0\n'
+        assert time.time() - 5 < saved_at <= time.time()
+
+    def test_interval(self, tmp_path):
+        path = str(tmp_path / 'exposition.gz')
+        snapshot = ExpositionSnapshot(path, interval=60)
+        snapshot.save(Exposition(b'test_metric 1.0\n'))
+        snapshot.save(Exposition(b'test_metric 2.0\n'))
+        assert snapshot.load()[0] == b'test_metric 1.0\n'
+        snapshot._saved_at -= 60
+        snapshot.save(Exposition(b'test_metric 2.0\n'))
+        assert snapshot.load()[0] == b'test_metric 2.0\n'
+
+    def test_max_age(self, tmp_path):
+        path = str(tmp_path / 'exposition.gz')
+        snapshot = ExpositionSnapshot(path, max_age=60)
+        snapshot.save(Exposition(b'test_metric 1.0\n'))
+        os.utime(path, (time.time() - 61, time.time() - 61))
+        assert snapshot.load() is None
+
+    def test_invalid(self, tmp_path):
+        path = tmp_path / 'exposition.gz'
+        path.write_bytes(b'test')
+        assert ExpositionSnapshot(str(path)).load() is None
+        snapshot = ExpositionSnapshot(str(path / 'exposition.gz'))
+        snapshot.save(Exposition(b'test_metric 1.0\n'))
+        assert snapshot.load() is None
@@ -0,0 +1,33 @@
+import os
+from storj_exporter.store import PermanentStore
+
+
+class TestPermanentStore:
+    def test_memory(self):
+        store = PermanentStore()
+        assert store.get('2023-01') is None
+        store.put('2023-01', [{'held': 1}])
+        assert store.get('2023-01') == [{'held': 1}]
+
+    def test_directory(self, tmp_path):
+        directory = str(tmp_path / 'paystubs')
+        store = PermanentStore(directory)
+        assert store.get('2023-01') is None
+        store.put('2023-01', [{'held': 1}])
+        assert os.listdir(directory) == ['2023-01.json']
+        assert PermanentStore(directory).get('2023-01') == [{'held': 1}]
+
+    def test_key_sanitized(self, tmp_path):
+        store = PermanentStore(str(tmp_path))
+        store.put('../2023/01', [])
+        assert os.listdir(tmp_path) == ['.._2023_01.json']
+
+    def test_disk_errors(self, tmp_path):
+        path = tmp_path / 'file'
+        path.write_text('test')
+        store = PermanentStore(str(path))
+        store.put('2023-01', [{'held': 1}])
+        assert store.get('2023-01') == [{'held': 1}]
+        (tmp_path / 'dir').mkdir()
+        (tmp_path / 'dir' / '2023-01.json').write_text('{')
+        assert PermanentStore(str(tmp_path / 'dir')).get('2023-01') is None
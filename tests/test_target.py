@@ -0,0 +1,137 @@
+import time
+import pytest
+from prometheus_client.core import CollectorRegistry
+from prometheus_client.exposition import generate_latest
+from storj_exporter.api_wrapper import ApiClient, AsyncApiClient
+from storj_exporter.snapshot import ExpositionSnapshot
+from storj_exporter.target import Target, parse_addresses
+
+
+class TestParseAddresses:
+    @pytest.mark.parametrize("addresses, expected", [
+        ('storagenode', ['storagenode:14002']),
+        ('node1 node2:14003', ['node1:14002', 'node2:14003']),
+        (' node1,node2, node1\n', ['node1:14002', 'node2:14002']),
+        ('', []),
+    ])
+    def test_parse_addresses(self, addresses, expected):
+        assert parse_addresses(addresses, '14002') == expected
+
+
+class TestTarget:
+    @pytest.mark.usefixtures("mock_get_sno")
+    @pytest.mark.usefixtures("mock_get_payout")
+    @pytest.mark.usefixtures("mock_get_satellite")
+    @pytest.mark.parametrize("collectors, expected_collectors, expected_group", [
+        ([], ['NodeCollector'], False),
+        (['payout', 'sat'], ['NodeCollector', 'PayoutCollector', 'SatCollector'],
+         True),
+        (['daily'], ['NodeCollector', 'DailyCollector'], True),
+        (['audit'], ['NodeCollector', 'AuditHistoryCollector'], True),
+    ])
+    def test_init(self, client, collectors, expected_collectors, expected_group):
+        target = Target('node1:14002', client, collectors)
+        assert [c.__class__.__name__ for c in target.collectors] == \
+            expected_collectors
+        assert target.poller is None
+        assert (target.collector_group is not None) == expected_group
+        if expected_group:
+            assert target.collector_group.collectors == target.collectors
+        output = generate_latest(target.registry)
+        assert b'storj_total_diskspace' in output
+        assert b'storj_exporter_coalesced_scrapes_total' in output
+        assert (b'storj_sat_summary' in output) == ('sat' in collectors)
+
+    @pytest.mark.parametrize("data_dir, expected", [
+        (None, None),
+        ('/data', '/data/node1_14002/paystubs'),
+    ])
+    def test_init_data_dir(self, client, data_dir, expected):
+        target = Target('node1:14002', client, ['paystub'], data_dir=data_dir,
+                        paystub_interval=60)
+        collector = target.collectors[-1]
+        assert collector.__class__.__name__ == 'PaystubCollector'
+        assert collector.store.directory == expected
+        assert collector.interval == 60
+
+    @pytest.mark.usefixtures("mock_get_sno")
+    def test_snapshot(self, client, requests_mock, tmp_path):
+        target = Target('node1:14002', client, [], data_dir=str(tmp_path))
+        expected = target.exposition_cache.get().plain
+        path = tmp_path / 'node1_14002' / 'exposition.gz'
+        assert path.exists()
+
+        requests_mock.get(f'{pytest.base_url}/api/sno/', status_code=500)
+        target = Target('node1:14002', client, [], data_dir=str(tmp_path),
+                        poll_interval=60)
+        exposition = target.exposition_cache.get().plain
+        assert exposition.startswith(expected)
+        assert b'storj_exporter_snapshot_age_seconds' in exposition
+        target.exposition_cache.render()
+        assert b'storj_up 0.0' in target.exposition_cache.get().plain
+        assert ExpositionSnapshot(str(path)).load()[0] == expected
+
+        target = Target('node1:14002', client, [], data_dir=str(tmp_path),
+                        snapshot_interval=0)
+        assert target.exposition_cache.snapshot is None
+
+    @pytest.mark.parametrize("poll_interval", [0, 60])
+    def test_init_without_api_calls(self, requests_mock, poll_interval):
+        started = time.monotonic()
+        target = Target('node1:14002', ApiClient(pytest.base_url),
+                        ['payout', 'sat'], CollectorRegistry(auto_describe=True),
+                        poll_interval=poll_interval)
+        assert time.monotonic() - started < 1
+        assert requests_mock.call_count == 0
+        assert 'storj_up' in target.registry._names_to_collectors
+
+    @pytest.mark.usefixtures("mock_get_sno")
+    @pytest.mark.usefixtures("mock_get_payout")
+    @pytest.mark.usefixtures("mock_get_satellite")
+    def test_init_selective_json(self, client):
+        full = Target('node1:14002', client, ['payout', 'sat'])
+        client = ApiClient(pytest.base_url)
+        target = Target('node1:14002', client, ['payout', 'sat'], selective_json=True)
+        assert 'satellites' in client._keys['sno/']
+        assert 'auditHistory' not in client._keys['sno/satellite/']
+        assert self._node_metrics(target) == self._node_metrics(full)
+        assert 'auditHistory' not in target.collectors[2]._satellites[0][0]
+
+    @staticmethod
+    def _node_metrics(target):
+        return [line for line in generate_latest(target.registry).splitlines()
+                if not line.startswith((b'storj_exporter', b'# '))]
+
+    def test_init_sat_options(self, client):
+        target = Target('node1:14002', client, ['sat'], sat_concurrency=2,
+                        sat_batch_size=3)
+        assert target.collectors[1].max_workers == 2
+        assert target.collectors[1].batch_size == 3
+
+    def test_make_collectors(self, client):
+        target = Target('node1:14002', client, ['sat', 'paystub'], sat_concurrency=2,
+                        sat_batch_size=3)
+        collectors = target.make_collectors(refresh_on_collect=False, max_workers=1)
+        assert [type(c) for c in collectors] == [type(c) for c in target.collectors]
+        assert not any(c is t for c, t in zip(collectors, target.collectors))
+        assert not any(c.refresh_on_collect for c in collectors)
+        assert (collectors[1].max_workers, collectors[1].batch_size) == (1, 3)
+        assert collectors[2].store is target.collectors[2].store
+
+    @pytest.mark.usefixtures("mock_get_sno")
+    def test_init_poll(self, client):
+        target = Target('node1:14002', client, [], poll_interval=60)
+        assert target.poller.collectors == target.collectors
+        assert target.poller.after_poll == target.exposition_cache.render
+        assert not any(c.refresh_on_collect for c in target.collectors)
+        assert target.exposition_cache.render_on_scrape is False
+        assert target.collector_group is None
+
+    def test_init_async_client(self, client):
+        async_client = AsyncApiClient(pytest.base_url)
+        target = Target('node1:14002', client, ['sat'], poll_interval=60,
+                        async_client=async_client, selective_json=True)
+        assert target.poller is None
+        assert async_client._keys == client._keys
+        assert not any(c.refresh_on_collect for c in target.collectors)
+        assert not any(c.refresh_on_collect for c in target.collectors)
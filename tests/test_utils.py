@@ -42,3 +42,14 @@ class Testutils:
     ])
     def test_to_float(self, value, expected):
         assert utils.to_float(value) == expected
+
+    @pytest.mark.parametrize('value, expected', [
+        ('2023-02-01T00:00:00Z', 1675209600.0),
+        ('2023-02-01T00:00:00+01:00', 1675206000.0),
+        ('2023-02-01T00:00:00', 1675209600.0),
+        ('2023-02-01', 1675209600.0),
+        ('test', None),
+        (None, None),
+    ])
+    def test_to_timestamp(self, value, expected):
+        assert utils.to_timestamp(value) == expected